@@ -0,0 +1,206 @@
+# Expectimax move solver for 2048, built on the bitboard engine.
+#
+# Max nodes pick the best of the four moves, chance nodes average over every
+# empty cell receiving a 2 (90%) or a 4 (10%), the same distribution that
+# Game2048.add_random_tile uses. Search depth counts moves: a depth-d search
+# looks 2d - 1 plies ahead (d moves with the spawns in between). Leaves are
+# scored with a per-row heuristic table so evaluating a board costs eight
+# lookups.
+
+import time
+
+import engine_2048
+
+SPAWN_PROBABILITIES = ((1, 0.9), (2, 0.1))
+DIRECTION_NAMES = {
+    engine_2048.LEFT: "Left",
+    engine_2048.RIGHT: "Right",
+    engine_2048.UP: "Up",
+    engine_2048.DOWN: "Down",
+}
+
+# Heuristic weights (per row, applied to rows and columns alike)
+EMPTY_WEIGHT = 270.0
+MERGE_WEIGHT = 700.0
+MONOTONICITY_WEIGHT = 47.0
+MONOTONICITY_POWER = 4.0
+SUM_WEIGHT = 11.0
+SUM_POWER = 3.5
+LOST_PENALTY = 200000.0
+HEURISTIC_WEIGHTS = (EMPTY_WEIGHT, MERGE_WEIGHT, MONOTONICITY_WEIGHT, MONOTONICITY_POWER,
+                     SUM_WEIGHT, SUM_POWER, LOST_PENALTY)
+PROBABILITY_CUTOFF = 0.0001  # chance nodes less likely than this are evaluated as leaves
+
+_heuristic_table = None
+
+
+def heuristic_table():
+    # Built lazily so importing the module stays cheap
+    global _heuristic_table
+    if _heuristic_table is None:
+        table = [0.0] * 65536
+        for row in range(65536):
+            line = [(row >> (4 * i)) & 0xF for i in range(4)]
+            empty = 0
+            merges = 0
+            previous = 0
+            counter = 0
+            total = 0.0
+            for value in line:
+                total += value ** SUM_POWER
+                if value == 0:
+                    empty += 1
+                elif previous == value:
+                    counter += 1
+                else:
+                    if counter > 0:
+                        merges += 1 + counter
+                    counter = 0
+                    previous = value
+            if counter > 0:
+                merges += 1 + counter
+
+            monotonicity_left = 0.0
+            monotonicity_right = 0.0
+            for i in range(1, 4):
+                a = line[i - 1] ** MONOTONICITY_POWER
+                b = line[i] ** MONOTONICITY_POWER
+                if line[i - 1] > line[i]:
+                    monotonicity_left += a - b
+                else:
+                    monotonicity_right += b - a
+
+            table[row] = (LOST_PENALTY + EMPTY_WEIGHT * empty + MERGE_WEIGHT * merges
+                          - MONOTONICITY_WEIGHT * min(monotonicity_left, monotonicity_right)
+                          - SUM_WEIGHT * total)
+        _heuristic_table = table
+    return _heuristic_table
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class ExpectimaxSolver:
+    def __init__(self, time_budget=0.05, max_depth=3, probability_cutoff=PROBABILITY_CUTOFF, cache=None):
+        self.time_budget = time_budget  # seconds per decision
+        self.max_depth = max_depth  # in moves; plies = 2 * depth - 1
+        self.probability_cutoff = probability_cutoff
+        # Optional eval_cache_2048.EvalCache shared across searches and sessions;
+        # its values are only valid for the cutoff it was opened with
+        if cache is not None and cache.probability_cutoff != probability_cutoff:
+            raise ValueError(f"cache holds values for probability_cutoff={cache.probability_cutoff}, "
+                             f"not {probability_cutoff}")
+        self.cache = cache
+        self.heuristic = heuristic_table()
+        self.transposition = {}
+        self.deadline = None
+
+        # Throughput counters, accumulated across searches
+        self.nodes = 0
+        self.search_time = 0.0
+        self.last_depth = 0
+
+    @property
+    def nodes_per_second(self):
+        if self.search_time <= 0:
+            return 0.0
+        return self.nodes / self.search_time
+
+    def reset_stats(self):
+        self.nodes = 0
+        self.search_time = 0.0
+
+    def evaluate(self, board):
+        heuristic = self.heuristic
+        transposed = engine_2048.transpose(board)
+        return (heuristic[board & 0xFFFF] + heuristic[(board >> 16) & 0xFFFF]
+                + heuristic[(board >> 32) & 0xFFFF] + heuristic[board >> 48]
+                + heuristic[transposed & 0xFFFF] + heuristic[(transposed >> 16) & 0xFFFF]
+                + heuristic[(transposed >> 32) & 0xFFFF] + heuristic[transposed >> 48])
+
+    def best_move(self, board):
+        # Iterative deepening: keep the answer of the deepest finished search
+        start = time.perf_counter()
+        self.deadline = start + self.time_budget if self.time_budget else None
+        self.transposition = {}
+        best = None
+        self.last_depth = 0
+
+        try:
+            for depth in range(1, self.max_depth + 1):
+                move = self.search_root(board, depth)
+                if move is None:
+                    break
+                best = move
+                self.last_depth = depth
+        except SearchTimeout:
+            pass
+        finally:
+            self.search_time += time.perf_counter() - start
+
+        # Always answer with a legal move, even if depth 1 did not finish
+        if best is None:
+            for direction in engine_2048.DIRECTIONS:
+                if engine_2048.move(board, direction)[0] != board:
+                    return direction
+        return best
+
+    def search_root(self, board, depth):
+        best_value = None
+        best_move = None
+        for direction in engine_2048.DIRECTIONS:
+            new_board, _ = engine_2048.move(board, direction)
+            if new_board == board:
+                continue
+            value = self.chance_node(new_board, depth, 1.0)
+            if best_value is None or value > best_value:
+                best_value = value
+                best_move = direction
+        return best_move
+
+    def max_node(self, board, depth, probability):
+        best = 0.0
+        move_functions = engine_2048.MOVE_FUNCTIONS
+        for move_function in move_functions:
+            new_board, _ = move_function(board)
+            if new_board != board:
+                value = self.chance_node(new_board, depth, probability)
+                if value > best:
+                    best = value
+        return best
+
+    def chance_node(self, board, depth, probability):
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        if depth <= 1 or probability < self.probability_cutoff:
+            return self.evaluate(board)
+
+        entry = self.transposition.get(board)
+        if entry is not None and entry[0] >= depth:
+            return entry[1]
+        # Like the transposition table, the persistent cache keys on depth
+        # only and ignores the probability the node was reached with
+        cache = self.cache
+        if cache is not None:
+            value = cache.lookup(board, depth)
+            if value is not None:
+                self.transposition[board] = (depth, value)
+                return value
+
+        empty = engine_2048.empty_cells(board)
+        spawn_probability = probability / len(empty)
+        total = 0.0
+        for index in empty:
+            shift = 4 * index
+            for exponent, chance in SPAWN_PROBABILITIES:
+                total += chance * self.max_node(board | (exponent << shift), depth - 1,
+                                                spawn_probability * chance)
+        value = total / len(empty)
+
+        self.transposition[board] = (depth, value)
+        if cache is not None:
+            cache.store(board, depth, value)
+        return value
@@ -0,0 +1,257 @@
+# Monte-Carlo swap search for match-3 autoplay, hints and difficulty ratings.
+#
+# The first matches of a swap are known, but every gem drop_gems() brings in
+# is random, and so is every cascade it sets off. Each valid swap is scored
+# by rollouts: it is played on a copy of the board whose refills come from a
+# freshly seeded generator and resolved, followed by depth - 1 random valid
+# swaps, and the points are averaged over many samples.
+#
+# Candidates are sampled in rounds of ROUND_SAMPLES rollouts each, spread over
+# a process pool. From CUTOFF_MIN_SAMPLES rollouts on, swaps whose mean
+# trails the leader's by more than CUTOFF_SIGMAS standard errors are dropped
+# after each round. The search stops once one swap is left, the time budget
+# is spent or every survivor has max_samples rollouts. The budget is checked
+# between rounds, so a decision can overrun it by up to one round.
+#
+# A rollout's seed only depends on the decision seed, the swap and the sample
+# number. Without a time budget the search therefore runs the same rounds and
+# returns the same swap for any number of workers or machine speed. With one,
+# how many rounds fit depends on how fast the rollouts run, and so may the
+# answer; pass time_budget=None (--budget 0) for reproducible decisions.
+#
+# Usage: python ai_match3.py --games 20 --moves 30 --workers 8
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import engine_match3
+import match3_core
+
+ROUND_SAMPLES = 8  # rollouts per candidate and round
+CUTOFF_SIGMAS = 3.0
+CUTOFF_MIN_SAMPLES = 16  # rare cascades need a few rounds to show up at all
+
+_scratch = None
+
+
+def scratch_state(grid_size, num_colors):
+    # One state per process, reloaded for every rollout
+    global _scratch
+    if _scratch is None or (_scratch.grid_size, _scratch.num_colors) != (grid_size, num_colors):
+        _scratch = match3_core.Match3State(seed=0, grid_size=grid_size, num_colors=num_colors)
+    return _scratch
+
+
+def rollout(state, grid, masks, swap, seed, depth):
+    # Points scored by one sampled future of playing swap on a stable board
+    state.grid = [line[:] for line in grid]
+    state.masks = masks[:]
+    state.mark_all_dirty()
+    state.rng.seed(seed)
+    state.score = 0
+    state.swap(*swap)
+    state.resolve()
+    state.ensure_playable()
+    for _ in range(depth - 1):
+        swaps = list(state.valid_swaps())
+        state.try_swap(*state.rng.choice(swaps))
+    return state.score
+
+
+def rollout_seed(decision_seed, candidate, sample):
+    return (decision_seed * 1_000_003 + candidate) * 1_000_003 + sample
+
+
+def _sample_chunk(grid, num_colors, decision_seed, depth, jobs):
+    # jobs: (candidate index, swap, first sample, count); returns
+    # (candidate index, sum, sum of squares, count) per job
+    state = scratch_state(len(grid), num_colors)
+    masks = engine_match3.masks_from_grid(grid, num_colors)
+    results = []
+    for candidate, swap, first, count in jobs:
+        total = 0.0
+        squares = 0.0
+        for sample in range(first, first + count):
+            points = rollout(state, grid, masks, swap, rollout_seed(decision_seed, candidate, sample), depth)
+            total += points
+            squares += points * points
+        results.append((candidate, total, squares, count))
+    return results
+
+
+class Candidate:
+    def __init__(self, index, swap):
+        self.index = index
+        self.swap = swap
+        self.total = 0.0
+        self.squares = 0.0
+        self.samples = 0
+
+    @property
+    def mean(self):
+        return self.total / self.samples if self.samples else 0.0
+
+    @property
+    def standard_error(self):
+        if self.samples < 2:
+            return math.inf
+        variance = max(0.0, (self.squares - self.total * self.mean) / (self.samples - 1))
+        return math.sqrt(variance / self.samples)
+
+
+class MonteCarloSolver:
+    def __init__(self, time_budget=0.05, max_samples=256, depth=1, workers=1, seed=0):
+        self.time_budget = time_budget  # seconds per decision, or None for a fixed sample count
+        self.max_samples = max_samples  # rollouts per candidate at most
+        self.depth = depth  # swaps per rollout, the candidate's own included
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.decisions = 0
+        self.executor = None  # started on the first parallel search
+
+        # Throughput counters, accumulated across searches
+        self.rollouts = 0
+        self.search_time = 0.0
+        self.last_candidates = []
+
+    @property
+    def rollouts_per_second(self):
+        if self.search_time <= 0:
+            return 0.0
+        return self.rollouts / self.search_time
+
+    def reset_stats(self):
+        self.rollouts = 0
+        self.search_time = 0.0
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def best_swap(self, state):
+        # The valid swap of a stable board with the most expected points, as
+        # (row1, col1, row2, col2), or None if there is none
+        start = time.perf_counter()
+        deadline = start + self.time_budget if self.time_budget else None
+        candidates = [Candidate(index, swap) for index, swap in enumerate(state.valid_swaps())]
+        self.last_candidates = candidates
+        decision_seed = self.seed * 1_000_003 + self.decisions
+        self.decisions += 1
+        try:
+            if len(candidates) < 2:
+                return candidates[0].swap if candidates else None
+            alive = candidates
+            grid = [line[:] for line in state.grid]
+            while True:
+                self.sample_round(grid, state.num_colors, decision_seed, alive)
+                alive = self.cut(alive)
+                if (len(alive) == 1 or alive[0].samples >= self.max_samples
+                        or (deadline is not None and time.perf_counter() >= deadline)):
+                    break
+            return max(alive, key=lambda candidate: candidate.mean).swap
+        finally:
+            self.search_time += time.perf_counter() - start
+
+    def sample_round(self, grid, num_colors, decision_seed, candidates):
+        count = min(ROUND_SAMPLES, self.max_samples - candidates[0].samples)
+        jobs = [(candidate.index, candidate.swap, candidate.samples, count) for candidate in candidates]
+        if self.workers <= 1:
+            results = _sample_chunk(grid, num_colors, decision_seed, self.depth, jobs)
+        else:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            chunks = [jobs[i::self.workers] for i in range(self.workers) if jobs[i::self.workers]]
+            futures = [self.executor.submit(_sample_chunk, grid, num_colors, decision_seed, self.depth, chunk)
+                       for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+
+        by_index = {candidate.index: candidate for candidate in candidates}
+        for index, total, squares, samples in results:
+            candidate = by_index[index]
+            candidate.total += total
+            candidate.squares += squares
+            candidate.samples += samples
+            self.rollouts += samples
+
+    def cut(self, candidates):
+        # Drop swaps that are clearly worse than the current leader
+        if candidates[0].samples < CUTOFF_MIN_SAMPLES:
+            return candidates
+        leader = max(candidates, key=lambda candidate: candidate.mean)
+        floor = leader.mean - CUTOFF_SIGMAS * leader.standard_error
+        return [candidate for candidate in candidates
+                if candidate is leader or candidate.mean + CUTOFF_SIGMAS * candidate.standard_error >= floor]
+
+
+def rate_board(state, solver):
+    # Difficulty figures for a stable board: how many valid swaps it has and
+    # the expected points of the best and of an average one
+    solver.best_swap(state)
+    candidates = solver.last_candidates
+    means = [candidate.mean for candidate in candidates if candidate.samples]
+    return {
+        "valid_swaps": len(candidates),
+        "best_points": max(means) if means else 0.0,
+        "mean_points": sum(means) / len(means) if means else 0.0,
+    }
+
+
+def play_games(solver, games, moves, grid_size=match3_core.GRID_SIZE,
+               num_colors=match3_core.NUM_COLORS, master_seed=0):
+    # Autoplay seeded games; returns score and decision-time statistics
+    seeds = random.Random(master_seed)
+    scores = []
+    decision_times = []
+    for _ in range(games):
+        state = match3_core.Match3State(seeds.getrandbits(64), grid_size, num_colors)
+        for _ in range(moves):
+            start = time.perf_counter()
+            swap = solver.best_swap(state)
+            decision_times.append(time.perf_counter() - start)
+            state.try_swap(*swap)
+        scores.append(state.score)
+    decision_times.sort()
+    return {
+        "games": games,
+        "moves": moves,
+        "mean_score": sum(scores) / len(scores) if scores else 0.0,
+        "points_per_move": sum(scores) / (games * moves) if games * moves else 0.0,
+        "decision_ms_p50": 1000 * decision_times[len(decision_times) // 2] if decision_times else 0.0,
+        "decision_ms_max": 1000 * decision_times[-1] if decision_times else 0.0,
+        "rollouts_per_second": round(solver.rollouts_per_second, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autoplay seeded match-3 games with the Monte-Carlo solver")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--moves", type=int, default=30)
+    parser.add_argument("--size", type=int, default=match3_core.GRID_SIZE)
+    parser.add_argument("--colors", type=int, default=match3_core.NUM_COLORS)
+    parser.add_argument("--budget", type=float, default=0.05, help="seconds per decision (0: no limit)")
+    parser.add_argument("--samples", type=int, default=256, help="rollouts per swap at most")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with MonteCarloSolver(args.budget or None, args.samples, args.depth, args.workers, args.seed) as solver:
+        summary = play_games(solver, args.games, args.moves, args.size, args.colors, args.seed)
+    summary["workers"] = solver.workers
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Time-based animation shared by both games.
+#
+# Sprites are moved by duration-based tweens instead of a fixed number of
+# pixels per frame, so an animation takes the same wall-clock time at 30,
+# 60 or 144 Hz. Game logic advances in fixed steps (FixedTimestep) fed by
+# the real frame time from clock.tick(), independent of the render rate.
+
+
+# Easing functions map linear progress t in [0, 1] to eased progress
+
+def linear(t):
+    return t
+
+
+def ease_in_quad(t):
+    return t * t
+
+
+def ease_out_quad(t):
+    return t * (2 - t)
+
+
+def ease_in_out_quad(t):
+    if t < 0.5:
+        return 2 * t * t
+    return 1 - 2 * (1 - t) * (1 - t)
+
+
+def ease_out_cubic(t):
+    t -= 1
+    return t * t * t + 1
+
+
+class Tween:
+    def __init__(self, target, x, y, duration, easing=ease_out_quad, delay=0.0, on_complete=None):
+        self.target = target
+        self.start_x = target.x
+        self.start_y = target.y
+        self.end_x = x
+        self.end_y = y
+        self.duration = duration
+        self.easing = easing
+        self.delay = delay
+        self.on_complete = on_complete
+        self.elapsed = 0.0
+
+    def update(self, dt):
+        # Returns True once the tween has reached its end position
+        self.elapsed += dt
+        t = self.elapsed - self.delay
+        if t < 0:
+            return False
+        if self.duration <= 0 or t >= self.duration:
+            self.target.x = self.end_x
+            self.target.y = self.end_y
+            return True
+        progress = self.easing(t / self.duration)
+        self.target.x = round(self.start_x + (self.end_x - self.start_x) * progress)
+        self.target.y = round(self.start_y + (self.end_y - self.start_y) * progress)
+        return False
+
+
+class Animator:
+    # Owns every running tween; one positional tween per sprite
+    def __init__(self):
+        self.tweens = {}
+
+    @property
+    def busy(self):
+        return bool(self.tweens)
+
+    def move(self, target, x, y, duration, easing=ease_out_quad, delay=0.0, on_complete=None):
+        # A new tween replaces any running one and starts from the current position
+        self.tweens[id(target)] = Tween(target, x, y, duration, easing, delay, on_complete)
+
+    def cancel(self, target):
+        self.tweens.pop(id(target), None)
+
+    def update(self, dt):
+        # Advance all tweens by dt seconds; returns True while any is running
+        finished = [key for key, tween in self.tweens.items() if tween.update(dt)]
+        for key in finished:
+            tween = self.tweens.pop(key)
+            if tween.on_complete is not None:
+                tween.on_complete()
+        return bool(self.tweens)
+
+    def finish_all(self):
+        # Jump every sprite to its destination
+        while self.tweens:
+            self.update(float("inf"))
+
+    def clear(self):
+        self.tweens.clear()
+
+
+class FixedTimestep:
+    # Converts variable frame times into a whole number of fixed logic steps
+    def __init__(self, step=1 / 120, max_steps=12):
+        self.step = step
+        self.max_steps = max_steps  # drop time after long stalls instead of spiralling
+        self.accumulator = 0.0
+
+    def advance(self, dt):
+        self.accumulator += dt
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
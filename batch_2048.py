@@ -0,0 +1,151 @@
+# Vectorized NumPy simulator that steps many 2048 games at once.
+#
+# Boards are an (N, 4, 4) uint8 array of log2 exponents, the same encoding
+# as engine_2048. A move is applied to every board in one pass: each board is
+# gathered into "slide left" orientation for its own direction, its rows are
+# packed into 16-bit indices and looked up in the engine's row tables (which
+# also give the score gained), and the result is scattered back. No Python
+# code runs per board or per cell.
+
+import numpy as np
+
+import engine_2048
+
+GRID_SIZE = engine_2048.GRID_SIZE
+CELLS = GRID_SIZE * GRID_SIZE
+
+engine_2048.build_tables()
+ROW_LEFT = np.array(engine_2048.ROW_LEFT, dtype=np.uint16)
+ROW_SCORE = np.array(engine_2048.ROW_SCORE, dtype=np.int64)
+
+
+def _orientation_permutations():
+    # ORIENT[d][i] is the flat cell read into slot i of the left-oriented board
+    orient = np.zeros((4, CELLS), dtype=np.intp)
+    for row in range(GRID_SIZE):
+        for col in range(GRID_SIZE):
+            slot = row * GRID_SIZE + col
+            orient[engine_2048.LEFT, slot] = row * GRID_SIZE + col
+            orient[engine_2048.RIGHT, slot] = row * GRID_SIZE + (GRID_SIZE - 1 - col)
+            orient[engine_2048.UP, slot] = col * GRID_SIZE + row
+            orient[engine_2048.DOWN, slot] = (GRID_SIZE - 1 - col) * GRID_SIZE + row
+    restore = np.argsort(orient, axis=1)
+    return orient, restore
+
+
+ORIENT, RESTORE = _orientation_permutations()
+TRANSPOSE = ORIENT[engine_2048.UP]
+
+
+def pack_rows(flat):
+    # (N, 16) exponents -> (N, 4) 16-bit rows in engine_2048 nibble order
+    packed = flat[:, 0::2] | (flat[:, 1::2] << 4)
+    return np.ascontiguousarray(packed).view(np.uint16)
+
+
+def unpack_rows(rows):
+    # Inverse of pack_rows
+    row_bytes = rows.view(np.uint8)
+    flat = np.empty((rows.shape[0], CELLS), dtype=np.uint8)
+    flat[:, 0::2] = row_bytes & 0xF
+    flat[:, 1::2] = row_bytes >> 4
+    return flat
+
+
+def slide(boards, moves):
+    # Apply one move per board; returns (new_boards, score_deltas, valid)
+    count = boards.shape[0]
+    flat = boards.reshape(count, CELLS)
+    oriented = np.take_along_axis(flat, ORIENT[moves], axis=1)
+
+    rows = pack_rows(oriented)
+    new_rows = ROW_LEFT[rows]
+    score_deltas = ROW_SCORE[rows].sum(axis=1)
+    valid = (new_rows != rows).any(axis=1)
+
+    new_flat = np.take_along_axis(unpack_rows(new_rows), RESTORE[moves], axis=1)
+    return new_flat.reshape(boards.shape), score_deltas, valid
+
+
+def legal_moves(boards):
+    # (N, 4) mask of moves that change each board
+    count = boards.shape[0]
+    mask = np.zeros((count, 4), dtype=bool)
+    for direction in engine_2048.DIRECTIONS:
+        _, _, valid = slide(boards, np.full(count, direction, dtype=np.intp))
+        mask[:, direction] = valid
+    return mask
+
+
+def game_over(boards):
+    # Vectorized Game2048.is_game_over: a full board whose rows and columns cannot merge
+    count = boards.shape[0]
+    flat = boards.reshape(count, CELLS)
+    rows = pack_rows(flat)
+    columns = pack_rows(flat[:, TRANSPOSE])
+    return ((flat != 0).all(axis=1)
+            & (ROW_LEFT[rows] == rows).all(axis=1)
+            & (ROW_LEFT[columns] == columns).all(axis=1))
+
+
+def spawn(boards, rng, mask=None):
+    # Add a 2 (90%) or 4 (10%) on a uniformly chosen empty cell of each board
+    count = boards.shape[0]
+    flat = boards.reshape(count, CELLS)
+    empty = flat == 0
+    if mask is not None:
+        empty &= mask[:, None]
+
+    # Pick the k-th empty cell of each board, k uniform in [0, empty count)
+    running = np.cumsum(empty, axis=1, dtype=np.int8)
+    totals = running[:, -1]
+    picks = (rng.random(count) * totals).astype(np.int8)
+    cells = (running > picks[:, None]).argmax(axis=1)
+    has_cell = totals > 0
+
+    exponents = np.where(rng.random(count) < 0.9, 1, 2).astype(np.uint8)
+    rows = np.nonzero(has_cell)[0]
+    flat[rows, cells[rows]] = exponents[rows]
+    return has_cell
+
+
+class BatchGame2048:
+    def __init__(self, count, seed=None):
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((count, GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+        self.scores = np.zeros(count, dtype=np.int64)
+        self.moves = np.zeros(count, dtype=np.int64)
+        self.reset()
+
+    def reset(self, mask=None):
+        # Start fresh games (all of them, or those selected by mask)
+        if mask is None:
+            mask = np.ones(self.count, dtype=bool)
+        self.boards[mask] = 0
+        self.scores[mask] = 0
+        self.moves[mask] = 0
+        spawn(self.boards, self.rng, mask)
+        spawn(self.boards, self.rng, mask)
+
+    def step(self, moves):
+        # Apply a vector of directions; invalid moves leave their board untouched
+        moves = np.asarray(moves, dtype=np.intp)
+        new_boards, score_deltas, valid = slide(self.boards, moves)
+        self.boards[...] = new_boards
+        self.scores += score_deltas
+        self.moves += valid
+        spawn(self.boards, self.rng, valid)
+        return score_deltas, valid
+
+    def legal_moves(self):
+        return legal_moves(self.boards)
+
+    def game_over(self):
+        return game_over(self.boards)
+
+    def to_bitboards(self):
+        # Pack every board into an engine_2048 bitboard (Python ints)
+        flat = self.boards.reshape(self.count, CELLS).astype(np.uint64)
+        packed = np.bitwise_or.reduce(flat << (np.arange(CELLS, dtype=np.uint64) * np.uint64(4)), axis=1)
+        return [int(board) for board in packed]
@@ -0,0 +1,303 @@
+# Vectorized NumPy simulator that plays many match-3 boards at once, for
+# balancing the board size and number of gem colours.
+#
+# Boards are an (N, H, W) int8 array of colour indices, with EMPTY for a
+# cleared cell. Runs of three are found by comparing each board with itself
+# shifted by one and two cells; gravity is a stable sort of every column on
+# "is occupied", which moves the holes to the top while gems keep their order;
+# refills are drawn from one seeded generator. All N boards resolve their
+# cascades in lockstep: each round clears, drops and refills every board that
+# still has a match, until none has.
+#
+# The rules follow match3_core: new boards have no match and at least one
+# valid swap, only swaps that make a match are played, and a board left
+# without a valid swap is reshuffled.
+#
+# Usage: python batch_match3.py --size 7 8 9 --colors 5 6 7 --boards 10000 --moves 50
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import match3_core
+
+EMPTY = -1
+PAD = 3  # cells of EMPTY border around boards when checking swaps
+
+
+def match_mask(boards):
+    # (N, H, W) mask of gems in a horizontal or vertical run of three or more
+    filled = boards != EMPTY
+    matched = np.zeros(boards.shape, dtype=bool)
+
+    starts = (filled[:, :, :-2] & (boards[:, :, :-2] == boards[:, :, 1:-1])
+              & (boards[:, :, 1:-1] == boards[:, :, 2:]))
+    matched[:, :, :-2] |= starts
+    matched[:, :, 1:-1] |= starts
+    matched[:, :, 2:] |= starts
+
+    starts = (filled[:, :-2, :] & (boards[:, :-2, :] == boards[:, 1:-1, :])
+              & (boards[:, 1:-1, :] == boards[:, 2:, :]))
+    matched[:, :-2, :] |= starts
+    matched[:, 1:-1, :] |= starts
+    matched[:, 2:, :] |= starts
+    return matched
+
+
+def collapse(boards):
+    # Let gems fall: holes move to the top of each column, gems keep their order
+    order = np.argsort(boards != EMPTY, axis=1, kind="stable")
+    return np.take_along_axis(boards, order, axis=1)
+
+
+def refill(boards, num_colors, rng):
+    empty = boards == EMPTY
+    boards[empty] = rng.integers(0, num_colors, int(empty.sum()), dtype=np.int8)
+
+
+def swap_table(height, width):
+    # (S, 4) array of (row1, col1, row2, col2), horizontal swaps in reading
+    # order followed by vertical ones; the column order of legal_swaps()
+    swaps = [(row, col, row, col + 1) for row in range(height) for col in range(width - 1)]
+    swaps += [(row, col, row + 1, col) for row in range(height - 1) for col in range(width)]
+    return np.array(swaps, dtype=np.intp).reshape(-1, 4)
+
+
+def legal_swaps(boards):
+    # (N, S) mask of the swaps in swap_table() that make a match. Only the
+    # lines through the two swapped cells can change, so each gem is compared
+    # with the cells up to two away from where it lands, for all swaps of all
+    # boards at once.
+    count, height, width = boards.shape
+    padded = np.full((count, height + 2 * PAD, width + 2 * PAD), EMPTY, dtype=boards.dtype)
+    padded[:, PAD:-PAD, PAD:-PAD] = boards
+
+    def cells(row, col, rows, cols):
+        # Value at (r + row, c + col) for every swap anchored at (r, c)
+        return padded[:, PAD + row:PAD + row + rows, PAD + col:PAD + col + cols]
+
+    def forms_line(color, row, col, rows, cols, away_row, away_col):
+        # Does color, landing at (row, col), make a run with unchanged cells?
+        # (away_row, away_col) points away from the partner cell: the line
+        # along the swap only extends that way, the crossing line both ways.
+        def same(dr, dc):
+            return cells(row + dr, col + dc, rows, cols) == color
+        cross_row, cross_col = away_col, away_row
+        return ((same(away_row, away_col) & same(2 * away_row, 2 * away_col))
+                | (same(cross_row, cross_col) & same(2 * cross_row, 2 * cross_col))
+                | (same(-cross_row, -cross_col) & same(-2 * cross_row, -2 * cross_col))
+                | (same(cross_row, cross_col) & same(-cross_row, -cross_col)))
+
+    rows, cols = height, width - 1
+    left = cells(0, 0, rows, cols)
+    right = cells(0, 1, rows, cols)
+    horizontal = (left != right) & (forms_line(right, 0, 0, rows, cols, 0, -1)
+                                    | forms_line(left, 0, 1, rows, cols, 0, 1))
+
+    rows, cols = height - 1, width
+    top = cells(0, 0, rows, cols)
+    bottom = cells(1, 0, rows, cols)
+    vertical = (top != bottom) & (forms_line(bottom, 0, 0, rows, cols, -1, 0)
+                                  | forms_line(top, 1, 0, rows, cols, 1, 0))
+    return np.concatenate([horizontal.reshape(count, -1), vertical.reshape(count, -1)], axis=1)
+
+
+def generate_boards(count, size, num_colors, rng):
+    # Random boards without matches, built like match3_core.generate_grid:
+    # cell by cell, each picking among the colours that do not complete a
+    # run to its left or above, for all boards at once
+    if num_colors < 3:
+        raise ValueError("a board without matches needs at least 3 colours")
+    boards = np.empty((count, size, size), dtype=np.int8)
+    none = np.full(count, EMPTY, dtype=np.int8)
+    for row in range(size):
+        for col in range(size):
+            left = none
+            if col >= 2:
+                left = np.where(boards[:, row, col - 1] == boards[:, row, col - 2], boards[:, row, col - 1], EMPTY)
+            above = none
+            if row >= 2:
+                above = np.where(boards[:, row - 1, col] == boards[:, row - 2, col], boards[:, row - 1, col], EMPTY)
+                above = np.where(above == left, EMPTY, above)
+            low = np.where((left == EMPTY) | ((above != EMPTY) & (above < left)), above, left)
+            high = np.where(low == left, above, left)
+            choices = num_colors - (left != EMPTY) - (above != EMPTY)
+            color = (rng.random(count) * choices).astype(np.int8)
+            # Step over the banned colours, lowest first
+            color += (low != EMPTY) & (color >= low)
+            color += (high != EMPTY) & (color >= high)
+            boards[:, row, col] = color
+    return boards
+
+
+def new_boards(count, size, num_colors, rng, min_moves=1):
+    # Boards without matches that offer at least min_moves valid swaps, as
+    # Match3State.initialize_grid
+    boards = generate_boards(count, size, num_colors, rng)
+    pending = np.nonzero(legal_swaps(boards).sum(axis=1) < min_moves)[0]
+    while len(pending):
+        fresh = generate_boards(len(pending), size, num_colors, rng)
+        boards[pending] = fresh
+        pending = pending[legal_swaps(fresh).sum(axis=1) < min_moves]
+    return boards
+
+
+class BatchMatch3:
+    def __init__(self, count, size=match3_core.GRID_SIZE, num_colors=match3_core.NUM_COLORS, seed=None,
+                 min_moves=1):
+        self.count = count
+        self.size = size
+        self.num_colors = num_colors
+        self.min_moves = min_moves  # valid swaps a new board must offer
+        self.rng = np.random.default_rng(seed)
+        self.swaps = swap_table(size, size)
+        self.boards = np.zeros((count, size, size), dtype=np.int8)
+        self.scores = np.zeros(count, dtype=np.int64)
+        self.moves = np.zeros(count, dtype=np.int64)
+        self.legal = np.zeros((count, len(self.swaps)), dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        # Start fresh boards (all of them, or those selected by mask)
+        if mask is None:
+            mask = np.ones(self.count, dtype=bool)
+        rows = np.nonzero(mask)[0]
+        self.boards[rows] = new_boards(len(rows), self.size, self.num_colors, self.rng, self.min_moves)
+        self.scores[rows] = 0
+        self.moves[rows] = 0
+        self.legal[rows] = legal_swaps(self.boards[rows])
+
+    def sample_actions(self):
+        # A uniformly random valid swap per board, as an index into self.swaps
+        weights = self.rng.random(self.legal.shape) * self.legal
+        return weights.argmax(axis=1)
+
+    def step(self, actions):
+        # Play one swap per board (indices into self.swaps) and resolve every
+        # cascade. Swaps that make no match leave their board untouched.
+        # Returns (points, cascade depths, valid, reshuffled) per board.
+        actions = np.asarray(actions, dtype=np.intp)
+        boards = self.boards
+        valid = self.legal[np.arange(self.count), actions]
+        rows = np.nonzero(valid)[0]
+        row1, col1, row2, col2 = self.swaps[actions[rows]].T
+        first = boards[rows, row1, col1]
+        boards[rows, row1, col1] = boards[rows, row2, col2]
+        boards[rows, row2, col2] = first
+
+        points, depths = self.resolve()
+        self.scores += points
+        self.moves += valid
+
+        self.legal[...] = legal_swaps(boards)
+        reshuffled = ~self.legal.any(axis=1)
+        if reshuffled.any():
+            self.reshuffle(reshuffled)
+        return points, depths, valid, reshuffled
+
+    def resolve(self):
+        # Clear, drop and refill in lockstep until no board has a match;
+        # returns (points, number of clearing rounds) per board. Each round
+        # only works on the boards still cascading, which thin out quickly.
+        points = np.zeros(self.count, dtype=np.int64)
+        depths = np.zeros(self.count, dtype=np.int64)
+        rows = np.arange(self.count)
+        boards = self.boards
+        matched = match_mask(boards)
+        while True:
+            active = matched.any(axis=(1, 2))
+            rows = rows[active]
+            if not len(rows):
+                return points, depths
+            matched = matched[active]
+            points[rows] += matched.sum(axis=(1, 2)) * match3_core.MATCH_POINTS
+            depths[rows] += 1
+            cascading = boards[rows]
+            cascading[matched] = EMPTY
+            cascading = collapse(cascading)
+            refill(cascading, self.num_colors, self.rng)
+            boards[rows] = cascading
+            matched = match_mask(cascading)
+
+    def reshuffle(self, mask, attempts=100):
+        # Shuffle the gems of each selected board until it has no match and a
+        # valid swap, as Match3State.reshuffle; fresh boards if that fails
+        rows = np.nonzero(mask)[0]
+        shape = (-1, self.size, self.size)
+        for _ in range(attempts):
+            if not len(rows):
+                break
+            flat = self.boards[rows].reshape(len(rows), -1)
+            shuffled = self.rng.permuted(flat, axis=1).reshape(shape)
+            self.boards[rows] = shuffled
+            legal = legal_swaps(shuffled)
+            self.legal[rows] = legal
+            rows = rows[match_mask(shuffled).any(axis=(1, 2)) | ~legal.any(axis=1)]
+        if len(rows):
+            self.boards[rows] = new_boards(len(rows), self.size, self.num_colors, self.rng, self.min_moves)
+            self.legal[rows] = legal_swaps(self.boards[rows])
+
+
+def distribution(values):
+    return {
+        "mean": float(values.mean()) if len(values) else 0.0,
+        "min": int(values.min()) if len(values) else 0,
+        "p10": float(np.percentile(values, 10)) if len(values) else 0.0,
+        "p50": float(np.percentile(values, 50)) if len(values) else 0.0,
+        "p90": float(np.percentile(values, 90)) if len(values) else 0.0,
+        "max": int(values.max()) if len(values) else 0,
+    }
+
+
+def simulate(size, num_colors, boards, moves, seed=0, min_moves=1):
+    # Play `moves` random valid swaps on each of `boards` boards; returns
+    # cascade-depth, score-per-move and deadlock statistics
+    start = time.perf_counter()
+    game = BatchMatch3(boards, size, num_colors, seed, min_moves)
+    points = np.zeros((moves, boards), dtype=np.int64)
+    depths = np.zeros((moves, boards), dtype=np.int64)
+    deadlocks = 0
+    for turn in range(moves):
+        points[turn], depths[turn], _, reshuffled = game.step(game.sample_actions())
+        deadlocks += int(reshuffled.sum())
+    elapsed = time.perf_counter() - start
+
+    played = boards * moves
+    counts = np.bincount(depths.ravel())
+    return {
+        "size": size,
+        "colors": num_colors,
+        "boards": boards,
+        "moves": moves,
+        "seed": seed,
+        "min_moves": min_moves,
+        "score_per_move": distribution(points.ravel()),
+        "cascade_depth": distribution(depths.ravel()),
+        "cascade_depths": {str(depth): int(count) for depth, count in enumerate(counts) if count},
+        "deadlock_rate": deadlocks / played if played else 0.0,
+        "final_score": distribution(game.scores),
+        "seconds": round(elapsed, 3),
+        "moves_per_second": round(played / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many random match-3 boards at once and report balance statistics")
+    parser.add_argument("--size", type=int, nargs="+", default=[match3_core.GRID_SIZE])
+    parser.add_argument("--colors", type=int, nargs="+", default=[match3_core.NUM_COLORS])
+    parser.add_argument("--boards", type=int, default=10000)
+    parser.add_argument("--moves", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-moves", type=int, default=1, help="valid swaps every new board must offer")
+    args = parser.parse_args()
+
+    # Every combination of the given sizes and colour counts, with the same seed
+    results = [simulate(size, num_colors, args.boards, args.moves, args.seed, args.min_moves)
+               for size in args.size for num_colors in args.colors]
+    print(json.dumps(results if len(results) > 1 else results[0], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,656 @@
+# Benchmark suite for the engine, rules and rendering hot paths.
+#
+# Every benchmark is built from fixtures generated with a fixed seed, so two
+# runs measure exactly the same work. Each one is timed as a number of
+# independent samples (seconds per operation); results go to JSON so a later
+# run can be compared against them. The comparison flags a slowdown only when
+# it is both larger than a threshold and statistically significant under a
+# one-sided Mann-Whitney U test on the samples, which keeps ordinary timing
+# noise from being reported as a regression.
+#
+# Usage: python benchmark.py run --out before.json
+#        python benchmark.py run --out after.json
+#        python benchmark.py compare before.json after.json
+#        python benchmark.py scaling after.json
+#        python benchmark.py alloc --filter 'view.*'
+
+import argparse
+import fnmatch
+import gc
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import core_2048
+import engine_2048
+import match3_core
+
+FIXTURE_SEED = 2048
+MATCH3_SIZES = (7, 9, 12)
+MATCH3_LARGE_SIZES = MATCH3_SIZES + (16, 32)
+# Sizes around match3_core.INCREMENTAL_MIN_SIZE, for the cascade paths
+MATCH3_CASCADE_SIZES = MATCH3_LARGE_SIZES + (64, 96, 128)
+BOARD_2048_SIZES = (4, 5, 6, 8, 12, 16)
+
+BENCHMARKS = []
+
+
+def benchmark(name, sizes=(None,)):
+    # Register setup(size) -> (run, ops); run() performs ops operations
+    def decorate(setup):
+        BENCHMARKS.append((name, sizes, setup))
+        return setup
+    return decorate
+
+
+def benchmark_names():
+    names = []
+    for name, sizes, _ in BENCHMARKS:
+        for size in sizes:
+            names.append(name if size is None else f"{name}[{size}]")
+    return names
+
+
+# Fixtures
+
+def boards_2048(count=1000):
+    # Positions from random seeded games, early and late game alike
+    rng = random.Random(FIXTURE_SEED)
+    boards = []
+    while len(boards) < count:
+        state = core_2048.Game2048State(seed=rng.getrandbits(64))
+        while not state.is_game_over() and len(boards) < count:
+            boards.append(state.board)
+            state.step(rng.randrange(4))
+    return boards
+
+
+def boards_nxn(size, count=400):
+    # Positions from random seeded games on a size x size board
+    rng = random.Random(FIXTURE_SEED + size)
+    boards = []
+    while len(boards) < count:
+        state = core_2048.Game2048State(seed=rng.getrandbits(64), size=size)
+        for _ in range(rng.randrange(4 * size * size)):
+            if state.is_game_over():
+                break
+            state.step(rng.randrange(4))
+        boards.append(state.board)
+    return boards
+
+
+def random_grids(size, count=200):
+    rng = random.Random(FIXTURE_SEED + size)
+    return [[[rng.randrange(match3_core.NUM_COLORS) for _ in range(size)] for _ in range(size)]
+            for _ in range(count)]
+
+
+def copy_grid(grid):
+    return [row[:] for row in grid]
+
+
+def matching_swap(state):
+    # First horizontal swap on a stable board that makes a match, or None
+    size = state.grid_size
+    for row in range(size):
+        for col in range(size - 1):
+            state.swap(row, col, row, col + 1)
+            found = state.find_matches()
+            state.swap(row, col, row, col + 1)
+            if found:
+                return row, col, row, col + 1
+    return None
+
+
+def cascade_fixtures(size, count=50):
+    # (grid, masks, swap, rng state) for stable boards plus a swap that makes a match
+    fixtures = []
+    seed = FIXTURE_SEED
+    while len(fixtures) < count:
+        seed += 1
+        state = match3_core.Match3State(seed=seed, grid_size=size)
+        swap = matching_swap(state)
+        if swap is not None:
+            fixtures.append((copy_grid(state.grid), state.masks[:], swap, state.rng.getstate()))
+    return fixtures
+
+
+# 2048 rules
+
+@benchmark("2048.move")
+def bench_2048_move(size):
+    boards = boards_2048()
+    state = core_2048.Game2048State(seed=FIXTURE_SEED)
+    moves = (state.move_left, state.move_right, state.move_up, state.move_down)
+
+    def run():
+        for board in boards:
+            for move in moves:
+                state.board = board
+                move()
+        state.move_log.clear()
+    return run, len(boards) * len(moves)
+
+
+@benchmark("2048.is_game_over")
+def bench_2048_is_game_over(size):
+    boards = boards_2048()
+    state = core_2048.Game2048State(seed=FIXTURE_SEED)
+
+    def run():
+        for board in boards:
+            state.board = board
+            state.is_game_over()
+    return run, len(boards)
+
+
+@benchmark("2048.grid_move", BOARD_2048_SIZES)
+def bench_2048_grid_move(size):
+    # The generic NxN kernel (also at 4x4, where games normally use bitboards)
+    rules = engine_2048.GridRules(size)
+    native = engine_2048.rules_for(size)
+    boards = [rules.from_values(native.to_values(board)) for board in boards_nxn(size)]
+    move = rules.move
+
+    def run():
+        for board in boards:
+            for direction in engine_2048.DIRECTIONS:
+                move(board, direction)
+    return run, len(boards) * len(engine_2048.DIRECTIONS)
+
+
+# Match-3 rules
+
+@benchmark("match3.find_matches", MATCH3_LARGE_SIZES)
+def bench_match3_find_matches(size):
+    state = match3_core.Match3State(seed=FIXTURE_SEED, grid_size=size)
+    fixtures = []
+    for grid in random_grids(size):
+        state.set_grid(grid)
+        fixtures.append(state.masks)
+
+    def run():
+        for masks in fixtures:
+            state.masks = masks
+            state.mark_all_dirty()  # a full scan, not an incremental one
+            state.find_matches()
+    return run, len(fixtures)
+
+
+@benchmark("match3.initialize_grid", MATCH3_LARGE_SIZES)
+def bench_match3_initialize_grid(size):
+    # A new board without matches that has a valid swap
+    state = match3_core.Match3State(seed=FIXTURE_SEED, grid_size=size)
+
+    def run():
+        for _ in range(20):
+            state.initialize_grid()
+    return run, 20
+
+
+@benchmark("match3.remove_matches", MATCH3_SIZES)
+def bench_match3_remove_matches(size):
+    # Includes copying the grid and match marks back in before each call
+    state = match3_core.Match3State(seed=FIXTURE_SEED, grid_size=size)
+    fixtures = []
+    for grid in random_grids(size):
+        state.set_grid(grid)
+        state.find_matches()
+        fixtures.append((grid, state.masks, state.match_mask))
+
+    def run():
+        for grid, masks, match_mask in fixtures:
+            state.grid = copy_grid(grid)
+            state.masks = masks
+            state.match_mask = match_mask
+            state.remove_matches()
+    return run, len(fixtures)
+
+
+@benchmark("match3.drop_gems", MATCH3_SIZES)
+def bench_match3_drop_gems(size):
+    # Includes copying the grid (with its cleared cells) before each call
+    state = match3_core.Match3State(seed=FIXTURE_SEED, grid_size=size)
+    grids = []
+    for grid in random_grids(size):
+        state.set_grid(copy_grid(grid))
+        state.find_matches()
+        state.remove_matches()
+        grids.append((state.grid, state.masks))
+
+    def run():
+        state.rng.seed(FIXTURE_SEED)
+        for grid, masks in grids:
+            state.grid = copy_grid(grid)
+            state.masks = masks[:]
+            state.drop_gems()
+    return run, len(grids)
+
+
+@benchmark("match3.valid_swaps", MATCH3_SIZES)
+def bench_match3_valid_swaps(size):
+    # Every valid swap of a stable board, as used for hints and deadlock checks
+    fixtures = cascade_fixtures(size)
+    state = match3_core.Match3State(seed=FIXTURE_SEED, grid_size=size)
+
+    def run():
+        for grid, masks, _, _ in fixtures:
+            state.grid = grid
+            state.masks = masks
+            for _ in state.valid_swaps():
+                pass
+    return run, len(fixtures)
+
+
+@benchmark("match3.resolve", MATCH3_CASCADE_SIZES)
+def bench_match3_resolve(size):
+    # A matching swap and its cascade alone, without the deadlock check
+    fixtures = cascade_fixtures(size)
+    state = match3_core.Match3State(seed=FIXTURE_SEED, grid_size=size)
+
+    def run():
+        # Stable boards are loaded as in match3.cascade below
+        for grid, masks, swap, rng_state in fixtures:
+            state.grid = copy_grid(grid)
+            state.masks = masks[:]
+            state.rng.setstate(rng_state)
+            state.swap(*swap)
+            state.resolve()
+    return run, len(fixtures)
+
+
+@benchmark("match3.cascade", MATCH3_CASCADE_SIZES)
+def bench_match3_cascade(size):
+    # A matching swap resolved until the board is stable (one full turn)
+    fixtures = cascade_fixtures(size)
+    state = match3_core.Match3State(seed=FIXTURE_SEED, grid_size=size)
+
+    def run():
+        # Every turn leaves nothing dirty and no matches, so loading a
+        # stable board this way keeps the incremental matcher consistent
+        for grid, masks, swap, rng_state in fixtures:
+            state.grid = copy_grid(grid)
+            state.masks = masks[:]
+            state.rng.setstate(rng_state)
+            state.try_swap(*swap)
+    return run, len(fixtures)
+
+
+@benchmark("match3.cascade_timeline", MATCH3_SIZES)
+def bench_match3_cascade_timeline(size):
+    # The same turns resolved in one pass into a playback timeline, as the view does
+    fixtures = cascade_fixtures(size)
+    state = match3_core.Match3State(seed=FIXTURE_SEED, grid_size=size)
+
+    def run():
+        for grid, masks, swap, rng_state in fixtures:
+            state.grid = copy_grid(grid)
+            state.masks = masks[:]
+            state.rng.setstate(rng_state)
+            state.swap(*swap)
+            state.resolve_timeline()
+    return run, len(fixtures)
+
+
+# Rendering, on an offscreen surface
+
+def offscreen_view(view_class, width, height):
+    import pygame
+    pygame.init()
+    view = view_class(dirty_rects=False, idle_mode=False, seed=FIXTURE_SEED,
+                      screen=pygame.Surface((width, height)))
+    view.toast_duration = 1e9  # keep the toast visible for the whole run
+    view.show_toast("Benchmark toast")
+    return view
+
+
+def render_2048_view():
+    import game_2048
+    view = offscreen_view(game_2048.Game2048, game_2048.SCREEN_WIDTH, game_2048.SCREEN_HEIGHT)
+    rng = random.Random(FIXTURE_SEED)
+    for _ in range(200):
+        if view.apply_move(rng.randrange(4)):
+            view.animator.finish_all()
+            view.finish_move()
+    view.won = view.game_over = False
+    return view
+
+
+def render_match3_view():
+    import match3_game
+    return offscreen_view(match3_game.Match3Game, match3_game.SCREEN_WIDTH, match3_game.SCREEN_HEIGHT)
+
+
+def bench_draw(make_view, method):
+    def setup(size):
+        draw = getattr(make_view(), method)
+
+        def run():
+            for _ in range(10):
+                draw()
+        return run, 10
+    return setup
+
+
+for _game, _make_view in (("2048", render_2048_view), ("match3", render_match3_view)):
+    for _method in ("draw_grid", "draw_score", "draw_toast", "draw_frame"):
+        benchmark(f"render.{_game}.{_method}")(bench_draw(_make_view, _method))
+
+
+@benchmark("view.2048.move")
+def bench_view_2048_move(size):
+    # One complete move through the pygame view: slide, tile animation, spawn
+    view = render_2048_view()
+    rng = random.Random(FIXTURE_SEED)
+
+    def run():
+        if view.is_game_over():
+            view.reset_game(rng.getrandbits(64))
+        if view.apply_move(rng.randrange(4)):
+            view.animator.finish_all()
+            view.finish_move()
+    return run, 1
+
+
+# Timing
+
+def measure(run, ops, repeat, min_time):
+    # Calibrate the loop count so one sample lasts at least min_time
+    run()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            samples.append((time.perf_counter() - start) / (number * ops))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return samples
+
+
+def measure_allocations(run, ops, repeat):
+    # Peak bytes traced by tracemalloc while run() executes, above what was
+    # allocated before it started, and blocks still held afterwards; both
+    # divided by ops. gc is off so only reference counting frees memory.
+    run()
+    peaks = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        start_blocks = len(tracemalloc.take_snapshot().traces)
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            run()
+            peaks.append((tracemalloc.get_traced_memory()[1] - before) / ops)
+        retained = (len(tracemalloc.take_snapshot().traces) - start_blocks) / (repeat * ops)
+    finally:
+        tracemalloc.stop()
+        if gc_enabled:
+            gc.enable()
+    return {"peak_bytes": statistics.median(peaks), "max_peak_bytes": max(peaks), "retained_blocks": retained}
+
+
+def run_allocations(pattern="view.*", repeat=200, log=print):
+    results = {}
+    for name, sizes, setup in BENCHMARKS:
+        for size in sizes:
+            full_name = name if size is None else f"{name}[{size}]"
+            if not fnmatch.fnmatch(full_name, pattern):
+                continue
+            try:
+                run, ops = setup(size)
+            except ImportError as e:
+                log(f"{full_name:36} skipped ({e})")
+                continue
+            result = measure_allocations(run, ops, repeat)
+            results[full_name] = result
+            log(f"{full_name:36} {result['peak_bytes']:>10,.0f} B/op peak (max {result['max_peak_bytes']:,.0f})  "
+                f"{result['retained_blocks']:.2f} blocks/op retained")
+    return results
+
+
+def summarize(samples):
+    median = statistics.median(samples)
+    return {
+        "samples": samples,
+        "median": median,
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+        "ops_per_second": 1.0 / median if median > 0 else 0.0,
+    }
+
+
+def run_benchmarks(pattern="*", repeat=15, min_time=0.02, log=print):
+    results = {}
+    skipped = {}
+    for name, sizes, setup in BENCHMARKS:
+        for size in sizes:
+            full_name = name if size is None else f"{name}[{size}]"
+            if not fnmatch.fnmatch(full_name, pattern):
+                continue
+            try:
+                run, ops = setup(size)
+            except ImportError as e:
+                # Rendering needs pygame; the rest of the suite does not
+                skipped[full_name] = str(e)
+                log(f"{full_name:36} skipped ({e})")
+                continue
+            result = summarize(measure(run, ops, repeat, min_time))
+            if size is not None:
+                result["size"] = size
+            results[full_name] = result
+            log(f"{full_name:36} {result['ops_per_second']:>14,.0f} ops/s  "
+                f"(median {result['median'] * 1e6:.2f} us, stdev {result['stdev'] / result['median']:.1%})")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+            "min_time": min_time,
+            "fixture_seed": FIXTURE_SEED,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+# Comparison
+
+def mann_whitney_p(before, after):
+    # One-sided p-value for "after tends to be larger than before", from the
+    # normal approximation of the U statistic with a tie correction
+    n1 = len(before)
+    n2 = len(after)
+    n = n1 + n2
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    values = sorted([(value, 0) for value in before] + [(value, 1) for value in after])
+
+    rank_sum = 0.0
+    tie_term = 0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and values[j + 1][0] == values[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        rank_sum += rank * sum(1 for k in range(i, j + 1) if values[k][1] == 1)
+        i = j + 1
+
+    u = rank_sum - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 0.5
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(before, after, threshold=0.05, alpha=0.01):
+    # Returns one row per benchmark present in both runs
+    rows = []
+    for name, old in before["results"].items():
+        new = after["results"].get(name)
+        if new is None:
+            continue
+        ratio = new["median"] / old["median"] if old["median"] > 0 else 1.0
+        slower_p = mann_whitney_p(old["samples"], new["samples"])
+        faster_p = mann_whitney_p(new["samples"], old["samples"])
+        p = slower_p if ratio >= 1 else faster_p
+        if ratio > 1 + threshold and slower_p < alpha:
+            verdict = "SLOWER"
+        elif ratio < 1 - threshold and faster_p < alpha:
+            verdict = "faster"
+        else:
+            verdict = ""
+        rows.append({
+            "name": name,
+            "before": old["median"],
+            "after": new["median"],
+            "change": ratio - 1,
+            "p": p,
+            "verdict": verdict,
+        })
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'benchmark':36} {'before':>11} {'after':>11} {'change':>8} {'p':>8}")
+    for row in rows:
+        print(f"{row['name']:36} {row['before'] * 1e6:>9.2f}us {row['after'] * 1e6:>9.2f}us "
+              f"{row['change']:>+8.1%} {row['p']:>8.4f}  {row['verdict']}")
+
+
+# Scaling
+
+def scaling(results):
+    # Per benchmark family: time per cell at every board size, and a least
+    # squares fit of time against cell count. Linear scaling shows up as a
+    # near-constant time per cell and an R^2 close to 1.
+    families = {}
+    for name, result in results["results"].items():
+        if "size" in result:
+            families.setdefault(name.split("[")[0], []).append((result["size"] ** 2, result["median"]))
+
+    report = {}
+    for family, points in families.items():
+        points.sort()
+        if len(points) < 2:
+            continue
+        xs = [cells for cells, _ in points]
+        ys = [seconds for _, seconds in points]
+        mean_x = statistics.fmean(xs)
+        mean_y = statistics.fmean(ys)
+        sxx = sum((x - mean_x) ** 2 for x in xs)
+        sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+        syy = sum((y - mean_y) ** 2 for y in ys)
+        slope = sxy / sxx
+        report[family] = {
+            "per_cell": {str(cells): seconds / cells for cells, seconds in points},
+            "slope": slope,
+            "intercept": mean_y - slope * mean_x,
+            "r_squared": sxy * sxy / (sxx * syy) if syy > 0 else 1.0,
+        }
+    return report
+
+
+def print_scaling(report):
+    for family, fit in report.items():
+        print(f"{family}: {fit['slope'] * 1e9:.1f} ns per cell + {fit['intercept'] * 1e9:.0f} ns, "
+              f"R^2 {fit['r_squared']:.4f}")
+        for cells, seconds in fit["per_cell"].items():
+            print(f"  {int(cells):4} cells {seconds * 1e9:8.1f} ns/cell")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark engine, rules and rendering hot paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite and write JSON results")
+    run.add_argument("--out", default=None, help="write results here (default: stdout summary only)")
+    run.add_argument("--filter", default="*", help="glob on benchmark names, e.g. 'match3.*'")
+    run.add_argument("--repeat", type=int, default=15, help="samples per benchmark")
+    run.add_argument("--min-time", type=float, default=0.02, help="seconds per sample")
+    run.add_argument("--quick", action="store_true", help="fewer, shorter samples")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.05, help="smallest change worth flagging")
+    compare_parser.add_argument("--alpha", type=float, default=0.01, help="significance level")
+
+    scaling_parser = commands.add_parser("scaling", help="fit time against cell count for sized benchmarks")
+    scaling_parser.add_argument("results")
+
+    alloc_parser = commands.add_parser("alloc", help="measure memory allocated per operation with tracemalloc")
+    alloc_parser.add_argument("--filter", default="view.*", help="glob on benchmark names")
+    alloc_parser.add_argument("--repeat", type=int, default=200, help="operations sampled per benchmark")
+
+    commands.add_parser("list", help="list benchmark names")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        print("\n".join(benchmark_names()))
+        return
+
+    # Rendering benchmarks draw offscreen and never need a real display
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    if args.command == "alloc":
+        run_allocations(args.filter, args.repeat)
+        return
+
+    if args.command == "run":
+        repeat, min_time = (5, 0.005) if args.quick else (args.repeat, args.min_time)
+        results = run_benchmarks(args.filter, repeat, min_time)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {args.out}")
+        return
+
+    if args.command == "scaling":
+        with open(args.results) as f:
+            print_scaling(scaling(json.load(f)))
+        return
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    rows = compare(before, after, args.threshold, args.alpha)
+    print_comparison(rows)
+    slower = [row["name"] for row in rows if row["verdict"] == "SLOWER"]
+    if slower:
+        print(f"{len(slower)} significant slowdown(s): {', '.join(slower)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# Headless 2048 game: state and rules without any pygame.
+#
+# Game2048State holds everything that decides a game (board, seeded spawn
+# RNG, score, move log, win/loss flags). The classic 4x4 game runs on the
+# bitboard engine; other sizes use engine_2048.GridRules, and every board
+# access goes through self.rules so both behave the same. It imports nothing
+# graphical, so it loads in milliseconds and thousands of games can live in
+# one process. The pygame view in game_2048.py subclasses it and overrides
+# the on_move and on_spawn hooks to animate tiles.
+
+import random
+
+import engine_2048
+
+GRID_SIZE = engine_2048.GRID_SIZE
+WIN_EXPONENT = 11  # 2048
+
+
+class Game2048State:
+    def __init__(self, seed=None, recorder=None, size=GRID_SIZE):
+        self.size = size
+        self.rules = engine_2048.rules_for(size)
+        # Optional dataset_2048.PositionWriter fed every (board, move, score) played
+        if recorder is not None and size != GRID_SIZE:
+            raise ValueError("position datasets store 4x4 boards only")
+        self.recorder = recorder
+        self.best_score = 0
+        self.rng = random  # the first seed comes from the global RNG
+        self.new_game(seed)
+
+    def new_game(self, seed=None):
+        # A new game's seed is drawn from the previous one, so seeded sessions repeat
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        elif not isinstance(seed, int) or not 0 <= seed < 1 << 64:
+            # Checked here rather than when the replay is written at the end
+            raise ValueError(f"seed must be an integer from 0 to 2**64 - 1 (replays store a u64), not {seed!r}")
+        self.seed = seed
+        # Every spawn comes from this per-game RNG, so seed + moves reproduce a game
+        self.rng = random.Random(self.seed)
+        self.move_log = []
+        self.board = self.rules.empty
+        self.score = 0
+        self.game_over = False
+        self.won = False
+
+        # Add initial tiles
+        self.add_random_tile()
+        self.add_random_tile()
+
+    def add_random_tile(self):
+        # 90% chance for a 2, 10% chance for a 4 on a random empty cell
+        self.board, cell = self.rules.spawn_tile(self.board, self.rng)
+        if cell is None:
+            return False
+        self.on_spawn(cell)
+        return True
+
+    def apply_move(self, direction):
+        # Slide the board; returns False when the move changes nothing
+        old_board = self.board
+        new_board, gained = self.rules.move(old_board, direction)
+        if new_board == old_board:
+            return False
+
+        if self.recorder is not None:
+            self.recorder.write(old_board, direction, gained)
+        self.board = new_board
+        self.move_log.append(direction)
+        self.score += gained
+        self.best_score = max(self.best_score, self.score)
+        self.on_move(old_board, new_board, direction)
+        return True
+
+    def move_left(self):
+        return self.apply_move(engine_2048.LEFT)
+
+    def move_right(self):
+        return self.apply_move(engine_2048.RIGHT)
+
+    def move_up(self):
+        return self.apply_move(engine_2048.UP)
+
+    def move_down(self):
+        return self.apply_move(engine_2048.DOWN)
+
+    def finish_move(self):
+        # Spawn the tile that follows a move and update the win/loss flags.
+        # Returns "won" or "lost" when that happens on this turn, else None.
+        if not self.add_random_tile():
+            return None
+        if self.check_win() and not self.won:
+            self.won = True
+            return "won"
+        if self.is_game_over():
+            self.game_over = True
+            return "lost"
+        return None
+
+    def step(self, direction):
+        # One complete turn for headless play: move, then spawn
+        if not self.apply_move(direction):
+            return False
+        self.finish_move()
+        return True
+
+    def is_game_over(self):
+        return self.rules.is_game_over(self.board)
+
+    def check_win(self):
+        get_cell = self.rules.get_cell
+        for row in range(self.size):
+            for col in range(self.size):
+                if get_cell(self.board, row, col) == WIN_EXPONENT:
+                    return True
+        return False
+
+    def replay_bytes(self):
+        # Only complete between moves, once the new tile has spawned
+        if self.size != GRID_SIZE:
+            raise ValueError("replays store 4x4 games only")
+        import replay_2048
+        return replay_2048.encode_replay(self.seed, self.move_log, self.score, self.board)
+
+    def save_replay(self, path=None):
+        if path is None:
+            path = f"2048-{self.seed:016x}.replay"
+        with open(path, "wb") as f:
+            f.write(self.replay_bytes())
+        return path
+
+    # View hooks, called after the state has changed
+
+    def on_move(self, old_board, new_board, direction):
+        pass
+
+    def on_spawn(self, cell):
+        pass
@@ -0,0 +1,283 @@
+# Fixed-width position dataset for 2048 training data.
+#
+# A dataset file is an 8-byte header followed by packed 13-byte records:
+#
+#   magic "P2048" | version u8 | record size u16
+#   board u64 | move u8 | score delta u32     (little-endian, no padding)
+#
+# Boards use the engine_2048 bitboard encoding. The reader memory-maps the
+# records as a NumPy structured array, so opening a file of any size is
+# instant and slicing it never copies. Writers append by default, which lets
+# several runs (or a crashed one) stream into the same file one after the
+# other; a partial record left by a crashed writer is cut off before the next
+# one appends, so every record stays at its offset.
+#
+# Usage: python dataset_2048.py record OUT --policy greedy --games 1000
+#        python dataset_2048.py info FILE [FILE ...]
+#        python dataset_2048.py dedup OUT FILE [FILE ...]
+
+import argparse
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+import rollout_2048
+
+MAGIC = b"P2048"
+VERSION = 1
+RECORD_DTYPE = np.dtype([("board", "<u8"), ("move", "u1"), ("score", "<u4")])
+HEADER = struct.Struct("<5sBH")
+
+
+class DatasetError(Exception):
+    pass
+
+
+class PositionWriter:
+    # Buffered streaming writer; use as a context manager or call close()
+    def __init__(self, path, buffer_size=65536, append=True):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.boards = []
+        self.moves = []
+        self.scores = []
+        self.written = 0
+
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            read_header(path)
+            size = os.path.getsize(path)
+            whole = size - (size - HEADER.size) % RECORD_DTYPE.itemsize
+            if whole != size:
+                os.truncate(path, whole)
+        self.file = open(path, "ab" if append else "wb")
+        if not exists:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize))
+
+    def write(self, board, move, score):
+        # Signature matches rollout_2048.play_game's on_move callback
+        self.boards.append(board)
+        self.moves.append(move)
+        self.scores.append(score)
+        if len(self.boards) >= self.buffer_size:
+            self.flush()
+
+    def write_many(self, records):
+        # Append a structured array (e.g. a slice of another dataset) as-is
+        self.flush()
+        records = np.ascontiguousarray(records, dtype=RECORD_DTYPE)
+        self.file.write(records.tobytes())
+        self.written += len(records)
+
+    def flush(self):
+        if self.boards:
+            records = np.empty(len(self.boards), dtype=RECORD_DTYPE)
+            records["board"] = self.boards
+            records["move"] = self.moves
+            records["score"] = self.scores
+            self.file.write(records.tobytes())
+            self.written += len(records)
+            self.boards = []
+            self.moves = []
+            self.scores = []
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise DatasetError(f"{path}: truncated header")
+    magic, version, record_size = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise DatasetError(f"{path}: not a 2048 position dataset")
+    if version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise DatasetError(f"{path}: unsupported dataset version {version}")
+
+
+class PositionDataset:
+    def __init__(self, path):
+        read_header(path)
+        self.path = path
+        # A partial record left by an interrupted writer is ignored
+        count = (os.path.getsize(path) - HEADER.size) // RECORD_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    @property
+    def boards(self):
+        return self.records["board"]
+
+    @property
+    def moves(self):
+        return self.records["move"]
+
+    @property
+    def scores(self):
+        return self.records["score"]
+
+    def iter_chunks(self, chunk_size=65536):
+        # Zero-copy views of consecutive records
+        for start in range(0, len(self.records), chunk_size):
+            yield self.records[start:start + chunk_size]
+
+
+def unpack_boards(boards):
+    # (N,) uint64 bitboards -> (N, 16) uint8 exponents, cell 4*row+col
+    shifts = np.arange(0, 64, 4, dtype=np.uint64)
+    boards = np.asarray(boards, dtype=np.uint64)
+    return ((boards[:, None] >> shifts) & np.uint64(0xF)).astype(np.uint8)
+
+
+def sample_batches(paths, batch_size=1024, seed=0, block_size=4096, buffer_blocks=64):
+    # Shuffled batches across files without loading them. Files are cut into
+    # blocks read in a random order, buffer_blocks at a time, and each buffer
+    # is shuffled record-wise. Reads stay sequential within a block, which is
+    # what keeps this fast on memory-mapped files much larger than RAM.
+    rng = np.random.default_rng(seed)
+    datasets = [PositionDataset(path) for path in paths]
+    blocks = [(i, start) for i, dataset in enumerate(datasets)
+              for start in range(0, len(dataset), block_size)]
+    order = rng.permutation(len(blocks))
+
+    leftover = np.zeros(0, dtype=RECORD_DTYPE)
+    for group in range(0, len(order), buffer_blocks):
+        parts = [leftover]
+        for index in order[group:group + buffer_blocks]:
+            i, start = blocks[index]
+            parts.append(datasets[i].records[start:start + block_size])
+        buffer = np.concatenate(parts)
+        buffer = buffer[rng.permutation(len(buffer))]
+        full = len(buffer) - len(buffer) % batch_size
+        for start in range(0, full, batch_size):
+            yield buffer[start:start + batch_size]
+        leftover = buffer[full:]
+    if len(leftover):
+        yield leftover
+
+
+def _bucket_of(boards, bits):
+    # Multiplicative hash of the board; top bits pick the bucket
+    mixed = boards * np.uint64(0x9E3779B97F4A7C15)
+    return (mixed >> np.uint64(64 - bits)).astype(np.intp)
+
+
+def deduplicate(paths, out_path, by_move=False, chunk_size=1 << 20, bucket_bits=None):
+    # Write every distinct position (or (position, move) pair with by_move)
+    # once. Records are hash-partitioned by board into temporary bucket files
+    # so only one bucket has to fit in memory; duplicates always share a bucket.
+    # The first occurrence in input order is kept. Returns (read, written).
+    if any(os.path.abspath(path) == os.path.abspath(out_path) for path in paths):
+        raise DatasetError("output file is also an input")
+    datasets = [PositionDataset(path) for path in paths]
+    total = sum(len(dataset) for dataset in datasets)
+    if bucket_bits is None:
+        bucket_bits = max(0, int(np.ceil(np.log2(max(1, total / chunk_size)))))
+    buckets = 1 << bucket_bits
+
+    temp_dir = tempfile.mkdtemp(prefix="dedup-", dir=os.path.dirname(os.path.abspath(out_path)))
+    try:
+        bucket_paths = [os.path.join(temp_dir, f"{b}.pos") for b in range(buckets)]
+        writers = [PositionWriter(path) for path in bucket_paths]
+        for dataset in datasets:
+            for chunk in dataset.iter_chunks(chunk_size):
+                if buckets == 1:
+                    writers[0].write_many(chunk)
+                    continue
+                bucket = _bucket_of(chunk["board"], bucket_bits)
+                order = np.argsort(bucket, kind="stable")
+                bounds = np.searchsorted(bucket[order], np.arange(buckets + 1))
+                for b in range(buckets):
+                    if bounds[b] < bounds[b + 1]:
+                        writers[b].write_many(chunk[order[bounds[b]:bounds[b + 1]]])
+        for writer in writers:
+            writer.close()
+
+        written = 0
+        with PositionWriter(out_path, append=False) as out:
+            for path in bucket_paths:
+                records = np.array(PositionDataset(path).records)
+                # Stable sorts keep the earliest record first within each key
+                if by_move:
+                    order = np.lexsort((records["move"], records["board"]))
+                else:
+                    order = np.argsort(records["board"], kind="stable")
+                ordered = records[order]
+                keep = np.ones(len(ordered), dtype=bool)
+                same = ordered["board"][1:] == ordered["board"][:-1]
+                if by_move:
+                    same &= ordered["move"][1:] == ordered["move"][:-1]
+                keep[1:] = ~same
+                out.write_many(records[np.sort(order[keep])])
+                written += int(keep.sum())
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return total, written
+
+
+def record_games(path, policy, games, master_seed=0, max_moves=None):
+    # Stream every position of seeded headless games into a dataset file
+    stats = rollout_2048.RolloutStats()
+    with PositionWriter(path) as writer:
+        for index, seed in enumerate(rollout_2048.game_seeds(master_seed, games)):
+            stats.add(rollout_2048.play_game(policy, seed, index, max_moves, on_move=writer.write))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record, inspect and deduplicate 2048 position datasets")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="append positions from headless games")
+    record.add_argument("out")
+    record.add_argument("--policy", choices=sorted(rollout_2048.POLICIES), default="greedy")
+    record.add_argument("--games", type=int, default=100)
+    record.add_argument("--seed", type=int, default=0)
+    record.add_argument("--max-moves", type=int, default=None)
+
+    info = commands.add_parser("info", help="print record counts")
+    info.add_argument("files", nargs="+")
+
+    dedup = commands.add_parser("dedup", help="merge files keeping each position once")
+    dedup.add_argument("out")
+    dedup.add_argument("files", nargs="+")
+    dedup.add_argument("--by-move", action="store_true", help="keep one record per (position, move)")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        stats = record_games(args.out, args.policy, args.games, args.seed, args.max_moves)
+        print(f"{sum(stats.moves)} positions from {stats.games} games -> {args.out}")
+    elif args.command == "info":
+        for path in args.files:
+            dataset = PositionDataset(path)
+            distinct = len(np.unique(dataset.boards)) if len(dataset) else 0
+            print(f"{path}: {len(dataset)} positions, {distinct} distinct boards")
+    else:
+        total, written = deduplicate(args.files, args.out, args.by_move)
+        print(f"{total} positions -> {written} unique in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
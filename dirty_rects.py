@@ -0,0 +1,97 @@
+# Dirty-rectangle renderer shared by both games.
+#
+# Each frame the view reports its regions (a cell, the score box, the toast)
+# with a signature of whatever affects how they look. Regions whose
+# signature changed since the last frame are dirty: the scene is redrawn
+# clipped to those rectangles only and just those rectangles are pushed with
+# pygame.display.update(). A frame with nothing dirty is not presented at all.
+
+import pygame
+
+# Window events after which the whole window must be repainted
+EXPOSE_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.VIDEORESIZE)
+
+
+def merge_rects(rects):
+    # Union overlapping rectangles so each pixel is redrawn at most once
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+class DirtyRectRenderer:
+    def __init__(self, screen, draw_frame):
+        self.screen = screen
+        self.draw_frame = draw_frame  # draws the complete scene
+        self.regions = {}
+        self.dirty = []
+        self.full_redraw = True
+
+        self.frames_presented = 0
+        self.frames_skipped = 0
+        self.pixels_updated = 0
+
+    def track(self, key, rect, signature):
+        # Mark the region dirty when its signature or rect changed
+        previous = self.regions.get(key)
+        if previous is not None and previous[1] == signature and previous[0] == rect:
+            return
+        if previous is not None:
+            self.dirty.append(previous[0])
+        rect = pygame.Rect(rect)
+        self.dirty.append(rect)
+        self.regions[key] = (rect, signature)
+
+    def invalidate(self, rect=None):
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.dirty.append(pygame.Rect(rect))
+
+    def handle_event(self, event):
+        if event.type in EXPOSE_EVENTS:
+            self.invalidate()
+
+    def render(self):
+        # Returns False when the frame was skipped because nothing changed
+        screen_rect = self.screen.get_rect()
+
+        if self.full_redraw:
+            self.draw_frame()
+            pygame.display.flip()
+            self.full_redraw = False
+            self.dirty = []
+            self.frames_presented += 1
+            self.pixels_updated += screen_rect.width * screen_rect.height
+            return True
+
+        if not self.dirty:
+            self.frames_skipped += 1
+            return False
+
+        rects = [rect.clip(screen_rect) for rect in merge_rects(self.dirty)]
+        rects = [rect for rect in rects if rect.width and rect.height]
+        self.dirty = []
+
+        for rect in rects:
+            self.screen.set_clip(rect)
+            self.draw_frame()
+        self.screen.set_clip(None)
+
+        pygame.display.update(rects)
+        self.frames_presented += 1
+        self.pixels_updated += sum(rect.width * rect.height for rect in rects)
+        return True
+
+    def stats(self):
+        return {
+            "frames_presented": self.frames_presented,
+            "frames_skipped": self.frames_skipped,
+            "pixels_updated": self.pixels_updated,
+        }
@@ -0,0 +1,372 @@
+# Headless bitboard engine for 2048.
+#
+# The board is a single 64-bit integer holding sixteen 4-bit log2 exponents
+# (0 = empty, 1 = 2, 2 = 4, ... 15 = 32768). Cell (row, col) lives in nibble
+# 4 * row + col counting from the least significant bits, so each row is one
+# 16-bit chunk whose lowest nibble is the leftmost column.
+#
+# Boards of any other size (5x5 up to 16x16 and beyond) are flat tuples of
+# exponents handled by GridRules, whose moves run one generic slide/merge
+# kernel over precomputed lines; rules_for(size) picks the implementation.
+#
+# Moves are table lookups: every possible 16-bit row is precomputed once, on
+# the first move, for left and right slides together with the score gained.
+# Up and down moves transpose the board, slide the rows and transpose back.
+
+GRID_SIZE = 4
+MAX_EXPONENT = 15
+
+# Move directions
+LEFT = 0
+RIGHT = 1
+UP = 2
+DOWN = 3
+DIRECTIONS = (LEFT, RIGHT, UP, DOWN)
+
+ROW_MASK = 0xFFFF
+
+
+def slide_line(line):
+    # Slide a list of exponents towards index 0, merging equal neighbours once
+    tiles = [value for value in line if value]
+    result = []
+    score = 0
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1] and tiles[i] < MAX_EXPONENT:
+            merged = tiles[i] + 1
+            result.append(merged)
+            score += 1 << merged
+            i += 2
+        else:
+            result.append(tiles[i])
+            i += 1
+    result.extend([0] * (len(line) - len(result)))
+    return result, score
+
+
+def slide_targets(line, limit=MAX_EXPONENT):
+    # Destination index for every non-empty cell of a line slid towards index 0
+    targets = {}
+    dest = -1
+    last = 0
+    can_merge = False
+    for index, value in enumerate(line):
+        if not value:
+            continue
+        if can_merge and value == last and value < limit:
+            targets[index] = dest
+            can_merge = False
+        else:
+            dest += 1
+            targets[index] = dest
+            last = value
+            can_merge = True
+    return targets
+
+
+def _reverse_row(row):
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | (row >> 12)
+
+
+def _build_tables():
+    # Same rules as slide_line, unrolled for packed 4-cell rows
+    left = [0] * 65536
+    right = [0] * 65536
+    score = [0] * 65536
+    for row in range(65536):
+        tiles = [v for v in (row & 0xF, (row >> 4) & 0xF, (row >> 8) & 0xF, row >> 12) if v]
+        count = len(tiles)
+        result = 0
+        gained = 0
+        shift = 0
+        i = 0
+        while i < count:
+            value = tiles[i]
+            if i + 1 < count and value == tiles[i + 1] and value < MAX_EXPONENT:
+                value += 1
+                gained += 1 << value
+                i += 2
+            else:
+                i += 1
+            result |= value << shift
+            shift += 4
+        left[row] = result
+        score[row] = gained
+        right[_reverse_row(row)] = _reverse_row(result)
+    return left, right, score
+
+
+# Filled on the first move rather than at import, which keeps importing the
+# engine (and every headless core built on it) cheap
+ROW_LEFT = []
+ROW_RIGHT = []
+ROW_SCORE = []
+
+
+def build_tables():
+    # Fill the tables in place, so references taken before the build stay valid
+    if not ROW_SCORE:
+        left, right, score = _build_tables()
+        ROW_LEFT.extend(left)
+        ROW_RIGHT.extend(right)
+        ROW_SCORE.extend(score)
+
+
+def transpose(board):
+    # Swap rows and columns of the packed board
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _move_rows(board, table):
+    if not ROW_SCORE:
+        build_tables()
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = board >> 48
+    new_board = table[r0] | (table[r1] << 16) | (table[r2] << 32) | (table[r3] << 48)
+    return new_board, ROW_SCORE[r0] + ROW_SCORE[r1] + ROW_SCORE[r2] + ROW_SCORE[r3]
+
+
+def move_left(board):
+    return _move_rows(board, ROW_LEFT)
+
+
+def move_right(board):
+    return _move_rows(board, ROW_RIGHT)
+
+
+def move_up(board):
+    new_board, score = _move_rows(transpose(board), ROW_LEFT)
+    return transpose(new_board), score
+
+
+def move_down(board):
+    new_board, score = _move_rows(transpose(board), ROW_RIGHT)
+    return transpose(new_board), score
+
+
+MOVE_FUNCTIONS = (move_left, move_right, move_up, move_down)
+
+
+def move(board, direction):
+    # Returns (new_board, score_gained); new_board == board means no-op
+    return MOVE_FUNCTIONS[direction](board)
+
+
+def get_cell(board, row, col):
+    return (board >> (4 * (GRID_SIZE * row + col))) & 0xF
+
+
+def set_cell(board, row, col, exponent):
+    shift = 4 * (GRID_SIZE * row + col)
+    return (board & ~(0xF << shift)) | (exponent << shift)
+
+
+def empty_mask(board):
+    # Bit 4 * i is set for every empty cell i
+    x = board | (board >> 1)
+    x |= x >> 2
+    return ~x & 0x1111111111111111
+
+
+def empty_cells(board):
+    # Flat cell indices (row * GRID_SIZE + col) of all empty cells, ascending
+    mask = empty_mask(board)
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append((low.bit_length() - 1) >> 2)
+        mask ^= low
+    return cells
+
+
+def spawn_tile(board, rng):
+    # Same distribution as Game2048.add_random_tile: a 2 (90%) or a 4 (10%)
+    # on a uniformly chosen empty cell. Returns (board, cell) with cell None
+    # when the board is full.
+    empty = empty_cells(board)
+    if not empty:
+        return board, None
+    cell = rng.choice(empty)
+    exponent = 1 if rng.random() < 0.9 else 2
+    return board | (exponent << (4 * cell)), cell
+
+
+def count_empty(board):
+    return bin(empty_mask(board)).count("1")
+
+
+def max_exponent(board):
+    best = 0
+    while board:
+        value = board & 0xF
+        if value > best:
+            best = value
+        board >>= 4
+    return best
+
+
+def can_move(board):
+    for move_function in MOVE_FUNCTIONS:
+        if move_function(board)[0] != board:
+            return True
+    return False
+
+
+def is_game_over(board):
+    return not can_move(board)
+
+
+def from_values(grid):
+    # Build a board from a 4x4 list of tile values (0, 2, 4, 8, ...)
+    board = 0
+    for row in range(GRID_SIZE):
+        for col in range(GRID_SIZE):
+            value = grid[row][col]
+            if value:
+                board = set_cell(board, row, col, value.bit_length() - 1)
+    return board
+
+
+def to_values(board):
+    # Inverse of from_values
+    grid = []
+    for row in range(GRID_SIZE):
+        values = []
+        for col in range(GRID_SIZE):
+            exponent = get_cell(board, row, col)
+            values.append(1 << exponent if exponent else 0)
+        grid.append(values)
+    return grid
+
+
+# Boards of any size
+
+MAX_GRID_EXPONENT = 255  # tuples have no nibble limit
+
+
+class BitboardRules:
+    # The 4x4 bitboard functions behind the same interface as GridRules
+    size = GRID_SIZE
+    cells = GRID_SIZE * GRID_SIZE
+    empty = 0
+    limit = MAX_EXPONENT
+
+    def __init__(self):
+        self.move = move
+        self.spawn_tile = spawn_tile
+        self.get_cell = get_cell
+        self.empty_cells = empty_cells
+        self.is_game_over = is_game_over
+        self.max_exponent = max_exponent
+        self.from_values = from_values
+        self.to_values = to_values
+
+
+class GridRules:
+    # size x size boards as flat tuples of exponents, cell row * size + col
+    limit = MAX_GRID_EXPONENT
+
+    def __init__(self, size):
+        self.size = size
+        self.cells = size * size
+        self.empty = (0,) * self.cells
+        # Flat indices of every line, ordered from the wall tiles slide towards
+        rows = [[row * size + col for col in range(size)] for row in range(size)]
+        columns = [[row * size + col for row in range(size)] for col in range(size)]
+        self.lines = {
+            LEFT: rows,
+            RIGHT: [line[::-1] for line in rows],
+            UP: columns,
+            DOWN: [line[::-1] for line in columns],
+        }
+
+    def move(self, board, direction):
+        # The single slide/merge kernel: one pass over each line, so a move
+        # touches every cell once whatever the direction or board size
+        cells = list(board)
+        score = 0
+        limit = self.limit
+        for line in self.lines[direction]:
+            write = 0
+            pending = 0
+            for index in line:
+                value = board[index]
+                if not value:
+                    continue
+                if value == pending and value < limit:
+                    pending += 1
+                    score += 1 << pending
+                    cells[line[write]] = pending
+                    write += 1
+                    pending = 0
+                else:
+                    if pending:
+                        cells[line[write]] = pending
+                        write += 1
+                    pending = value
+            if pending:
+                cells[line[write]] = pending
+                write += 1
+            for index in line[write:]:
+                cells[index] = 0
+        return tuple(cells), score
+
+    def spawn_tile(self, board, rng):
+        # Same distribution and RNG use as the bitboard spawn_tile
+        empty = self.empty_cells(board)
+        if not empty:
+            return board, None
+        cell = rng.choice(empty)
+        exponent = 1 if rng.random() < 0.9 else 2
+        return board[:cell] + (exponent,) + board[cell + 1:], cell
+
+    def get_cell(self, board, row, col):
+        return board[row * self.size + col]
+
+    def empty_cells(self, board):
+        return [index for index, value in enumerate(board) if not value]
+
+    def is_game_over(self, board):
+        if 0 in board:
+            return False
+        size = self.size
+        for row in range(size):
+            for col in range(size):
+                value = board[row * size + col]
+                if col + 1 < size and board[row * size + col + 1] == value:
+                    return False
+                if row + 1 < size and board[(row + 1) * size + col] == value:
+                    return False
+        return True
+
+    def max_exponent(self, board):
+        return max(board)
+
+    def from_values(self, grid):
+        return tuple(value.bit_length() - 1 if value else 0 for line in grid for value in line)
+
+    def to_values(self, board):
+        return [[1 << value if value else 0 for value in board[row * self.size:(row + 1) * self.size]]
+                for row in range(self.size)]
+
+
+_rules = {}
+
+
+def rules_for(size):
+    # Shared, stateless rules object for a board size
+    rules = _rules.get(size)
+    if rules is None:
+        rules = BitboardRules() if size == GRID_SIZE else GridRules(size)
+        _rules[size] = rules
+    return rules
@@ -0,0 +1,118 @@
+# Bitmask match detection for match-3 boards.
+#
+# A board is described by one integer per gem colour with a bit set for
+# every cell holding that colour. Cell (row, col) is bit row * stride + col,
+# where stride = size + 1: the extra bit at the end of each row is always
+# clear, so shifting a row sideways can never carry a gem into the next one.
+#
+# A run of three starts wherever a cell and its two neighbours share a
+# colour, which is three shifts and two ANDs on a whole colour mask at once;
+# spreading each start back over its three cells gives every gem in a run of
+# three or more. Python integers are arbitrary precision, so this works for
+# any board size, and its cost grows with the number of machine words in a
+# mask rather than with the number of cells.
+
+
+def stride_for(size):
+    return size + 1
+
+
+def cell_bit(row, col, stride):
+    return 1 << (row * stride + col)
+
+
+def board_mask(size):
+    # Every cell of the board, without the guard bits
+    stride = stride_for(size)
+    row_mask = (1 << size) - 1
+    mask = 0
+    for row in range(size):
+        mask |= row_mask << (row * stride)
+    return mask
+
+
+def column_mask(col, size):
+    stride = stride_for(size)
+    mask = 0
+    for row in range(size):
+        mask |= 1 << (row * stride + col)
+    return mask
+
+
+def masks_from_grid(grid, num_colors):
+    # grid[row][col] is a colour index or None
+    stride = stride_for(len(grid))
+    masks = [0] * num_colors
+    for row, line in enumerate(grid):
+        shift = row * stride
+        for col, color in enumerate(line):
+            if color is not None:
+                masks[color] |= 1 << (shift + col)
+    return masks
+
+
+def horizontal_runs(mask):
+    # Cells of mask in a run of three or more along a row
+    starts = mask & (mask >> 1) & (mask >> 2)
+    return starts | (starts << 1) | (starts << 2)
+
+
+def vertical_runs(mask, stride):
+    # Cells of mask in a run of three or more down a column
+    starts = mask & (mask >> stride) & (mask >> (2 * stride))
+    return starts | (starts << stride) | (starts << (2 * stride))
+
+
+def find_runs(mask, stride):
+    # Cells of mask that belong to a horizontal or vertical run of three or more
+    return horizontal_runs(mask) | vertical_runs(mask, stride)
+
+
+def match_mask(masks, stride):
+    # Every matched cell, whatever its colour
+    matched = 0
+    for mask in masks:
+        if mask:
+            matched |= find_runs(mask, stride)
+    return matched
+
+
+def rows_region(rows, stride, full_mask):
+    # Cells of every row whose bit is set in rows; one step per run of
+    # consecutive rows
+    region = 0
+    while rows:
+        start = (rows & -rows).bit_length() - 1
+        run = ((rows >> start) ^ ((rows >> start) + 1)).bit_length() - 1
+        region |= ((1 << (run * stride)) - 1) << (start * stride)
+        rows &= ~(((1 << run) - 1) << start)
+    return region & full_mask
+
+
+def columns_region(columns, first_column_mask):
+    # Cells of every column whose bit is set in columns. Multiplying copies
+    # the column bits into every row; they never carry into the guard bit.
+    return first_column_mask * columns
+
+
+def occupied_columns(mask, size):
+    # Bit col set when any cell of that column is set in mask, by folding the
+    # rows onto row 0 in log2(size) steps
+    stride = stride_for(size)
+    span = 1
+    while span < size:
+        mask |= mask >> (span * stride)
+        span *= 2
+    return mask & ((1 << size) - 1)
+
+
+def iter_cells(mask, stride):
+    # (row, col) of every set bit, in row-major order
+    while mask:
+        low = mask & -mask
+        yield divmod(low.bit_length() - 1, stride)
+        mask ^= low
+
+
+def count_cells(mask):
+    return bin(mask).count("1")
@@ -0,0 +1,107 @@
+# Gym-style vectorized 2048 environment for training agents.
+#
+# VectorEnv2048 wraps batch_2048.BatchGame2048, so step(actions) advances
+# every environment with a handful of NumPy calls whatever num_envs is. The
+# observation, reward, done and action-mask arrays are allocated once and
+# rewritten in place each step; callers that keep them across steps should
+# copy them.
+#
+# Observations are either "onehot", a (N, planes, 4, 4) uint8 array with
+# plane k set where a cell holds 2**k (plane 0 marks empty cells), or
+# "exponents", the raw (N, 4, 4) exponent grid. Rewards are the merge score
+# of the move. A move that changes nothing earns 0, spawns no tile and is
+# masked out of action_mask; agents that respect the mask never make one.
+#
+# With auto_reset a finished game is restarted inside the same step(). The
+# observation then shows the new game, and the last board of the old one is
+# in info["final_boards"], with its score and move count in "final_scores"
+# and "final_lengths" (valid where dones is set), as in Gym's vector envs.
+
+import numpy as np
+
+import batch_2048
+
+GRID_SIZE = batch_2048.GRID_SIZE
+NUM_ACTIONS = 4  # engine_2048 directions
+ONEHOT_PLANES = 16  # exponents 0..15, the largest a bitboard cell holds
+OBSERVATION_MODES = ("onehot", "exponents")
+
+
+class VectorEnv2048:
+    def __init__(self, num_envs, observation="onehot", auto_reset=True, seed=None):
+        if observation not in OBSERVATION_MODES:
+            raise ValueError(f"observation must be one of {OBSERVATION_MODES}")
+        self.num_envs = num_envs
+        self.observation = observation
+        self.auto_reset = auto_reset
+        self.game = batch_2048.BatchGame2048(num_envs, seed)
+
+        if observation == "onehot":
+            self.obs = np.zeros((num_envs, ONEHOT_PLANES, GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+            self.plane_values = np.arange(ONEHOT_PLANES, dtype=np.uint8)[None, :, None, None]
+        else:
+            self.obs = np.zeros((num_envs, GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+        self.rewards = np.zeros(num_envs, dtype=np.int64)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.action_mask = np.zeros((num_envs, NUM_ACTIONS), dtype=bool)
+        self.final_boards = np.zeros((num_envs, GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+        self.final_scores = np.zeros(num_envs, dtype=np.int64)
+        self.final_lengths = np.zeros(num_envs, dtype=np.int64)
+        self.episode_lengths = np.zeros(num_envs, dtype=np.int64)
+        self.info = {
+            "scores": self.game.scores,
+            "valid": np.zeros(num_envs, dtype=bool),
+            "final_boards": self.final_boards,
+            "final_scores": self.final_scores,
+            "final_lengths": self.final_lengths,
+        }
+
+    def reset(self, seed=None):
+        # Start every environment over; a seed makes the run reproducible
+        if seed is not None:
+            self.game.rng = np.random.default_rng(seed)
+        self.game.reset()
+        self.dones[:] = False
+        self.episode_lengths[:] = 0
+        self.update_observation()
+        self.update_action_mask()
+        return self.obs, self.info
+
+    def step(self, actions):
+        # actions: (N,) directions. Returns (obs, rewards, dones, info).
+        game = self.game
+        actions = np.asarray(actions, dtype=np.intp)
+        score_deltas, valid = game.step(actions)
+        self.rewards[:] = score_deltas
+        self.info["valid"][:] = valid
+        self.episode_lengths += valid
+
+        # No legal move left is exactly batch_2048.game_over for a non-empty
+        # board, and the mask is needed anyway
+        self.update_action_mask()
+        np.logical_not(self.action_mask.any(axis=1), out=self.dones)
+
+        if self.auto_reset and self.dones.any():
+            np.copyto(self.final_boards, game.boards, where=self.dones[:, None, None])
+            np.copyto(self.final_scores, game.scores, where=self.dones)
+            np.copyto(self.final_lengths, self.episode_lengths, where=self.dones)
+            self.episode_lengths[self.dones] = 0
+            game.reset(self.dones)
+            self.update_action_mask()
+        self.update_observation()
+        return self.obs, self.rewards, self.dones, self.info
+
+    def update_observation(self):
+        boards = self.game.boards
+        if self.observation == "onehot":
+            np.equal(boards[:, None, :, :], self.plane_values, out=self.obs.view(bool))
+        else:
+            np.copyto(self.obs, boards)
+
+    def update_action_mask(self):
+        np.copyto(self.action_mask, batch_2048.legal_moves(self.game.boards))
+
+    def sample_actions(self, rng):
+        # A uniformly random legal move per environment (0 where none is left)
+        weights = rng.random((self.num_envs, NUM_ACTIONS)) * self.action_mask
+        return weights.argmax(axis=1)
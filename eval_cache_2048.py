@@ -0,0 +1,320 @@
+# Persistent position-evaluation cache for 2048 search.
+#
+# 2048 is symmetric under the 8 rotations and reflections of the board, and
+# so is the solver's heuristic, so a position is stored once under its
+# canonical form: the smallest bitboard among its 8 images. Values found in
+# one session are written to an append-only file and reused by later ones.
+#
+# In memory the cache is an LRU of recent positions. On disk it is a 16-byte
+# header followed by packed 17-byte records:
+#
+#   magic "E2048" | version u8 | record size u16 | solver fingerprint u64
+#   board u64 | depth u8 | value f64          (little-endian, no padding)
+#
+# Values depend on the solver's heuristic weights and probability cutoff, so
+# the header carries a fingerprint of both and a store written with other
+# settings is refused rather than mixed with fresh values.
+#
+# A file is only ever appended to, one whole batch of records at a time
+# under an exclusive flock(), so several processes can share it: readers
+# memory-map the complete records present when they open (or refresh). A
+# partial record can only be left by a writer killed mid-batch; it is cut off
+# under the lock before anything else is appended, so records stay aligned.
+# Without fcntl (Windows) there is no lock and only one process may write.
+# The same position may be stored more than once; the deepest search wins.
+#
+# Usage: python eval_cache_2048.py warm CACHE --games 20 --depth 3
+#        python eval_cache_2048.py info CACHE
+
+import argparse
+import hashlib
+import os
+import random
+import struct
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+import ai_2048
+import engine_2048
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b"E2048"
+VERSION = 2
+RECORD_DTYPE = np.dtype([("board", "<u8"), ("depth", "u1"), ("value", "<f8")])
+HEADER = struct.Struct("<5sBHQ")
+
+_mirror_table = None
+
+
+class CacheError(Exception):
+    pass
+
+
+def mirror(board):
+    # Reverse every row (left-right reflection)
+    global _mirror_table
+    if _mirror_table is None:
+        _mirror_table = [engine_2048._reverse_row(row) for row in range(65536)]
+    table = _mirror_table
+    return (table[board & 0xFFFF] | (table[(board >> 16) & 0xFFFF] << 16)
+            | (table[(board >> 32) & 0xFFFF] << 32) | (table[board >> 48] << 48))
+
+
+def flip(board):
+    # Reverse the row order (top-bottom reflection)
+    return (((board & 0xFFFF) << 48) | (((board >> 16) & 0xFFFF) << 32)
+            | (((board >> 32) & 0xFFFF) << 16) | (board >> 48))
+
+
+def symmetries(board):
+    # The 8 images of the board: 4 reflections, each with and without transposing
+    mirrored = mirror(board)
+    images = (board, mirrored, flip(board), flip(mirrored))
+    return images + tuple(engine_2048.transpose(image) for image in images)
+
+
+def canonical(board):
+    return min(symmetries(board))
+
+
+def solver_fingerprint(probability_cutoff=ai_2048.PROBABILITY_CUTOFF):
+    # 64-bit digest of everything besides the board and depth that a stored
+    # value depends on
+    data = struct.pack(f"<{len(ai_2048.HEURISTIC_WEIGHTS) + 1}d", *ai_2048.HEURISTIC_WEIGHTS, probability_cutoff)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def read_header(path, fingerprint=None):
+    # Check the header; returns the stored solver fingerprint, which must
+    # equal fingerprint when one is given
+    with open(path, "rb") as f:
+        data = f.read(HEADER.size)
+    if len(data) < 8 or data[:5] != MAGIC:
+        raise CacheError(f"{path}: not a 2048 evaluation cache")
+    if len(data) < HEADER.size:
+        raise CacheError(f"{path}: truncated header")
+    magic, version, record_size, stored = HEADER.unpack(data)
+    if version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise CacheError(f"{path}: unsupported cache version {version}")
+    if fingerprint is not None and stored != fingerprint:
+        raise CacheError(f"{path}: written by a solver with other heuristic weights or probability cutoff")
+    return stored
+
+
+def create_store(path, fingerprint):
+    # Publish the header with a hard link, so no process ever sees a file
+    # without one even when several create the same store at once
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".evalcache-", dir=directory)
+    try:
+        os.write(fd, HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, fingerprint))
+        os.close(fd)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(temp_path)
+
+
+class EvalCache:
+    def __init__(self, path=None, capacity=1 << 18, flush_every=4096,
+                 probability_cutoff=ai_2048.PROBABILITY_CUTOFF):
+        self.path = path
+        self.probability_cutoff = probability_cutoff  # solvers using the cache must match
+        self.fingerprint = solver_fingerprint(probability_cutoff)
+        self.capacity = capacity  # positions kept in memory
+        self.flush_every = flush_every
+        self.entries = OrderedDict()  # canonical board -> (depth, value), oldest first
+        self.pending = []  # (board, depth, value) not yet on disk
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.fd = None
+        self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self.disk_boards = np.zeros(0, dtype=np.uint64)  # sorted boards of records
+        self.disk_order = np.zeros(0, dtype=np.intp)
+        if path is not None:
+            if not os.path.exists(path):
+                create_store(path, self.fingerprint)
+            read_header(path, self.fingerprint)
+            self.fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+            self.refresh()
+
+    @contextmanager
+    def locked(self):
+        # Exclusive lock on the store, held while appending or trimming
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def trim_torn_record(self):
+        # Cut off a partial record left by a writer killed mid-write; call
+        # with the lock held, when no other writer can be halfway through
+        size = os.fstat(self.fd).st_size
+        torn = (size - HEADER.size) % RECORD_DTYPE.itemsize
+        if torn:
+            os.ftruncate(self.fd, size - torn)
+
+    def refresh(self):
+        # Pick up records appended since opening, by this or other processes
+        if self.path is None:
+            return
+        size = os.path.getsize(self.path)
+        if (size - HEADER.size) % RECORD_DTYPE.itemsize:
+            with self.locked():
+                self.trim_torn_record()
+            size = os.path.getsize(self.path)
+        count = (size - HEADER.size) // RECORD_DTYPE.itemsize
+        if count == len(self.records):
+            return
+        self.records = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+        self.disk_order = np.argsort(self.records["board"], kind="stable")
+        self.disk_boards = self.records["board"][self.disk_order]
+
+    def lookup(self, board, depth=0):
+        # Value of a position searched at least `depth` deep, or None
+        key = canonical(board)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] >= depth:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        entry = self.lookup_disk(key)
+        if entry is not None and entry[0] >= depth:
+            self.remember(key, entry)
+            self.disk_hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def lookup_disk(self, key):
+        boards = self.disk_boards
+        if not len(boards):
+            return None
+        start = int(np.searchsorted(boards, np.uint64(key), side="left"))
+        end = int(np.searchsorted(boards, np.uint64(key), side="right"))
+        if start == end:
+            return None
+        found = self.records[self.disk_order[start:end]]
+        best = int(found["depth"].argmax())
+        return int(found["depth"][best]), float(found["value"][best])
+
+    def store(self, board, depth, value):
+        key = canonical(board)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] >= depth:
+            return
+        self.remember(key, (depth, value))
+        if self.fd is not None:
+            self.pending.append((key, depth, value))
+            if len(self.pending) >= self.flush_every:
+                self.flush()
+
+    def remember(self, key, entry):
+        entries = self.entries
+        entries[key] = entry
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def flush(self):
+        if not self.pending:
+            return
+        data = memoryview(np.array(self.pending, dtype=RECORD_DTYPE).tobytes())
+        # write() may stop short; the lock keeps other processes from
+        # appending between the pieces of one batch
+        with self.locked():
+            self.trim_torn_record()
+            while data:
+                data = data[os.write(self.fd, data):]
+        self.pending = []
+
+    def close(self):
+        if self.fd is not None:
+            self.flush()
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "lookups": lookups,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "in_memory": len(self.entries),
+            "on_disk": len(self.records),
+            "evictions": self.evictions,
+        }
+
+
+def warm(path, games, depth, master_seed=0, max_moves=None):
+    # Play seeded games with a cached fixed-depth solver; returns the cache stats
+    with EvalCache(path) as cache:
+        solver = ai_2048.ExpectimaxSolver(time_budget=None, max_depth=depth, cache=cache)
+        seeds = random.Random(master_seed)
+        for _ in range(games):
+            rng = random.Random(seeds.getrandbits(64))
+            board, _ = engine_2048.spawn_tile(0, rng)
+            board, _ = engine_2048.spawn_tile(board, rng)
+            moves = 0
+            while not engine_2048.is_game_over(board) and (max_moves is None or moves < max_moves):
+                board, _ = engine_2048.move(board, solver.best_move(board))
+                board, _ = engine_2048.spawn_tile(board, rng)
+                moves += 1
+        cache.flush()
+        cache.refresh()
+        return cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill and inspect persistent 2048 evaluation caches")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    warm_command = commands.add_parser("warm", help="play solver games through the cache")
+    warm_command.add_argument("cache")
+    warm_command.add_argument("--games", type=int, default=10)
+    warm_command.add_argument("--depth", type=int, default=3)
+    warm_command.add_argument("--seed", type=int, default=0)
+    warm_command.add_argument("--max-moves", type=int, default=None)
+
+    info = commands.add_parser("info", help="print record counts")
+    info.add_argument("cache")
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        stats = warm(args.cache, args.games, args.depth, args.seed, args.max_moves)
+        print(f"{stats['lookups']} lookups, hit rate {stats['hit_rate']:.1%} "
+              f"({stats['hits']} memory, {stats['disk_hits']} disk), {stats['on_disk']} records on disk")
+    else:
+        cache = EvalCache(args.cache)
+        cache.close()
+        distinct = len(np.unique(cache.disk_boards)) if len(cache.records) else 0
+        print(f"{args.cache}: {len(cache.records)} records, {distinct} distinct positions")
+
+
+if __name__ == "__main__":
+    main()
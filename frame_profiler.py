@@ -0,0 +1,197 @@
+# Per-phase frame profiler with an on-screen overlay, shared by both games.
+#
+# The run loops call mark(phase) at the end of each phase of a frame (waiting
+# for input, event handling, animation, game logic, drawing, frame-rate
+# sleep). The time since the previous mark is charged to that phase, so a
+# phase that runs several times per frame (fixed logic steps) is summed.
+# Finished frames go into a rolling window that gives p50/p95/p99 and the
+# worst frame per phase, and into a bounded trace that can be written as
+# plain JSON or as a Chrome trace (chrome://tracing, Perfetto).
+#
+# Frame times leave out the "wait" phase: blocking for input in idle mode is
+# not work, and would otherwise dominate the worst-frame figures.
+#
+# While disabled every call returns at its first check, so the hooks can stay
+# in the loops permanently.
+
+import json
+import time
+from collections import deque
+
+import pygame
+
+from render_cache import RenderCache
+
+OVERLAY_KEY = pygame.K_F3  # show/hide the overlay
+TRACE_KEY = pygame.K_F4  # write a Chrome trace of the recorded frames
+
+OVERLAY_POSITION = (8, 8)
+OVERLAY_WIDTH = 330
+OVERLAY_LINE_HEIGHT = 16
+OVERLAY_COLUMNS = (0, 110, 165, 220, 275)  # x offsets of the phase table columns
+OVERLAY_REFRESH = 0.5  # seconds between overlay text updates
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def distribution(values):
+    ordered = sorted(values)
+    return {
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "worst": ordered[-1] if ordered else 0.0,
+    }
+
+
+class FrameProfiler:
+    def __init__(self, enabled=False, history=600, trace_frames=18000):
+        self.enabled = enabled
+        self.overlay = False
+        self.phases = []  # phase names in first-seen order
+        self.frames = deque(maxlen=history)  # (wall time, frame time, {phase: seconds})
+        self.trace = deque(maxlen=trace_frames)  # (start, [(phase, start, seconds)])
+        self.in_frame = False  # only frames begun while enabled are recorded
+        self.frame_start = 0.0
+        self.last_mark = 0.0
+        self.current = []
+        self.cache = RenderCache()
+        self.overlay_lines = []
+        self.overlay_updated = 0.0
+
+    def toggle_overlay(self):
+        # Showing the overlay also starts collecting
+        self.overlay = not self.overlay
+        if self.overlay:
+            self.enabled = True
+            self.overlay_updated = 0.0
+
+    def handle_event(self, event):
+        # Returns a message for the player when a key did something visible
+        if event.type != pygame.KEYDOWN:
+            return None
+        if event.key == OVERLAY_KEY:
+            self.toggle_overlay()
+        elif event.key == TRACE_KEY:
+            if not self.trace:
+                self.enabled = True
+                return "Profiling started, press F4 again to save"
+            path = self.dump_trace(time.strftime("frame-trace-%Y%m%d-%H%M%S.json"))
+            return f"Trace saved to {path}"
+        return None
+
+    def begin_frame(self):
+        self.in_frame = self.enabled
+        if not self.in_frame:
+            return
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.current = []
+
+    def mark(self, phase):
+        # Charge the time since the previous mark to phase
+        if not self.in_frame:
+            return
+        now = time.perf_counter()
+        self.current.append((phase, self.last_mark, now - self.last_mark))
+        self.last_mark = now
+
+    def end_frame(self):
+        if not self.in_frame or not self.current:
+            return
+        self.in_frame = False
+        totals = {}
+        for phase, _, seconds in self.current:
+            if phase not in totals:
+                totals[phase] = 0.0
+                if phase not in self.phases:
+                    self.phases.append(phase)
+            totals[phase] += seconds
+        wall = self.last_mark - self.frame_start
+        self.frames.append((wall, wall - totals.get("wait", 0.0), totals))
+        self.trace.append((self.frame_start, self.current))
+        self.current = []
+
+    def stats(self):
+        # Rolling statistics in seconds over the last `history` frames
+        wall = sum(frame[0] for frame in self.frames)
+        return {
+            "frames": len(self.frames),
+            "fps": len(self.frames) / wall if wall > 0 else 0.0,
+            "frame": distribution([frame_time for _, frame_time, _ in self.frames]),
+            "phases": {phase: distribution([totals.get(phase, 0.0) for _, _, totals in self.frames])
+                       for phase in self.phases},
+        }
+
+    def trace_events(self):
+        # Chrome trace "complete" events; timestamps are microseconds
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "game"}}]
+        for start, phases in self.trace:
+            end = phases[-1][1] + phases[-1][2]
+            events.append({"name": "frame", "cat": "frame", "ph": "X", "pid": 1, "tid": 1,
+                           "ts": start * 1e6, "dur": (end - start) * 1e6})
+            for phase, phase_start, seconds in phases:
+                events.append({"name": phase, "cat": "phase", "ph": "X", "pid": 1, "tid": 1,
+                               "ts": phase_start * 1e6, "dur": seconds * 1e6})
+        return events
+
+    def dump_trace(self, path, format="chrome"):
+        if format == "chrome":
+            data = {"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}
+        else:
+            data = {
+                "stats": self.stats(),
+                "frames": [{"start": start, "phases": [[phase, phase_start, seconds]
+                                                       for phase, phase_start, seconds in phases]}
+                           for start, phases in self.trace],
+            }
+        with open(path, "w") as f:
+            json.dump(data, f)
+        return path
+
+    # Overlay
+
+    def overlay_rect(self):
+        height = OVERLAY_LINE_HEIGHT * (len(self.overlay_lines) or 2) + 8
+        return pygame.Rect(OVERLAY_POSITION, (OVERLAY_WIDTH, height))
+
+    def overlay_signature(self):
+        # Changes whenever the overlay looks different, for dirty-rect tracking
+        return (self.overlay, tuple(self.overlay_lines)) if self.overlay else None
+
+    def refresh_overlay(self):
+        # Re-rendering text every frame would show up in the draw phase itself
+        now = time.perf_counter()
+        if not self.overlay or now - self.overlay_updated < OVERLAY_REFRESH:
+            return
+        self.overlay_updated = now
+        stats = self.stats()
+        frame = stats["frame"]
+        # One string per table column; a single string spans the whole line
+        lines = [(f"{stats['fps']:.1f} FPS   frame p50 {frame['p50'] * 1000:.2f} ms   "
+                  f"p99 {frame['p99'] * 1000:.2f} ms   worst {frame['worst'] * 1000:.1f} ms",),
+                 ("phase (ms)", "p50", "p95", "p99", "worst")]
+        for phase, dist in stats["phases"].items():
+            lines.append((phase,) + tuple(f"{dist[key] * 1000:.2f}" for key in ("p50", "p95", "p99", "worst")))
+        self.overlay_lines = lines
+
+    def draw(self, screen):
+        if not self.overlay:
+            return
+        rect = self.overlay_rect()
+        panel = self.cache.surface(("panel", rect.size), lambda: self.build_panel(rect.size))
+        screen.blit(panel, rect.topleft)
+        y = rect.y + 4
+        for line in self.overlay_lines:
+            for column, text in zip(OVERLAY_COLUMNS, line):
+                screen.blit(self.cache.text(text, 18, (255, 255, 255)), (rect.x + 6 + column, y))
+            y += OVERLAY_LINE_HEIGHT
+
+    def build_panel(self, size):
+        panel = pygame.Surface(size, pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        return panel
@@ -1,19 +1,33 @@
+import argparse
 import pygame
-import random
 import sys
 
-# Initialize pygame
-pygame.init()
+import ai_2048
+import engine_2048
+from animation import Animator, FixedTimestep, ease_out_quad
+from core_2048 import Game2048State
+from dirty_rects import DirtyRectRenderer
+from frame_profiler import FrameProfiler
+from idle_mode import IdleMode
+from render_cache import RenderCache
 
 # Constants
 SCREEN_WIDTH = 500
 SCREEN_HEIGHT = 600
-GRID_SIZE = 4
+GRID_SIZE = engine_2048.GRID_SIZE
 CELL_SIZE = 100
 GRID_PADDING = 10
-GRID_OFFSET_X = (SCREEN_WIDTH - (CELL_SIZE * GRID_SIZE + GRID_PADDING * (GRID_SIZE - 1))) // 2
+GRID_WIDTH = CELL_SIZE * GRID_SIZE + GRID_PADDING * (GRID_SIZE - 1)  # tiles only, without the frame
+GRID_OFFSET_X = (SCREEN_WIDTH - GRID_WIDTH) // 2
 GRID_OFFSET_Y = 150
+MIN_BOARD_SIZE = 2
+MAX_BOARD_SIZE = 16  # cells are still 24 px wide
 FPS = 60
+MOVE_DURATION = 0.12  # seconds for a tile to slide to its new cell
+
+# Screen areas tracked by the dirty-rectangle renderer
+SCORE_AREA = (SCREEN_WIDTH - 230, 20, 210, 60)
+TOAST_AREA = ((SCREEN_WIDTH - 300) // 2, SCREEN_HEIGHT - 80, 300, 40)
 
 # Colors
 BACKGROUND_COLOR = (250, 248, 239)
@@ -57,467 +71,302 @@ TEXT_COLORS = {
     8192: (249, 246, 242),
 }
 
+class BoardLayout:
+    # Pixel geometry for a size x size board; every size fills the same area
+    def __init__(self, size=GRID_SIZE):
+        self.size = size
+        self.padding = max(3, GRID_PADDING * GRID_SIZE // size)
+        self.cell_size = (GRID_WIDTH - self.padding * (size - 1)) // size
+        self.offset_x = (SCREEN_WIDTH - (self.cell_size * size + self.padding * (size - 1))) // 2
+        self.offset_y = GRID_OFFSET_Y
+        # Cell positions and slide lines are fixed, so every move reuses them
+        step = self.cell_size + self.padding
+        self.positions = [[(self.offset_x + col * step, self.offset_y + row * step) for col in range(size)]
+                          for row in range(size)]
+        indices = range(size)
+        self.lines = {
+            engine_2048.LEFT: [[(line, col) for col in indices] for line in indices],
+            engine_2048.RIGHT: [[(line, col) for col in reversed(indices)] for line in indices],
+            engine_2048.UP: [[(row, line) for row in indices] for line in indices],
+            engine_2048.DOWN: [[(row, line) for row in reversed(indices)] for line in indices],
+        }
+    
+    def cell_position(self, row, col):
+        # Top-left pixel of a grid cell
+        return self.positions[row][col]
+    
+    def frame_rect(self):
+        # Grid background, including the padding around the outer tiles
+        span = self.size * self.cell_size + self.padding * (self.size + 1)
+        return (self.offset_x - self.padding, self.offset_y - self.padding, span, span)
+    
+    def line_cells(self, line, direction):
+        # Cells of one row or column, ordered from the wall the tiles slide towards
+        return self.lines[direction][line]
+
+# Fonts and pre-rendered surfaces shared by every frame
+cache = RenderCache()
+
+def build_tile_surface(value, cell_size=CELL_SIZE):
+    surface = pygame.Surface((cell_size, cell_size), pygame.SRCALPHA)
+    radius = max(2, 6 * cell_size // CELL_SIZE)
+    
+    # Draw tile background
+    if value == 0:
+        pygame.draw.rect(surface, EMPTY_CELL_COLOR, (0, 0, cell_size, cell_size), border_radius=radius)
+        return surface
+    pygame.draw.rect(surface, TILE_COLORS.get(value, (60, 58, 50)), 
+                    (0, 0, cell_size, cell_size), 
+                    border_radius=radius)
+    
+    # Choose font size based on the number of digits, scaled to the cell
+    digits = len(str(value))
+    if digits <= 2:
+        font_size = 48
+    elif digits == 3:
+        font_size = 40
+    elif digits == 4:
+        font_size = 32
+    else:
+        font_size = 32 * 4 // digits
+    font_size = max(8, font_size * cell_size // CELL_SIZE)
+    
+    font = cache.font(font_size, bold=True)
+    text = font.render(str(value), True, TEXT_COLORS.get(value, LIGHT_TEXT))
+    surface.blit(text, text.get_rect(center=(cell_size // 2, cell_size // 2)))
+    return surface
+
+def tile_surface(value, cell_size=CELL_SIZE):
+    return cache.surface(("tile", value, cell_size), lambda: build_tile_surface(value, cell_size))
+
+def build_overlay():
+    overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+    overlay.fill((255, 255, 255, 180))
+    return overlay
+
+def build_header():
+    # Title and the static parts of the score boxes, everything above the grid
+    header = pygame.Surface((SCREEN_WIDTH, GRID_OFFSET_Y - GRID_PADDING))
+    header.fill(BACKGROUND_COLOR)
+    pygame.draw.rect(header, GRID_COLOR, (SCREEN_WIDTH - 230, 20, 100, 60), border_radius=6)
+    pygame.draw.rect(header, GRID_COLOR, (SCREEN_WIDTH - 120, 20, 100, 60), border_radius=6)
+    
+    score_label = cache.font(24).render("SCORE", True, TEXT_COLOR)
+    best_label = cache.font(24).render("BEST", True, TEXT_COLOR)
+    header.blit(score_label, (SCREEN_WIDTH - 180 - score_label.get_width() // 2, 30))
+    header.blit(best_label, (SCREEN_WIDTH - 70 - best_label.get_width() // 2, 30))
+    
+    title = cache.font(72, bold=True).render("2048", True, TEXT_COLOR)
+    header.blit(title, (GRID_OFFSET_X, 30))
+    return header
+
 class Tile:
+    # Animation state of one cell. The view owns a fixed set of these and
+    # resets them in place, so moves allocate no tiles.
+    __slots__ = ("value", "merged", "new", "x", "y", "target_x", "target_y", "moving")
+    
     def __init__(self, value=0):
+        self.reset(value)
+    
+    def reset(self, value=0, x=0, y=0):
         self.value = value
         self.merged = False
         self.new = value != 0
-        self.x = 0
-        self.y = 0
-        self.target_x = 0
-        self.target_y = 0
+        self.x = self.target_x = x
+        self.y = self.target_y = y
         self.moving = False
-        self.move_speed = 20
-        
-    def update(self):
-        if self.moving:
-            # Move towards target position
-            dx = self.target_x - self.x
-            dy = self.target_y - self.y
-            
-            if abs(dx) < self.move_speed:
-                self.x = self.target_x
-            else:
-                self.x += self.move_speed if dx > 0 else -self.move_speed
-                
-            if abs(dy) < self.move_speed:
-                self.y = self.target_y
-            else:
-                self.y += self.move_speed if dy > 0 else -self.move_speed
-                
-            if self.x == self.target_x and self.y == self.target_y:
-                self.moving = False
-                return False
-            return True
-        return False
         
-    def draw(self, screen, x, y):
-        # Draw tile background
-        if self.value == 0:
-            pygame.draw.rect(screen, EMPTY_CELL_COLOR, 
-                            (x, y, CELL_SIZE, CELL_SIZE), 
-                            border_radius=6)
-            return
-            
-        # Draw tile with value
-        pygame.draw.rect(screen, TILE_COLORS.get(self.value, (60, 58, 50)), 
-                        (x, y, CELL_SIZE, CELL_SIZE), 
-                        border_radius=6)
+    def stop(self):
+        self.moving = False
         
-        # Draw value text
-        if self.value > 0:
-            # Choose font size based on the number of digits
-            if self.value < 100:
-                font_size = 48
-            elif self.value < 1000:
-                font_size = 40
-            else:
-                font_size = 32
-                
-            font = pygame.font.SysFont(None, font_size, bold=True)
-            text_color = TEXT_COLORS.get(self.value, LIGHT_TEXT)
-            text = font.render(str(self.value), True, text_color)
-            text_rect = text.get_rect(center=(x + CELL_SIZE // 2, y + CELL_SIZE // 2))
-            screen.blit(text, text_rect)
+    def draw(self, screen, x, y, cell_size=CELL_SIZE):
+        # Background, rounded corners and value text are pre-rendered per value
+        screen.blit(tile_surface(self.value, cell_size), (x, y))
 
-class Game2048:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("2048")
+class Game2048(Game2048State):
+    # pygame view and input on top of the headless game state
+    def __init__(self, dirty_rects=True, idle_mode=True, seed=None, recorder=None, screen=None,
+                 profile=False, size=GRID_SIZE):
+        # pygame is only initialised once a view is created, never at import
+        pygame.init()
+        if screen is None:
+            screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("2048")
+        self.screen = screen
         self.clock = pygame.time.Clock()
-        self.grid = [[Tile() for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-        self.score = 0
-        self.best_score = 0
-        self.game_over = False
-        self.won = False
-        self.font = pygame.font.SysFont(None, 36, bold=True)
-        self.small_font = pygame.font.SysFont(None, 24)
+        self.layout = BoardLayout(size)
+        # Tiles only carry animation state; the board in Game2048State is the truth.
+        # A move fills the spare grid from the board diff and swaps the two.
+        self.grid = [[Tile() for _ in range(size)] for _ in range(size)]
+        self.spare_grid = [[Tile() for _ in range(size)] for _ in range(size)]
+        self.cache = cache
+        # Redraw and present only the regions that changed (None = full flips)
+        self.renderer = DirtyRectRenderer(self.screen, self.draw_frame) if dirty_rects else None
+        # Sleep in pygame.event.wait() while nothing is animating
+        self.idle = IdleMode(FPS, enabled=idle_mode)
+        # Per-phase frame timings; F3 shows the overlay, F4 saves a trace
+        self.profiler = FrameProfiler(enabled=profile)
         self.toast_message = ""
         self.toast_timer = 0
         self.toast_duration = 1.5  # seconds
-        self.moving_tiles = False
+        self.game_state = "idle"  # States: idle, moving
+        # Tile slides run on wall-clock tweens; logic advances in fixed steps
+        self.animator = Animator()
+        self.timestep = FixedTimestep()
+        self.solver = None  # created on first hint/autoplay request
+        self.autoplay = False
         
-        # Add initial tiles
-        self.add_random_tile()
-        self.add_random_tile()
+        # Starts the first game and spawns its initial tiles
+        Game2048State.__init__(self, seed, recorder, size)
         
-    def add_random_tile(self):
-        # Find all empty cells
-        empty_cells = []
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                if self.grid[row][col].value == 0:
-                    empty_cells.append((row, col))
-        
-        if empty_cells:
-            # Choose a random empty cell
-            row, col = random.choice(empty_cells)
-            # 90% chance for a 2, 10% chance for a 4
-            self.grid[row][col] = Tile(2 if random.random() < 0.9 else 4)
-            self.grid[row][col].new = True
-            
-            # Set position for animation
-            self.grid[row][col].x = GRID_OFFSET_X + col * (CELL_SIZE + GRID_PADDING)
-            self.grid[row][col].y = GRID_OFFSET_Y + row * (CELL_SIZE + GRID_PADDING)
-            self.grid[row][col].target_x = self.grid[row][col].x
-            self.grid[row][col].target_y = self.grid[row][col].y
-            
-            return True
-        return False
+    def on_spawn(self, cell):
+        row, col = divmod(cell, self.size)
+        x, y = self.layout.cell_position(row, col)
+        self.grid[row][col].reset(1 << self.rules.get_cell(self.board, row, col), x, y)
     
-    def reset_merged_flags(self):
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                self.grid[row][col].merged = False
-                self.grid[row][col].new = False
+    def on_move(self, old_board, new_board, direction):
+        self.animate_move(old_board, new_board, direction)
     
-    def is_game_over(self):
-        # Check if there are any empty cells
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                if self.grid[row][col].value == 0:
-                    return False
+    def animate_move(self, old_board, new_board, direction):
+        # Rebuild the tile grid from the board diff, sliding each tile from its old cell
+        layout = self.layout
+        get_cell = self.rules.get_cell
+        grid = self.spare_grid
+        for tiles in grid:
+            for tile in tiles:
+                tile.reset()
+        # Tweens still running belong to the grid being replaced
+        self.animator.clear()
         
-        # Check if there are any possible merges
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                value = self.grid[row][col].value
+        for line in range(self.size):
+            cells = layout.line_cells(line, direction)
+            values = [get_cell(old_board, row, col) for row, col in cells]
+            
+            for src_index, dst_index in engine_2048.slide_targets(values, self.rules.limit).items():
+                src_row, src_col = cells[src_index]
+                dst_row, dst_col = cells[dst_index]
                 
-                # Check right
-                if col < GRID_SIZE - 1 and self.grid[row][col + 1].value == value:
-                    return False
+                # The second tile of a merge disappears into the first one
+                if grid[dst_row][dst_col].value != 0:
+                    continue
                 
-                # Check down
-                if row < GRID_SIZE - 1 and self.grid[row + 1][col].value == value:
-                    return False
-        
-        return True
-    
-    def check_win(self):
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                if self.grid[row][col].value == 2048:
-                    return True
-        return False
-    
-    def move_left(self):
-        moved = False
-        self.reset_merged_flags()
-        
-        for row in range(GRID_SIZE):
-            for col in range(1, GRID_SIZE):
-                if self.grid[row][col].value != 0:
-                    # Move tile as far left as possible
-                    current_col = col
-                    while current_col > 0:
-                        # If the cell to the left is empty, move there
-                        if self.grid[row][current_col - 1].value == 0:
-                            self.grid[row][current_col - 1] = self.grid[row][current_col]
-                            self.grid[row][current_col] = Tile()
-                            current_col -= 1
-                            moved = True
-                            
-                            # Set animation target
-                            self.grid[row][current_col].target_x = GRID_OFFSET_X + current_col * (CELL_SIZE + GRID_PADDING)
-                            self.grid[row][current_col].target_y = GRID_OFFSET_Y + row * (CELL_SIZE + GRID_PADDING)
-                            self.grid[row][current_col].moving = True
-                            self.moving_tiles = True
-                        
-                        # If the cell to the left has the same value and hasn't been merged yet, merge them
-                        elif (self.grid[row][current_col - 1].value == self.grid[row][current_col].value and 
-                              not self.grid[row][current_col - 1].merged and 
-                              not self.grid[row][current_col].merged):
-                            
-                            self.grid[row][current_col - 1].value *= 2
-                            self.grid[row][current_col - 1].merged = True
-                            self.score += self.grid[row][current_col - 1].value
-                            self.best_score = max(self.best_score, self.score)
-                            self.grid[row][current_col] = Tile()
-                            moved = True
-                            
-                            # Set animation target
-                            self.grid[row][current_col - 1].target_x = GRID_OFFSET_X + (current_col - 1) * (CELL_SIZE + GRID_PADDING)
-                            self.grid[row][current_col - 1].target_y = GRID_OFFSET_Y + row * (CELL_SIZE + GRID_PADDING)
-                            self.grid[row][current_col - 1].moving = True
-                            self.moving_tiles = True
-                            
-                            break
-                        else:
-                            break
+                exponent = get_cell(new_board, dst_row, dst_col)
+                tile = grid[dst_row][dst_col]
+                tile.value = 1 << exponent
+                tile.merged = exponent != values[src_index]
+                tile.x, tile.y = layout.cell_position(src_row, src_col)
+                tile.target_x, tile.target_y = layout.cell_position(dst_row, dst_col)
+                
+                if src_index != dst_index:
+                    tile.moving = True
+                    self.animator.move(tile, tile.target_x, tile.target_y, MOVE_DURATION,
+                                       ease_out_quad, on_complete=tile.stop)
         
-        return moved
+        self.grid, self.spare_grid = grid, self.grid
     
-    def move_right(self):
-        moved = False
-        self.reset_merged_flags()
-        
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE - 2, -1, -1):
-                if self.grid[row][col].value != 0:
-                    # Move tile as far right as possible
-                    current_col = col
-                    while current_col < GRID_SIZE - 1:
-                        # If the cell to the right is empty, move there
-                        if self.grid[row][current_col + 1].value == 0:
-                            self.grid[row][current_col + 1] = self.grid[row][current_col]
-                            self.grid[row][current_col] = Tile()
-                            current_col += 1
-                            moved = True
-                            
-                            # Set animation target
-                            self.grid[row][current_col].target_x = GRID_OFFSET_X + current_col * (CELL_SIZE + GRID_PADDING)
-                            self.grid[row][current_col].target_y = GRID_OFFSET_Y + row * (CELL_SIZE + GRID_PADDING)
-                            self.grid[row][current_col].moving = True
-                            self.moving_tiles = True
-                        
-                        # If the cell to the right has the same value and hasn't been merged yet, merge them
-                        elif (self.grid[row][current_col + 1].value == self.grid[row][current_col].value and 
-                              not self.grid[row][current_col + 1].merged and 
-                              not self.grid[row][current_col].merged):
-                            
-                            self.grid[row][current_col + 1].value *= 2
-                            self.grid[row][current_col + 1].merged = True
-                            self.score += self.grid[row][current_col + 1].value
-                            self.best_score = max(self.best_score, self.score)
-                            self.grid[row][current_col] = Tile()
-                            moved = True
-                            
-                            # Set animation target
-                            self.grid[row][current_col + 1].target_x = GRID_OFFSET_X + (current_col + 1) * (CELL_SIZE + GRID_PADDING)
-                            self.grid[row][current_col + 1].target_y = GRID_OFFSET_Y + row * (CELL_SIZE + GRID_PADDING)
-                            self.grid[row][current_col + 1].moving = True
-                            self.moving_tiles = True
-                            
-                            break
-                        else:
-                            break
-        
-        return moved
+    def update_tiles(self, dt):
+        # Advance tile animations by dt seconds; True while any tile is moving
+        return self.animator.update(dt)
     
-    def move_up(self):
-        moved = False
-        self.reset_merged_flags()
+    def update(self, dt):
+        # One fixed logic step
+        self.update_tiles(dt)
+        self.profiler.mark("animation")
         
-        for col in range(GRID_SIZE):
-            for row in range(1, GRID_SIZE):
-                if self.grid[row][col].value != 0:
-                    # Move tile as far up as possible
-                    current_row = row
-                    while current_row > 0:
-                        # If the cell above is empty, move there
-                        if self.grid[current_row - 1][col].value == 0:
-                            self.grid[current_row - 1][col] = self.grid[current_row][col]
-                            self.grid[current_row][col] = Tile()
-                            current_row -= 1
-                            moved = True
-                            
-                            # Set animation target
-                            self.grid[current_row][col].target_x = GRID_OFFSET_X + col * (CELL_SIZE + GRID_PADDING)
-                            self.grid[current_row][col].target_y = GRID_OFFSET_Y + current_row * (CELL_SIZE + GRID_PADDING)
-                            self.grid[current_row][col].moving = True
-                            self.moving_tiles = True
-                        
-                        # If the cell above has the same value and hasn't been merged yet, merge them
-                        elif (self.grid[current_row - 1][col].value == self.grid[current_row][col].value and 
-                              not self.grid[current_row - 1][col].merged and 
-                              not self.grid[current_row][col].merged):
-                            
-                            self.grid[current_row - 1][col].value *= 2
-                            self.grid[current_row - 1][col].merged = True
-                            self.score += self.grid[current_row - 1][col].value
-                            self.best_score = max(self.best_score, self.score)
-                            self.grid[current_row][col] = Tile()
-                            moved = True
-                            
-                            # Set animation target
-                            self.grid[current_row - 1][col].target_x = GRID_OFFSET_X + col * (CELL_SIZE + GRID_PADDING)
-                            self.grid[current_row - 1][col].target_y = GRID_OFFSET_Y + (current_row - 1) * (CELL_SIZE + GRID_PADDING)
-                            self.grid[current_row - 1][col].moving = True
-                            self.moving_tiles = True
-                            
-                            break
-                        else:
-                            break
-        
-        return moved
-    
-    def move_down(self):
-        moved = False
-        self.reset_merged_flags()
+        # Let the solver pick the next move while autoplay is on
+        if self.game_state == "idle" and self.autoplay and not self.game_over and not self.won:
+            direction = self.get_solver().best_move(self.board)
+            if direction is not None and self.apply_move(direction):
+                self.game_state = "moving"
         
-        for col in range(GRID_SIZE):
-            for row in range(GRID_SIZE - 2, -1, -1):
-                if self.grid[row][col].value != 0:
-                    # Move tile as far down as possible
-                    current_row = row
-                    while current_row < GRID_SIZE - 1:
-                        # If the cell below is empty, move there
-                        if self.grid[current_row + 1][col].value == 0:
-                            self.grid[current_row + 1][col] = self.grid[current_row][col]
-                            self.grid[current_row][col] = Tile()
-                            current_row += 1
-                            moved = True
-                            
-                            # Set animation target
-                            self.grid[current_row][col].target_x = GRID_OFFSET_X + col * (CELL_SIZE + GRID_PADDING)
-                            self.grid[current_row][col].target_y = GRID_OFFSET_Y + current_row * (CELL_SIZE + GRID_PADDING)
-                            self.grid[current_row][col].moving = True
-                            self.moving_tiles = True
-                        
-                        # If the cell below has the same value and hasn't been merged yet, merge them
-                        elif (self.grid[current_row + 1][col].value == self.grid[current_row][col].value and 
-                              not self.grid[current_row + 1][col].merged and 
-                              not self.grid[current_row][col].merged):
-                            
-                            self.grid[current_row + 1][col].value *= 2
-                            self.grid[current_row + 1][col].merged = True
-                            self.score += self.grid[current_row + 1][col].value
-                            self.best_score = max(self.best_score, self.score)
-                            self.grid[current_row][col] = Tile()
-                            moved = True
-                            
-                            # Set animation target
-                            self.grid[current_row + 1][col].target_x = GRID_OFFSET_X + col * (CELL_SIZE + GRID_PADDING)
-                            self.grid[current_row + 1][col].target_y = GRID_OFFSET_Y + (current_row + 1) * (CELL_SIZE + GRID_PADDING)
-                            self.grid[current_row + 1][col].moving = True
-                            self.moving_tiles = True
-                            
-                            break
-                        else:
-                            break
-        
-        return moved
-    
-    def update_tiles(self):
-        still_moving = False
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                if self.grid[row][col].update():
-                    still_moving = True
-        return still_moving
+        # Wait for tiles to finish moving
+        if self.game_state == "moving" and not self.animator.busy:
+            # Add a new tile and check for win or game over
+            result = self.finish_move()
+            if result == "won":
+                self.show_toast("You reached 2048!")
+            elif result == "lost":
+                self.show_toast("Game Over!")
+            
+            self.game_state = "idle"
+        self.profiler.mark("logic")
     
     def draw_grid(self):
+        layout = self.layout
+        cell_size = layout.cell_size
+        
         # Draw grid background
-        pygame.draw.rect(self.screen, GRID_COLOR, 
-                        (GRID_OFFSET_X - GRID_PADDING, 
-                         GRID_OFFSET_Y - GRID_PADDING, 
-                         GRID_SIZE * CELL_SIZE + GRID_PADDING * (GRID_SIZE + 1), 
-                         GRID_SIZE * CELL_SIZE + GRID_PADDING * (GRID_SIZE + 1)), 
-                        border_radius=10)
+        pygame.draw.rect(self.screen, GRID_COLOR, layout.frame_rect(), border_radius=10)
         
         # Draw tiles
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                x = GRID_OFFSET_X + col * (CELL_SIZE + GRID_PADDING)
-                y = GRID_OFFSET_Y + row * (CELL_SIZE + GRID_PADDING)
+        for row in range(self.size):
+            for col in range(self.size):
+                x, y = layout.cell_position(row, col)
                 
                 # Draw empty cell
                 if self.grid[row][col].value == 0:
-                    pygame.draw.rect(self.screen, EMPTY_CELL_COLOR, 
-                                    (x, y, CELL_SIZE, CELL_SIZE), 
-                                    border_radius=6)
+                    self.screen.blit(tile_surface(0, cell_size), (x, y))
                 else:
                     # Draw tile at its current position (for animation)
                     self.grid[row][col].draw(self.screen, 
                                            self.grid[row][col].x, 
-                                           self.grid[row][col].y)
+                                           self.grid[row][col].y,
+                                           cell_size)
     
     def draw_score(self):
-        # Draw score box
-        pygame.draw.rect(self.screen, GRID_COLOR, 
-                        (SCREEN_WIDTH - 230, 20, 100, 60), 
-                        border_radius=6)
-        
-        # Draw best score box
-        pygame.draw.rect(self.screen, GRID_COLOR, 
-                        (SCREEN_WIDTH - 120, 20, 100, 60), 
-                        border_radius=6)
-        
-        # Draw score labels
-        score_label = self.small_font.render("SCORE", True, TEXT_COLOR)
-        best_label = self.small_font.render("BEST", True, TEXT_COLOR)
-        
-        self.screen.blit(score_label, (SCREEN_WIDTH - 180 - score_label.get_width() // 2, 30))
-        self.screen.blit(best_label, (SCREEN_WIDTH - 70 - best_label.get_width() // 2, 30))
+        # Draw title, score boxes and labels
+        self.screen.blit(cache.surface("header", build_header), (0, 0))
         
         # Draw score values
-        score_value = self.font.render(str(self.score), True, LIGHT_TEXT)
-        best_value = self.font.render(str(self.best_score), True, LIGHT_TEXT)
+        score_value = cache.text(str(self.score), 36, LIGHT_TEXT, bold=True)
+        best_value = cache.text(str(self.best_score), 36, LIGHT_TEXT, bold=True)
         
         self.screen.blit(score_value, (SCREEN_WIDTH - 180 - score_value.get_width() // 2, 55))
         self.screen.blit(best_value, (SCREEN_WIDTH - 70 - best_value.get_width() // 2, 55))
+    
+    def draw_message(self, message, button_label):
+        # Draw semi-transparent overlay
+        self.screen.blit(cache.surface("overlay", build_overlay), (0, 0))
+        
+        message_text = cache.text(message, 72, TEXT_COLOR, bold=True)
+        button_text = cache.text(button_label, 36, LIGHT_TEXT, bold=True)
         
-        # Draw title
-        title_font = pygame.font.SysFont(None, 72, bold=True)
-        title = title_font.render("2048", True, TEXT_COLOR)
-        self.screen.blit(title, (GRID_OFFSET_X, 30))
+        pygame.draw.rect(self.screen, GRID_COLOR, 
+                        (SCREEN_WIDTH // 2 - 80, SCREEN_HEIGHT // 2 + 20, 160, 50), 
+                        border_radius=6)
+        
+        self.screen.blit(message_text, 
+                        (SCREEN_WIDTH // 2 - message_text.get_width() // 2, 
+                         SCREEN_HEIGHT // 2 - 50))
+        
+        self.screen.blit(button_text, 
+                        (SCREEN_WIDTH // 2 - button_text.get_width() // 2, 
+                         SCREEN_HEIGHT // 2 + 35))
     
     def draw_game_over(self):
         if self.game_over:
-            # Draw semi-transparent overlay
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((255, 255, 255, 180))
-            self.screen.blit(overlay, (0, 0))
-            
-            # Draw game over message
-            game_over_font = pygame.font.SysFont(None, 72, bold=True)
-            game_over_text = game_over_font.render("Game Over!", True, TEXT_COLOR)
-            
-            # Draw restart button
-            restart_font = pygame.font.SysFont(None, 36, bold=True)
-            restart_text = restart_font.render("Try Again", True, LIGHT_TEXT)
-            
-            pygame.draw.rect(self.screen, GRID_COLOR, 
-                            (SCREEN_WIDTH // 2 - 80, SCREEN_HEIGHT // 2 + 20, 160, 50), 
-                            border_radius=6)
-            
-            self.screen.blit(game_over_text, 
-                            (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, 
-                             SCREEN_HEIGHT // 2 - 50))
-            
-            self.screen.blit(restart_text, 
-                            (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, 
-                             SCREEN_HEIGHT // 2 + 35))
+            self.draw_message("Game Over!", "Try Again")
     
     def draw_win(self):
         if self.won:
-            # Draw semi-transparent overlay
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((255, 255, 255, 180))
-            self.screen.blit(overlay, (0, 0))
-            
-            # Draw win message
-            win_font = pygame.font.SysFont(None, 72, bold=True)
-            win_text = win_font.render("You Win!", True, TEXT_COLOR)
-            
-            # Draw continue button
-            continue_font = pygame.font.SysFont(None, 36, bold=True)
-            continue_text = continue_font.render("Continue", True, LIGHT_TEXT)
-            
-            pygame.draw.rect(self.screen, GRID_COLOR, 
-                            (SCREEN_WIDTH // 2 - 80, SCREEN_HEIGHT // 2 + 20, 160, 50), 
-                            border_radius=6)
-            
-            self.screen.blit(win_text, 
-                            (SCREEN_WIDTH // 2 - win_text.get_width() // 2, 
-                             SCREEN_HEIGHT // 2 - 50))
-            
-            self.screen.blit(continue_text, 
-                            (SCREEN_WIDTH // 2 - continue_text.get_width() // 2, 
-                             SCREEN_HEIGHT // 2 + 35))
+            self.draw_message("You Win!", "Continue")
+    
+    def toast_alpha(self):
+        # Calculate alpha based on remaining time (fade out effect), 0 when hidden
+        remaining = (self.toast_timer + self.toast_duration * 1000) - pygame.time.get_ticks()
+        if not self.toast_message or remaining <= 0:
+            return 0
+        return min(255, int(255 * remaining / (self.toast_duration * 500)))
     
     def draw_toast(self):
-        if self.toast_message and pygame.time.get_ticks() < self.toast_timer + self.toast_duration * 1000:
-            # Calculate alpha based on remaining time (fade out effect)
-            remaining = (self.toast_timer + self.toast_duration * 1000) - pygame.time.get_ticks()
-            alpha = min(255, int(255 * remaining / (self.toast_duration * 500)))
-            
+        alpha = self.toast_alpha()
+        if alpha > 0:
             # Create toast background
             toast_surface = pygame.Surface((300, 40), pygame.SRCALPHA)
             pygame.draw.rect(toast_surface, (0, 0, 0, min(180, alpha)), (0, 0, 300, 40), border_radius=10)
             
             # Create toast text
-            toast_text = self.small_font.render(self.toast_message, True, (255, 255, 255, alpha))
+            toast_text = cache.text(self.toast_message, 24, (255, 255, 255))
             text_width = toast_text.get_width()
             
             # Position toast in center bottom of screen
@@ -530,28 +379,115 @@ class Game2048:
         self.toast_message = message
         self.toast_timer = pygame.time.get_ticks()
     
-    def reset_game(self):
-        self.grid = [[Tile() for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-        self.score = 0
-        self.game_over = False
-        self.won = False
-        self.moving_tiles = False
+    def draw_frame(self):
+        self.screen.fill(BACKGROUND_COLOR)
+        self.draw_grid()
+        self.draw_score()
+        self.draw_toast()
+        
+        if self.game_over:
+            self.draw_game_over()
+        elif self.won:
+            self.draw_win()
+        
+        self.profiler.draw(self.screen)
+    
+    def track_dirty_regions(self):
+        renderer = self.renderer
+        cell_size = self.layout.cell_size
+        for row in range(self.size):
+            for col in range(self.size):
+                tile = self.grid[row][col]
+                x, y = (tile.x, tile.y) if tile.value else self.layout.cell_position(row, col)
+                renderer.track(("cell", row, col), (x, y, cell_size, cell_size), (tile.value, x, y))
         
-        # Add initial tiles
-        self.add_random_tile()
-        self.add_random_tile()
+        renderer.track("score", SCORE_AREA, (self.score, self.best_score))
+        renderer.track("toast", TOAST_AREA, (self.toast_message, self.toast_alpha()))
+        renderer.track("profiler", self.profiler.overlay_rect(), self.profiler.overlay_signature())
+        renderer.track("overlay", self.screen.get_rect(), (self.game_over, self.won))
+    
+    def is_busy(self):
+        # Anything that needs frames even without input
+        return self.animator.busy or self.game_state != "idle" or self.autoplay
+    
+    def present(self):
+        if self.renderer is None:
+            self.draw_frame()
+            pygame.display.flip()
+        else:
+            self.track_dirty_regions()
+            self.renderer.render()
+    
+    def get_solver(self):
+        if self.solver is None:
+            self.solver = ai_2048.ExpectimaxSolver()
+        return self.solver
     
-    def run(self):
+    def solver_available(self):
+        # The solver, replays and datasets work on the 4x4 bitboard only
+        if self.size == GRID_SIZE:
+            return True
+        self.show_toast(f"Not available on {self.size}x{self.size} boards")
+        return False
+    
+    def show_hint(self):
+        if not self.solver_available():
+            return
+        direction = self.get_solver().best_move(self.board)
+        if direction is None:
+            self.show_toast("No moves left")
+        else:
+            self.show_toast(f"Hint: {ai_2048.DIRECTION_NAMES[direction]}")
+    
+    def toggle_autoplay(self):
+        if not self.autoplay and not self.solver_available():
+            return
+        self.autoplay = not self.autoplay
+        if self.autoplay:
+            self.show_toast("Autoplay on")
+        else:
+            nodes_per_second = self.get_solver().nodes_per_second
+            self.show_toast(f"Autoplay off ({nodes_per_second / 1000:.0f}k nodes/s)")
+    
+    def save_replay(self, path=None):
+        if not self.solver_available():
+            return None
+        path = Game2048State.save_replay(self, path)
+        self.show_toast(f"Replay saved to {path}")
+        return path
+    
+    def reset_game(self, seed=None):
+        for tiles in self.grid:
+            for tile in tiles:
+                tile.reset()
+        self.game_state = "idle"
+        self.animator.clear()
+        self.new_game(seed)
+    
+    def run(self, fps=FPS):
         running = True
-        game_state = "idle"  # States: idle, moving, game_over, win
+        dt = 0.0  # seconds since the previous frame, from clock.tick()
+        self.idle.fps = fps
         
         while running:
-            # Handle events
-            for event in pygame.event.get():
+            profiler = self.profiler
+            profiler.begin_frame()
+            
+            # Handle events, blocking until the next one while idle
+            events = self.idle.events(self.clock, self.is_busy(), self.toast_alpha() > 0)
+            profiler.mark("wait")
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
                 
-                if game_state == "idle" and not self.game_over and not self.won:
+                if self.renderer is not None:
+                    self.renderer.handle_event(event)
+                
+                message = profiler.handle_event(event)
+                if message:
+                    self.show_toast(message)
+                
+                if self.game_state == "idle" and not self.game_over and not self.won:
                     if event.type == pygame.KEYDOWN:
                         moved = False
                         
@@ -563,9 +499,16 @@ class Game2048:
                             moved = self.move_up()
                         elif event.key == pygame.K_DOWN:
                             moved = self.move_down()
+                        elif event.key == pygame.K_h:
+                            self.show_hint()
+                        elif event.key == pygame.K_s:
+                            self.save_replay()
                         
                         if moved:
-                            game_state = "moving"
+                            self.game_state = "moving"
+                
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                    self.toggle_autoplay()
                 
                 # Handle game over or win screen clicks
                 if event.type == pygame.MOUSEBUTTONDOWN:
@@ -577,46 +520,42 @@ class Game2048:
                         if button_rect.collidepoint(x, y):
                             if self.game_over:
                                 self.reset_game()
-                                game_state = "idle"
                             else:  # won
                                 self.won = False
-                                game_state = "idle"
-            
-            # Game logic based on state
-            if game_state == "moving":
-                # Wait for tiles to finish moving
-                if not self.update_tiles() and not self.moving_tiles:
-                    # Add a new tile
-                    if self.add_random_tile():
-                        # Check for win or game over
-                        if self.check_win() and not self.won:
-                            self.won = True
-                            self.show_toast("You reached 2048!")
-                        elif self.is_game_over():
-                            self.game_over = True
-                            self.show_toast("Game Over!")
-                    
-                    game_state = "idle"
-                else:
-                    self.moving_tiles = self.update_tiles()
+                            self.game_state = "idle"
             
-            # Drawing
-            self.screen.fill(BACKGROUND_COLOR)
-            self.draw_grid()
-            self.draw_score()
-            self.draw_toast()
+            profiler.mark("events")
             
-            if self.game_over:
-                self.draw_game_over()
-            elif self.won:
-                self.draw_win()
+            # Game logic at a fixed timestep, independent of the frame rate
+            for _ in range(self.timestep.advance(dt)):
+                self.update(self.timestep.step)
             
-            pygame.display.flip()
-            self.clock.tick(FPS)
+            # Drawing
+            profiler.refresh_overlay()
+            self.present()
+            profiler.mark("draw")
+            dt = self.clock.tick(fps) / 1000
+            profiler.mark("sleep")
+            profiler.end_frame()
         
+        if self.idle.enabled:
+            print(f"Idle mode skipped {self.idle.frames_skipped} frames")
+        if self.profiler.frames:
+            frame = self.profiler.stats()["frame"]
+            print(f"Frame time p50 {frame['p50'] * 1000:.2f} ms, p99 {frame['p99'] * 1000:.2f} ms, "
+                  f"worst {frame['worst'] * 1000:.2f} ms")
+        if self.recorder is not None:
+            self.recorder.close()
         pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
-    game = Game2048()
+    # Optional board size, e.g. "python game_2048.py 6" for a 6x6 board
+    parser = argparse.ArgumentParser(description="Play 2048")
+    parser.add_argument("size", type=int, nargs="?", default=GRID_SIZE,
+                        help=f"board size, {MIN_BOARD_SIZE} to {MAX_BOARD_SIZE} (default {GRID_SIZE})")
+    args = parser.parse_args()
+    if not MIN_BOARD_SIZE <= args.size <= MAX_BOARD_SIZE:
+        parser.error(f"board size must be from {MIN_BOARD_SIZE} to {MAX_BOARD_SIZE}, not {args.size}")
+    game = Game2048(size=args.size)
     game.run()
@@ -0,0 +1,55 @@
+# Event-driven low-power idle mode for the game loops.
+#
+# While nothing moves on screen the loop blocks in pygame.event.wait() instead
+# of polling and redrawing at full frame rate, so an idle window uses no CPU.
+# A fading toast only needs a low refresh rate, so it waits with a timeout;
+# running animations fall back to normal polling. Input, window and timer
+# events (pygame.time.set_timer) all wake the loop.
+
+import time
+
+import pygame
+
+
+class IdleMode:
+    def __init__(self, fps=60, toast_fps=20, enabled=True):
+        self.fps = fps
+        self.toast_fps = toast_fps
+        self.enabled = enabled
+
+        self.frames = 0
+        self.frames_skipped = 0  # frames a polling loop would have drawn while we slept
+        self.idle_time = 0.0
+        self.wakeups = 0
+
+    def events(self, clock, animating, toast_active):
+        # Return this frame's events, sleeping first when there is nothing to animate
+        self.frames += 1
+        if not self.enabled or animating or self.frames == 1:
+            return pygame.event.get()
+
+        start = time.perf_counter()
+        if toast_active:
+            event = pygame.event.wait(1000 // self.toast_fps)
+        else:
+            event = pygame.event.wait()
+        blocked = time.perf_counter() - start
+
+        self.wakeups += 1
+        self.idle_time += blocked
+        self.frames_skipped += max(0, int(blocked * self.fps) - 1)
+
+        # Restart frame timing so the sleep is not fed to the game logic
+        clock.tick()
+
+        events = [] if event.type == pygame.NOEVENT else [event]
+        events.extend(pygame.event.get())
+        return events
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "frames_skipped": self.frames_skipped,
+            "idle_seconds": round(self.idle_time, 3),
+            "wakeups": self.wakeups,
+        }
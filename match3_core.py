@@ -0,0 +1,364 @@
+# Headless match-3 game: board state and rules without any pygame.
+#
+# The grid holds colour indices (None for a cleared cell) and every new gem
+# comes from a per-game random.Random, so a seeded game is reproducible. The
+# pygame view in match3_game.py subclasses Match3State and overrides the
+# on_* hooks to keep its gem sprites in step with the grid.
+#
+# Next to the grid the state keeps one bitmask per colour (engine_match3),
+# updated by every change to the grid. Matches are found on the masks and
+# cleared from the resulting match mask. Code that assigns a whole new grid
+# must go through set_grid() so the masks follow.
+#
+# Every change marks its row and column dirty, and find_matches() does
+# nothing while the board is clean. On large boards (INCREMENTAL_MIN_SIZE)
+# it only rescans dirty rows for horizontal runs and dirty columns for
+# vertical ones, keeping the runs found elsewhere. After a swap that is two
+# rows and two columns; after a drop, the refilled columns and the rows down
+# to their lowest hole.
+
+import random
+from itertools import islice
+
+import engine_match3
+
+GRID_SIZE = 7  # Reduced from 8 to 7
+NUM_COLORS = 6
+MATCH_POINTS = 10  # per cleared gem
+# Smallest board rescanned incrementally. A drop dirties most rows, so on
+# smaller boards tracking regions costs more than one full scan of the masks
+# (match3.resolve benchmark: the two break even between 64 and 96).
+INCREMENTAL_MIN_SIZE = 96
+
+
+def generate_grid(rng, size, num_colors):
+    # A random board without matches, built in one pass: each cell picks
+    # uniformly among the colours that do not complete a run with the two
+    # cells to its left or the two above it, the only runs it can close
+    if num_colors < 3:
+        raise ValueError("a board without matches needs at least 3 colours")
+    random = rng.random  # much cheaper per cell than randrange
+    grid = []
+    for row in range(size):
+        line = []
+        above1 = grid[row - 1] if row >= 2 else None
+        above2 = grid[row - 2] if row >= 2 else None
+        for col in range(size):
+            # Up to two banned colours, -1 for none
+            banned = line[col - 1] if col >= 2 and line[col - 1] == line[col - 2] else -1
+            other = above1[col] if above1 is not None and above1[col] == above2[col] else -1
+            if other == banned or banned < 0:
+                banned, other = max(banned, other), -1
+            if banned < 0:
+                color = int(random() * num_colors)
+            elif other < 0:
+                color = int(random() * (num_colors - 1))
+                if color >= banned:
+                    color += 1
+            else:
+                # Step over both, lowest first
+                low, high = (banned, other) if banned < other else (other, banned)
+                color = int(random() * (num_colors - 2))
+                if color >= low:
+                    color += 1
+                if color >= high:
+                    color += 1
+            line.append(color)
+        grid.append(line)
+    return grid
+
+
+class CascadeStep:
+    # One link of a cascade chain, recorded by resolve_timeline(): the gems
+    # cleared, then how the rest fell and which new gems filled the columns
+    def __init__(self, chain):
+        self.chain = chain  # 1 for the swap's own matches, 2 and up for cascades
+        self.cleared = []  # (row, col)
+        self.falls = []  # (from_row, to_row, col), bottom-up within each column
+        self.spawns = []  # (row, col, color)
+        self.points = 0
+        self.score = 0  # total score once this step is done
+
+
+class Match3State:
+    def __init__(self, seed=None, grid_size=GRID_SIZE, num_colors=NUM_COLORS, min_moves=1):
+        self.grid_size = grid_size
+        self.num_colors = num_colors
+        self.min_moves = min_moves  # valid swaps a new board must offer
+        self.rng = random.Random(seed)
+        self.score = 0
+        self.stride = engine_match3.stride_for(grid_size)
+        self.bits = [[engine_match3.cell_bit(row, col, self.stride) for col in range(grid_size)]
+                     for row in range(grid_size)]
+        self.full_mask = engine_match3.board_mask(grid_size)
+        self.column_masks = [engine_match3.column_mask(col, grid_size) for col in range(grid_size)]
+        self.grid = [[None] * grid_size for _ in range(grid_size)]
+        self.masks = [0] * num_colors  # colour -> bitmask of its cells
+        self.match_mask = 0  # cells marked by the last find_matches()
+        self.horizontal_matches = 0
+        self.vertical_matches = 0
+        self.dirty_rows = 0  # bit i set: row i changed since the last find_matches()
+        self.dirty_cols = 0
+        self.initialize_grid()
+
+    def random_color(self):
+        return self.rng.randrange(self.num_colors)
+
+    def initialize_grid(self):
+        # Generate a board without matches, again until it offers min_moves
+        # valid swaps
+        while True:
+            self.set_grid(generate_grid(self.rng, self.grid_size, self.num_colors))
+            if self.count_valid_swaps(self.min_moves) >= self.min_moves:
+                break
+
+    def set_grid(self, grid):
+        # Replace the whole grid (fixtures, loading) and rebuild the masks
+        self.grid = grid
+        self.masks = engine_match3.masks_from_grid(grid, self.num_colors)
+        self.mark_all_dirty()
+
+    def mark_all_dirty(self):
+        # Forget every run found so far; the next find_matches() scans everything
+        self.dirty_rows = self.dirty_cols = (1 << self.grid_size) - 1
+        self.horizontal_matches = self.vertical_matches = self.match_mask = 0
+
+    def set_cell(self, row, col, color):
+        bit = self.bits[row][col]
+        old = self.grid[row][col]
+        if old is not None:
+            self.masks[old] &= ~bit
+        if color is not None:
+            self.masks[color] |= bit
+        self.grid[row][col] = color
+        self.dirty_rows |= 1 << row
+        self.dirty_cols |= 1 << col
+
+    def swap(self, row1, col1, row2, col2):
+        grid = self.grid
+        color1 = grid[row1][col1]
+        color2 = grid[row2][col2]
+        if color1 != color2:
+            self.set_cell(row1, col1, color2)
+            self.set_cell(row2, col2, color1)
+        self.on_swap(row1, col1, row2, col2)
+
+    def find_matches(self):
+        # Mark every gem in a horizontal or vertical run of three or more
+        rows = self.dirty_rows
+        columns = self.dirty_cols
+        if not (rows or columns):
+            return self.match_mask != 0
+        if self.grid_size < INCREMENTAL_MIN_SIZE:
+            self.dirty_rows = self.dirty_cols = 0
+            self.match_mask = engine_match3.match_mask(self.masks, self.stride)
+        else:
+            row_region = engine_match3.rows_region(rows, self.stride, self.full_mask)
+            column_region = engine_match3.columns_region(columns, self.column_masks[0])
+            horizontal = self.horizontal_matches & ~row_region
+            vertical = self.vertical_matches & ~column_region
+            stride = self.stride
+            for mask in self.masks:
+                if mask & row_region:
+                    horizontal |= engine_match3.horizontal_runs(mask & row_region)
+                if mask & column_region:
+                    vertical |= engine_match3.vertical_runs(mask & column_region, stride)
+            self.horizontal_matches = horizontal
+            self.vertical_matches = vertical
+            self.dirty_rows = self.dirty_cols = 0
+            self.match_mask = horizontal | vertical
+        return self.match_mask != 0
+
+    def remove_matches(self, step=None):
+        # Clear the cells marked by find_matches; returns the number cleared.
+        # Removing gems cannot start a run, so nothing becomes dirty. With a
+        # CascadeStep the cleared cells are recorded instead of calling hooks.
+        matched = self.match_mask
+        self.match_mask = self.horizontal_matches = self.vertical_matches = 0
+        if not matched:
+            return 0
+        grid = self.grid
+        cleared = ~matched
+        self.masks = [mask & cleared for mask in self.masks]
+        for row, col in engine_match3.iter_cells(matched, self.stride):
+            grid[row][col] = None
+            if step is None:
+                self.on_remove(row, col)
+            else:
+                step.cleared.append((row, col))
+
+        match_count = engine_match3.count_cells(matched)
+        self.score += match_count * MATCH_POINTS
+        return match_count
+
+    def drop_gems(self, step=None):
+        # Let gems fall into the cleared cells and refill each column from the
+        # top; with a CascadeStep the moves are recorded instead of calling hooks
+        grid = self.grid
+        masks = self.masks
+        bits = self.bits
+        # Only columns with a hole change, and only down to their lowest hole
+        holes = self.full_mask
+        for mask in masks:
+            holes &= ~mask
+        columns = engine_match3.occupied_columns(holes, self.grid_size)
+        if not columns:
+            return
+        self.dirty_cols |= columns
+        self.dirty_rows |= (2 << ((holes.bit_length() - 1) // self.stride)) - 1
+        while columns:
+            low = columns & -columns
+            columns ^= low
+            col = low.bit_length() - 1
+            lowest = ((holes & self.column_masks[col]).bit_length() - 1) // self.stride
+            empty_count = 0
+            for row in range(lowest, -1, -1):
+                color = grid[row][col]
+                if color is None:
+                    empty_count += 1
+                elif empty_count > 0:
+                    grid[row + empty_count][col] = color
+                    grid[row][col] = None
+                    masks[color] ^= bits[row][col] | bits[row + empty_count][col]
+                    if step is None:
+                        self.on_fall(row, row + empty_count, col)
+                    else:
+                        step.falls.append((row, row + empty_count, col))
+
+            for row in range(empty_count):
+                color = self.random_color()
+                grid[row][col] = color
+                masks[color] |= bits[row][col]
+                if step is None:
+                    self.on_spawn(row, col)
+                else:
+                    step.spawns.append((row, col, color))
+
+    def forms_line(self, row, col):
+        # True when the gem at (row, col) is part of a run of three or more
+        grid = self.grid
+        last = self.grid_size - 1
+        color = grid[row][col]
+        line = grid[row]
+        left = right = col
+        while left > 0 and line[left - 1] == color:
+            left -= 1
+        while right < last and line[right + 1] == color:
+            right += 1
+        if right - left >= 2:
+            return True
+        top = bottom = row
+        while top > 0 and grid[top - 1][col] == color:
+            top -= 1
+        while bottom < last and grid[bottom + 1][col] == color:
+            bottom += 1
+        return bottom - top >= 2
+
+    def swap_makes_match(self, row1, col1, row2, col2):
+        # Would swapping these two gems match? Only the lines through the two
+        # cells can change, so only those are checked; nothing is animated
+        grid = self.grid
+        color1 = grid[row1][col1]
+        color2 = grid[row2][col2]
+        if color1 == color2 or color1 is None or color2 is None:
+            return False
+        grid[row1][col1], grid[row2][col2] = color2, color1
+        found = self.forms_line(row1, col1) or self.forms_line(row2, col2)
+        grid[row1][col1], grid[row2][col2] = color1, color2
+        return found
+
+    def valid_swaps(self):
+        # Every adjacent swap that makes a match, as (row1, col1, row2, col2)
+        size = self.grid_size
+        for row in range(size):
+            for col in range(size):
+                if col + 1 < size and self.swap_makes_match(row, col, row, col + 1):
+                    yield row, col, row, col + 1
+                if row + 1 < size and self.swap_makes_match(row, col, row + 1, col):
+                    yield row, col, row + 1, col
+
+    def find_hint(self):
+        # The first valid swap in reading order, or None on a deadlocked board
+        return next(self.valid_swaps(), None)
+
+    def has_valid_move(self):
+        return self.find_hint() is not None
+
+    def count_valid_swaps(self, limit=None):
+        # Number of valid swaps, counting no further than limit
+        return sum(1 for _ in islice(self.valid_swaps(), limit))
+
+    def reshuffle(self, attempts=100):
+        # Rearrange the gems of a deadlocked board, keeping how many there are
+        # of each colour, into a position without matches that has a valid
+        # move. A fresh random board is used if no shuffle works.
+        size = self.grid_size
+        colors = [color for line in self.grid for color in line]
+        for _ in range(attempts):
+            self.rng.shuffle(colors)
+            self.set_grid([colors[row * size:(row + 1) * size] for row in range(size)])
+            if not self.find_matches() and self.has_valid_move():
+                break
+        else:
+            Match3State.initialize_grid(self)
+        self.on_reshuffle()
+
+    def ensure_playable(self):
+        # Reshuffle a board with no valid move left; True if it was reshuffled
+        if self.has_valid_move():
+            return False
+        self.reshuffle()
+        return True
+
+    def resolve(self):
+        # Clear, drop and refill until the board is stable; returns points scored
+        start = self.score
+        while self.find_matches():
+            self.remove_matches()
+            self.drop_gems()
+        return self.score - start
+
+    def resolve_timeline(self):
+        # Like resolve(), but the whole chain is worked out at once and
+        # returned as a list of CascadeSteps for a view to play back; the
+        # hooks are not called
+        timeline = []
+        while self.find_matches():
+            step = CascadeStep(len(timeline) + 1)
+            start = self.score
+            self.remove_matches(step)
+            self.drop_gems(step)
+            step.points = self.score - start
+            step.score = self.score
+            timeline.append(step)
+        return timeline
+
+    def try_swap(self, row1, col1, row2, col2):
+        # One complete turn for headless play. An adjacent swap that makes a
+        # match is resolved and its points returned, and a board left without
+        # moves is reshuffled; any other swap is rejected with None.
+        if abs(row1 - row2) + abs(col1 - col2) != 1:
+            return None
+        if not self.swap_makes_match(row1, col1, row2, col2):
+            return None
+        self.swap(row1, col1, row2, col2)
+        points = self.resolve()
+        self.ensure_playable()
+        return points
+
+    # View hooks, called after the grid has changed
+
+    def on_swap(self, row1, col1, row2, col2):
+        pass
+
+    def on_remove(self, row, col):
+        pass
+
+    def on_fall(self, from_row, to_row, col):
+        pass
+
+    def on_spawn(self, row, col):
+        pass
+
+    def on_reshuffle(self):
+        pass
@@ -1,19 +1,30 @@
 import pygame
-import random
 import sys
 import time
 
-# Initialize pygame
-pygame.init()
+import ai_match3
+from animation import Animator, FixedTimestep, ease_in_out_quad, ease_in_quad
+from dirty_rects import DirtyRectRenderer
+from frame_profiler import FrameProfiler
+from idle_mode import IdleMode
+from match3_core import GRID_SIZE, Match3State
+from render_cache import RenderCache
 
 # Constants
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
-GRID_SIZE = 7  # Reduced from 8 to 7
 CELL_SIZE = 70
 GRID_OFFSET_X = (SCREEN_WIDTH - GRID_SIZE * CELL_SIZE) // 2
 GRID_OFFSET_Y = (SCREEN_HEIGHT - GRID_SIZE * CELL_SIZE) // 2 + 30  # Added extra offset to move grid down
 FPS = 60
+SWAP_DURATION = 0.15  # seconds for two gems to trade places
+HINT_DELAY = 5000  # ms without input before a valid swap is highlighted
+HINT_EVENT = pygame.USEREVENT + 1  # timer event that shows the hint
+GRAVITY = 14000  # px/s^2, falling gems accelerate like real objects
+
+# Screen areas tracked by the dirty-rectangle renderer
+SCORE_AREA = (0, GRID_OFFSET_Y - 40, SCREEN_WIDTH, 30)
+TOAST_AREA = ((SCREEN_WIDTH - 300) // 2, SCREEN_HEIGHT - 80, 300, 40)
 
 # Colors
 WHITE = (255, 255, 255)
@@ -21,6 +32,9 @@ BLACK = (0, 0, 0)
 BACKGROUND_COLOR = (240, 240, 240)
 GRID_COLOR = (200, 200, 200)
 SELECTION_COLOR = (255, 140, 0)  # Bright orange for better visibility
+HINT_COLOR = (255, 255, 255)
+SPRITE_KEY_COLOR = (255, 0, 255)  # transparent in gem sprites, used by no gem
+OUTLINE_COLORS = (None, HINT_COLOR, SELECTION_COLOR)  # plain, hinted, selected
 
 # Gem colors - darker
 GEM_COLORS = [
@@ -32,6 +46,42 @@ GEM_COLORS = [
     (60, 180, 180),   # Darker Cyan
 ]
 
+def build_background():
+    # Background colour and the 1px outline of every cell, baked once.
+    # Outlined rects are not used because pygame draws a clipped outline along
+    # the clip edge, which breaks dirty-rectangle redraws.
+    background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    background.fill(BACKGROUND_COLOR)
+    grid_right = GRID_OFFSET_X + GRID_SIZE * CELL_SIZE - 1
+    grid_bottom = GRID_OFFSET_Y + GRID_SIZE * CELL_SIZE - 1
+    for i in range(GRID_SIZE):
+        for offset in (i * CELL_SIZE, i * CELL_SIZE + CELL_SIZE - 1):
+            x = GRID_OFFSET_X + offset
+            y = GRID_OFFSET_Y + offset
+            pygame.draw.line(background, GRID_COLOR, (x, GRID_OFFSET_Y), (x, grid_bottom))
+            pygame.draw.line(background, GRID_COLOR, (GRID_OFFSET_X, y), (grid_right, y))
+    return background
+
+def build_gem_surface(color_idx, outline_color):
+    # One cell-sized sprite: the rounded block plus an optional outline.
+    # Gem edges are not antialiased, so a run-length encoded colour key shows
+    # the same pixels as per-pixel alpha and blits several times faster.
+    surface = pygame.Surface((CELL_SIZE, CELL_SIZE))
+    surface.fill(SPRITE_KEY_COLOR)
+    surface.set_colorkey(SPRITE_KEY_COLOR, pygame.RLEACCEL)
+    pygame.draw.rect(surface, GEM_COLORS[color_idx], (5, 5, CELL_SIZE - 10, CELL_SIZE - 10), border_radius=10)
+    if outline_color is not None:
+        pygame.draw.rect(surface, outline_color, (2, 2, CELL_SIZE - 4, CELL_SIZE - 4), 3, border_radius=10)
+    return surface
+
+def build_gem_sprites(cache):
+    # sprites[color_idx][outline]: every gem sprite, built once per view so
+    # drawing a gem is two list lookups and a blit
+    return [[cache.surface(("gem", color_idx, outline_color),
+                           lambda: build_gem_surface(color_idx, outline_color))
+             for outline_color in OUTLINE_COLORS]
+            for color_idx in range(len(GEM_COLORS))]
+
 class Gem:
     def __init__(self, row, col, color_idx):
         self.row = row
@@ -41,130 +91,101 @@ class Gem:
         self.x = GRID_OFFSET_X + col * CELL_SIZE
         self.y = GRID_OFFSET_Y + row * CELL_SIZE
         self.selected = False
-        self.matched = False
+        self.hinted = False
         self.falling = False
         self.target_y = self.y
         self.target_x = self.x
         self.swapping = False
-        self.swap_speed = 8
-        
-    def draw(self, screen):
-        # Draw gem as a simple block with rounded corners
-        pygame.draw.rect(screen, self.color, 
-                        (self.x + 5, self.y + 5, CELL_SIZE - 10, CELL_SIZE - 10), 
-                        border_radius=10)
         
-        # Draw highlight for selected gem
-        if self.selected:
-            pygame.draw.rect(screen, SELECTION_COLOR, 
-                            (self.x + 2, self.y + 2, CELL_SIZE - 4, CELL_SIZE - 4), 
-                            3, border_radius=10)
+    def draw(self, screen, sprites):
+        # Blit the pre-rendered sprite for this colour and highlight
+        outline = 2 if self.selected else 1 if self.hinted else 0
+        screen.blit(sprites[self.color_idx][outline], (self.x, self.y))
     
-    def update(self):
-        moving = False
-        
-        # Handle falling animation
-        if self.falling:
-            # Move towards target position
-            move_speed = 15
-            if self.y < self.target_y:
-                self.y += move_speed
-                if self.y >= self.target_y:
-                    self.y = self.target_y
-                    self.falling = False
-                moving = True
-            elif self.y > self.target_y:
-                self.y -= move_speed
-                if self.y <= self.target_y:
-                    self.y = self.target_y
-                    self.falling = False
-                moving = True
-        
-        # Handle swapping animation
-        if self.swapping:
-            # Move towards target position
-            if abs(self.x - self.target_x) > self.swap_speed:
-                self.x += self.swap_speed if self.x < self.target_x else -self.swap_speed
-                moving = True
-            elif abs(self.x - self.target_x) > 0:
-                self.x = self.target_x
-                moving = True
-                
-            if abs(self.y - self.target_y) > self.swap_speed:
-                self.y += self.swap_speed if self.y < self.target_y else -self.swap_speed
-                moving = True
-            elif abs(self.y - self.target_y) > 0:
-                self.y = self.target_y
-                moving = True
-                
-            if self.x == self.target_x and self.y == self.target_y:
-                self.swapping = False
-                
-        return moving
+    def stop(self):
+        self.falling = False
+        self.swapping = False
 
-class Match3Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Match-3 Puzzle Game")
+class Match3Game(Match3State):
+    # pygame view and input on top of the headless game state
+    def __init__(self, dirty_rects=True, idle_mode=True, seed=None, screen=None, profile=False):
+        # pygame is only initialised once a view is created, never at import
+        pygame.init()
+        if screen is None:
+            screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Match-3 Puzzle Game")
+        self.screen = screen
         self.clock = pygame.time.Clock()
-        self.grid = [[None for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+        # Gem sprites mirror the colour grid of Match3State cell for cell
+        self.gems = [[None for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
         self.selected_gem = None
-        self.score = 0
-        self.font = pygame.font.SysFont(None, 36)
-        self.small_font = pygame.font.SysFont(None, 24)
+        # Fonts are loaded on first use; gem sprites are baked up front
+        self.cache = RenderCache()
+        self.gem_sprites = build_gem_sprites(self.cache)
         self.toast_message = ""
         self.toast_timer = 0
         self.toast_duration = 1.5  # seconds
-        self.initialize_grid()
+        self.game_state = "idle"  # States: idle, selecting, swapping, matching, dropping
+        self.hint_gems = ()  # gems outlined as a suggested swap
+        self.solver = None  # created on first hint/autoplay request
+        self.autoplay = False
+        # A turn is resolved as soon as the swap lands; the view then plays
+        # back its cascade steps and only shows their points as they land
+        self.timeline = []
+        self.shown_score = 0
+        # Gem movement runs on wall-clock tweens; logic advances in fixed steps
+        self.animator = Animator()
+        self.timestep = FixedTimestep()
+        # Redraw and present only the regions that changed (None = full flips)
+        self.renderer = DirtyRectRenderer(self.screen, self.draw_frame) if dirty_rects else None
+        # Sleep in pygame.event.wait() while nothing is animating
+        self.idle = IdleMode(FPS, enabled=idle_mode)
+        # Per-phase frame timings; F3 shows the overlay, F4 saves a trace
+        self.profiler = FrameProfiler(enabled=profile)
+        
+        # Fills the grid, which creates the gem sprites through initialize_grid
+        Match3State.__init__(self, seed)
+        self.schedule_hint()
         
     def initialize_grid(self):
-        # Create initial grid with random gems
+        Match3State.initialize_grid(self)
         for row in range(GRID_SIZE):
             for col in range(GRID_SIZE):
-                color_idx = random.randint(0, len(GEM_COLORS) - 1)
-                self.grid[row][col] = Gem(row, col, color_idx)
-        
-        # Check for initial matches and replace them
-        while self.find_matches():
-            for row in range(GRID_SIZE):
-                for col in range(GRID_SIZE):
-                    if self.grid[row][col].matched:
-                        color_idx = random.randint(0, len(GEM_COLORS) - 1)
-                        self.grid[row][col] = Gem(row, col, color_idx)
+                self.gems[row][col] = Gem(row, col, self.grid[row][col])
     
     def draw_grid(self):
-        # Draw grid background
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                pygame.draw.rect(self.screen, GRID_COLOR, 
-                                (GRID_OFFSET_X + col * CELL_SIZE, 
-                                 GRID_OFFSET_Y + row * CELL_SIZE, 
-                                 CELL_SIZE, CELL_SIZE), 1)
+        # The baked background covers the whole screen, grid lines included,
+        # so a frame starts with this one blit
+        self.screen.blit(self.cache.surface("background", build_background), (0, 0))
         
         # Draw gems
         for row in range(GRID_SIZE):
             for col in range(GRID_SIZE):
-                if self.grid[row][col]:
-                    self.grid[row][col].draw(self.screen)
+                if self.gems[row][col]:
+                    self.gems[row][col].draw(self.screen, self.gem_sprites)
     
     def draw_score(self):
-        score_text = self.font.render(f"Score: {self.score}", True, BLACK)
+        score_text = self.cache.font(36).render(f"Score: {self.shown_score}", True, BLACK)
         # Position the score at the top center of the screen, above the grid
         text_width = score_text.get_width()
         self.screen.blit(score_text, ((SCREEN_WIDTH - text_width) // 2, GRID_OFFSET_Y - 40))
     
+    def toast_alpha(self):
+        # Calculate alpha based on remaining time (fade out effect), 0 when hidden
+        remaining = (self.toast_timer + self.toast_duration) - time.time()
+        if not self.toast_message or remaining <= 0:
+            return 0
+        return min(255, int(255 * remaining / (self.toast_duration / 2)))
+    
     def draw_toast(self):
-        if self.toast_message and time.time() < self.toast_timer + self.toast_duration:
-            # Calculate alpha based on remaining time (fade out effect)
-            remaining = (self.toast_timer + self.toast_duration) - time.time()
-            alpha = min(255, int(255 * remaining / (self.toast_duration / 2)))
-            
+        alpha = self.toast_alpha()
+        if alpha > 0:
             # Create toast background
             toast_surface = pygame.Surface((300, 40), pygame.SRCALPHA)
             pygame.draw.rect(toast_surface, (0, 0, 0, min(180, alpha)), (0, 0, 300, 40), border_radius=10)
             
             # Create toast text
-            toast_text = self.small_font.render(self.toast_message, True, (255, 255, 255, alpha))
+            toast_text = self.cache.font(24).render(self.toast_message, True, (255, 255, 255, alpha))
             text_width = toast_text.get_width()
             
             # Position toast in center bottom of screen
@@ -177,6 +198,41 @@ class Match3Game:
         self.toast_message = message
         self.toast_timer = time.time()
     
+    def draw_frame(self):
+        self.draw_grid()
+        self.draw_score()
+        self.draw_toast()
+        self.profiler.draw(self.screen)
+    
+    def track_dirty_regions(self):
+        renderer = self.renderer
+        for row in range(GRID_SIZE):
+            for col in range(GRID_SIZE):
+                gem = self.gems[row][col]
+                if gem:
+                    renderer.track(("cell", row, col), (gem.x, gem.y, CELL_SIZE, CELL_SIZE),
+                                   (gem.color_idx, gem.x, gem.y, gem.selected, gem.hinted))
+                else:
+                    renderer.track(("cell", row, col),
+                                   (GRID_OFFSET_X + col * CELL_SIZE, GRID_OFFSET_Y + row * CELL_SIZE,
+                                    CELL_SIZE, CELL_SIZE), None)
+        
+        renderer.track("score", SCORE_AREA, self.shown_score)
+        renderer.track("toast", TOAST_AREA, (self.toast_message, self.toast_alpha()))
+        renderer.track("profiler", self.profiler.overlay_rect(), self.profiler.overlay_signature())
+    
+    def is_busy(self):
+        # Anything that needs frames even without input
+        return self.animator.busy or self.game_state not in ("idle", "selecting") or self.autoplay
+    
+    def present(self):
+        if self.renderer is None:
+            self.draw_frame()
+            pygame.display.flip()
+        else:
+            self.track_dirty_regions()
+            self.renderer.render()
+    
     def get_gem_at_pos(self, pos):
         x, y = pos
         if (x < GRID_OFFSET_X or x >= GRID_OFFSET_X + GRID_SIZE * CELL_SIZE or
@@ -186,19 +242,57 @@ class Match3Game:
         col = (x - GRID_OFFSET_X) // CELL_SIZE
         row = (y - GRID_OFFSET_Y) // CELL_SIZE
         
-        return self.grid[row][col] if 0 <= row < GRID_SIZE and 0 <= col < GRID_SIZE else None
+        return self.gems[row][col] if 0 <= row < GRID_SIZE and 0 <= col < GRID_SIZE else None
     
     def are_adjacent(self, gem1, gem2):
         return ((abs(gem1.row - gem2.row) == 1 and gem1.col == gem2.col) or
                 (abs(gem1.col - gem2.col) == 1 and gem1.row == gem2.row))
     
+    def schedule_hint(self):
+        # (Re)start the countdown to the hint; the timer event also wakes idle mode
+        pygame.time.set_timer(HINT_EVENT, HINT_DELAY, 1)
+    
+    def get_solver(self):
+        # Searched in-process: one decision fits the 50 ms budget on a single core
+        if self.solver is None:
+            self.solver = ai_match3.MonteCarloSolver()
+        return self.solver
+    
+    def show_hint(self):
+        self.clear_hint()
+        hint = self.get_solver().best_swap(self)
+        if hint is not None:
+            row1, col1, row2, col2 = hint
+            self.hint_gems = (self.gems[row1][col1], self.gems[row2][col2])
+            for gem in self.hint_gems:
+                gem.hinted = True
+    
+    def clear_hint(self):
+        for gem in self.hint_gems:
+            gem.hinted = False
+        self.hint_gems = ()
+    
+    def toggle_autoplay(self):
+        self.autoplay = not self.autoplay
+        if self.autoplay:
+            self.show_toast("Autoplay on")
+        else:
+            rollouts_per_second = self.get_solver().rollouts_per_second
+            self.show_toast(f"Autoplay off ({rollouts_per_second / 1000:.1f}k rollouts/s)")
+    
     def swap_gems(self, gem1, gem2):
         # Safety check to prevent crashes
         if not gem1 or not gem2:
             return
-            
+        
+        self.swap(gem1.row, gem1.col, gem2.row, gem2.col)
+    
+    def on_swap(self, row1, col1, row2, col2):
+        gem1 = self.gems[row1][col1]
+        gem2 = self.gems[row2][col2]
+        
         # Update grid positions
-        self.grid[gem1.row][gem1.col], self.grid[gem2.row][gem2.col] = self.grid[gem2.row][gem2.col], self.grid[gem1.row][gem1.col]
+        self.gems[row1][col1], self.gems[row2][col2] = gem2, gem1
         
         # Update gem positions
         gem1.row, gem2.row = gem2.row, gem1.row
@@ -213,127 +307,134 @@ class Match3Game:
         # Enable swapping animation
         gem1.swapping = True
         gem2.swapping = True
+        self.animator.move(gem1, gem1.target_x, gem1.target_y, SWAP_DURATION,
+                           ease_in_out_quad, on_complete=gem1.stop)
+        self.animator.move(gem2, gem2.target_x, gem2.target_y, SWAP_DURATION,
+                           ease_in_out_quad, on_complete=gem2.stop)
+    
+    def on_remove(self, row, col):
+        self.gems[row][col] = None
     
-    def find_matches(self):
-        found_matches = False
+    def on_fall(self, from_row, to_row, col):
+        # Move this gem down into the cleared cell
+        gem = self.gems[from_row][col]
+        self.gems[to_row][col] = gem
+        self.gems[from_row][col] = None
         
-        # Reset matched status
+        gem.row = to_row
+        gem.target_y = GRID_OFFSET_Y + to_row * CELL_SIZE
+        self.start_fall(gem)
+    
+    def on_reshuffle(self):
+        # The whole board is replaced; drop every gem in again from above
+        self.clear_hint()
+        self.animator.clear()
         for row in range(GRID_SIZE):
             for col in range(GRID_SIZE):
-                if self.grid[row][col]:
-                    self.grid[row][col].matched = False
-        
-        # Check horizontal matches
-        for row in range(GRID_SIZE):
-            col = 0
-            while col < GRID_SIZE - 2:
-                if (self.grid[row][col] and self.grid[row][col+1] and self.grid[row][col+2] and
-                    self.grid[row][col].color_idx == self.grid[row][col+1].color_idx == self.grid[row][col+2].color_idx):
-                    
-                    # Mark gems as matched
-                    match_length = 3
-                    while col + match_length < GRID_SIZE and self.grid[row][col+match_length] and self.grid[row][col].color_idx == self.grid[row][col+match_length].color_idx:
-                        match_length += 1
-                    
-                    for i in range(match_length):
-                        self.grid[row][col+i].matched = True
-                    
-                    found_matches = True
-                    col += match_length
-                else:
-                    col += 1
-        
-        # Check vertical matches
-        for col in range(GRID_SIZE):
-            row = 0
-            while row < GRID_SIZE - 2:
-                if (self.grid[row][col] and self.grid[row+1][col] and self.grid[row+2][col] and
-                    self.grid[row][col].color_idx == self.grid[row+1][col].color_idx == self.grid[row+2][col].color_idx):
-                    
-                    # Mark gems as matched
-                    match_length = 3
-                    while row + match_length < GRID_SIZE and self.grid[row+match_length][col] and self.grid[row][col].color_idx == self.grid[row+match_length][col].color_idx:
-                        match_length += 1
-                    
-                    for i in range(match_length):
-                        self.grid[row+i][col].matched = True
-                    
-                    found_matches = True
-                    row += match_length
-                else:
-                    row += 1
-        
-        return found_matches
+                self.on_spawn(row, col)
+    
+    def on_spawn(self, row, col):
+        self.spawn_gem(row, col, self.grid[row][col])
+    
+    def spawn_gem(self, row, col, color_idx):
+        gem = Gem(row, col, color_idx)
+        self.gems[row][col] = gem
+        # Start above the grid and fall into place
+        gem.y = GRID_OFFSET_Y - CELL_SIZE
+        gem.target_y = GRID_OFFSET_Y + row * CELL_SIZE
+        self.start_fall(gem)
+    
+    def start_fall(self, gem):
+        # Constant acceleration from rest: distance = GRAVITY * t^2 / 2
+        gem.falling = True
+        duration = (2 * abs(gem.target_y - gem.y) / GRAVITY) ** 0.5
+        self.animator.move(gem, gem.x, gem.target_y, duration, ease_in_quad, on_complete=gem.stop)
+    
+    def play_step(self, step):
+        # Show one recorded cascade step: clear, then fall and refill
+        for row, col in step.cleared:
+            self.on_remove(row, col)
+        for from_row, to_row, col in step.falls:
+            self.on_fall(from_row, to_row, col)
+        for row, col, color_idx in step.spawns:
+            self.spawn_gem(row, col, color_idx)
+        self.shown_score = step.score
+    
+    def update_gems(self, dt):
+        # Advance gem animations by dt seconds; True while any gem is moving
+        return self.animator.update(dt)
     
-    def remove_matches(self):
-        match_count = 0
+    def update(self, dt):
+        # One fixed logic step
+        moving = self.update_gems(dt)
+        self.profiler.mark("animation")
         
-        # Count matches and update score
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                if self.grid[row][col] and self.grid[row][col].matched:
-                    match_count += 1
+        # Let the solver pick the next swap while autoplay is on
+        if self.game_state in ("idle", "selecting") and self.autoplay and not moving:
+            swap = self.get_solver().best_swap(self)
+            if swap is not None:
+                if self.selected_gem:
+                    self.selected_gem.selected = False
+                    self.selected_gem = None
+                self.clear_hint()
+                row1, col1, row2, col2 = swap
+                self.swap_gems(self.gems[row1][col1], self.gems[row2][col2])
+                self.game_state = "swapping"
         
-        # Add score based on matches (more matches = exponentially more points)
-        if match_count > 0:
-            self.score += match_count * 10
+        if self.game_state == "swapping":
+            # Wait for swap animation to complete; only matching swaps get here.
+            # An autoplay swap may have started its tween in this very step.
+            if not self.animator.busy:
+                # The rules run once here; later states only replay the steps
+                self.timeline = self.resolve_timeline()
+                self.game_state = "matching"
         
-        # Remove matched gems
-        for col in range(GRID_SIZE):
-            # Move from bottom to top
-            for row in range(GRID_SIZE - 1, -1, -1):
-                if self.grid[row][col] and self.grid[row][col].matched:
-                    self.grid[row][col] = None
-    
-    def drop_gems(self):
-        # For each column
-        for col in range(GRID_SIZE):
-            # Count empty spaces and move gems down
-            empty_count = 0
-            for row in range(GRID_SIZE - 1, -1, -1):
-                if self.grid[row][col] is None:
-                    empty_count += 1
-                elif empty_count > 0:
-                    # Move this gem down by empty_count
-                    self.grid[row + empty_count][col] = self.grid[row][col]
-                    self.grid[row][col] = None
-                    
-                    # Update gem position
-                    self.grid[row + empty_count][col].row = row + empty_count
-                    self.grid[row + empty_count][col].falling = True
-                    self.grid[row + empty_count][col].target_y = GRID_OFFSET_Y + (row + empty_count) * CELL_SIZE
-            
-            # Fill top with new gems
-            for row in range(empty_count):
-                color_idx = random.randint(0, len(GEM_COLORS) - 1)
-                self.grid[row][col] = Gem(row, col, color_idx)
-                # Start above the grid and fall into place
-                self.grid[row][col].y = GRID_OFFSET_Y - CELL_SIZE
-                self.grid[row][col].falling = True
-                self.grid[row][col].target_y = GRID_OFFSET_Y + row * CELL_SIZE
-    
-    def update_gems(self):
-        still_moving = False
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                if self.grid[row][col]:
-                    if self.grid[row][col].update():
-                        still_moving = True
-        return still_moving
+        elif self.game_state == "matching":
+            if self.timeline:
+                self.play_step(self.timeline.pop(0))
+                self.game_state = "dropping"
+            else:
+                self.game_state = "idle"
+                if self.ensure_playable():
+                    self.show_toast("No moves left, reshuffled")
+                self.schedule_hint()
+        
+        elif self.game_state == "dropping":
+            # Wait for all gems to finish falling before the next step
+            if not moving:
+                self.game_state = "matching"
+        self.profiler.mark("logic")
     
-    def run(self):
+    def run(self, fps=FPS):
         running = True
-        game_state = "idle"  # States: idle, selecting, swapping, matching, dropping
-        swap_timer = 0
-        last_swapped_gems = (None, None)  # Keep track of the last two gems that were swapped
+        dt = 0.0  # seconds since the previous frame, from clock.tick()
+        self.idle.fps = fps
         
         while running:
-            # Handle events
-            for event in pygame.event.get():
+            profiler = self.profiler
+            profiler.begin_frame()
+            
+            # Handle events, blocking until the next one while idle
+            events = self.idle.events(self.clock, self.is_busy(), self.toast_alpha() > 0)
+            profiler.mark("wait")
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
                 
-                if game_state == "idle" or game_state == "selecting":
+                if self.renderer is not None:
+                    self.renderer.handle_event(event)
+                
+                message = profiler.handle_event(event)
+                if message:
+                    self.show_toast(message)
+                
+                if event.type == HINT_EVENT and self.game_state in ("idle", "selecting"):
+                    self.show_hint()
+                elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN):
+                    self.clear_hint()
+                    self.schedule_hint()
+                
+                if self.game_state == "idle" or self.game_state == "selecting":
                     if event.type == pygame.MOUSEBUTTONDOWN:
                         gem = self.get_gem_at_pos(event.pos)
                         if gem:
@@ -341,18 +442,20 @@ class Match3Game:
                                 # First selection
                                 self.selected_gem = gem
                                 gem.selected = True
-                                game_state = "selecting"
+                                self.game_state = "selecting"
                             else:
                                 # Second selection - check if adjacent
                                 if self.are_adjacent(self.selected_gem, gem):
-                                    # Try the swap
-                                    self.swap_gems(self.selected_gem, gem)
-                                    # Store the gems that were swapped
-                                    last_swapped_gems = (self.selected_gem, gem)
+                                    first = self.selected_gem
                                     self.selected_gem.selected = False
                                     self.selected_gem = None
-                                    game_state = "swapping"
-                                    swap_timer = time.time()
+                                    # Swaps that would not match are refused before animating
+                                    if self.swap_makes_match(first.row, first.col, gem.row, gem.col):
+                                        self.swap_gems(first, gem)
+                                        self.game_state = "swapping"
+                                    else:
+                                        self.show_toast("Not a valid match!")
+                                        self.game_state = "idle"
                                 else:
                                     # Not adjacent, make this the new selection
                                     self.selected_gem.selected = False
@@ -365,59 +468,32 @@ class Match3Game:
                         if self.selected_gem:
                             self.selected_gem.selected = False
                             self.selected_gem = None
-                            game_state = "idle"
+                            self.game_state = "idle"
+                    elif event.key == pygame.K_h and self.game_state in ("idle", "selecting"):
+                        self.show_hint()
+                    elif event.key == pygame.K_a:
+                        self.toggle_autoplay()
             
-            # Game logic based on state
-            if game_state == "swapping":
-                # Wait for swap animation to complete
-                if not self.update_gems():
-                    # Check if swap created matches
-                    if self.find_matches():
-                        game_state = "matching"
-                    elif time.time() - swap_timer > 0.3:
-                        try:
-                            # Get the two gems that were last swapped
-                            gem1, gem2 = last_swapped_gems
-                            
-                            # Swap them back if they're valid
-                            if gem1 and gem2:
-                                self.swap_gems(gem1, gem2)
-                                self.show_toast("Not a valid match!")
-                            
-                            game_state = "swapping_back"
-                        except Exception as e:
-                            print(f"Error during swap back: {e}")
-                            # Recover gracefully
-                            game_state = "idle"
+            profiler.mark("events")
             
-            elif game_state == "swapping_back":
-                # Wait for swap-back animation to complete
-                if not self.update_gems():
-                    game_state = "idle"
-            
-            elif game_state == "matching":
-                self.remove_matches()
-                self.drop_gems()
-                game_state = "dropping"
-            
-            elif game_state == "dropping":
-                # Wait for all gems to finish falling
-                if not self.update_gems():
-                    # Check for new matches after dropping
-                    if self.find_matches():
-                        game_state = "matching"
-                    else:
-                        game_state = "idle"
+            # Game logic at a fixed timestep, independent of the frame rate
+            for _ in range(self.timestep.advance(dt)):
+                self.update(self.timestep.step)
             
             # Drawing
-            self.screen.fill(BACKGROUND_COLOR)
-            self.draw_grid()
-            self.draw_score()
-            self.draw_toast()
-            
-            pygame.display.flip()
-            self.clock.tick(FPS)
+            profiler.refresh_overlay()
+            self.present()
+            profiler.mark("draw")
+            dt = self.clock.tick(fps) / 1000
+            profiler.mark("sleep")
+            profiler.end_frame()
         
+        if self.idle.enabled:
+            print(f"Idle mode skipped {self.idle.frames_skipped} frames")
+        if self.profiler.frames:
+            frame = self.profiler.stats()["frame"]
+            print(f"Frame time p50 {frame['p50'] * 1000:.2f} ms, p99 {frame['p99'] * 1000:.2f} ms, "
+                  f"worst {frame['worst'] * 1000:.2f} ms")
         pygame.quit()
         sys.exit()
 
@@ -0,0 +1,85 @@
+# Caches for fonts and pre-rendered surfaces.
+#
+# Creating a SysFont or rasterising text every frame is expensive, so views
+# keep one RenderCache and ask it for fonts, text and any surface that can
+# be built once and blitted many times. Hit and miss counts are kept so the
+# cache's effectiveness can be checked at runtime.
+
+import pygame
+
+
+class RenderCache:
+    def __init__(self, max_text_entries=256):
+        self.fonts = {}
+        self.surfaces = {}
+        self.texts = {}
+        self.max_text_entries = max_text_entries
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size, bold=False):
+        key = (size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            self.misses += 1
+            font = self._load_font(size, bold)
+        else:
+            self.hits += 1
+        return font
+
+    def _load_font(self, size, bold):
+        font = self.fonts.get((size, bold))
+        if font is None:
+            font = pygame.font.SysFont(None, size, bold=bold)
+            self.fonts[(size, bold)] = font
+        return font
+
+    def surface(self, key, build):
+        # Return the surface stored under key, calling build() the first time
+        surface = self.surfaces.get(key)
+        if surface is None:
+            self.misses += 1
+            surface = self.prepare(build())
+            self.surfaces[key] = surface
+        else:
+            self.hits += 1
+        return surface
+
+    def prepare(self, surface):
+        # Match the display's pixel format once a window exists, for faster blits
+        if pygame.display.get_surface() is None:
+            return surface
+        if surface.get_flags() & pygame.SRCALPHA:
+            return surface.convert_alpha()
+        return surface.convert()
+
+    def text(self, text, size, color, bold=False):
+        # Rendered text changes often (scores), so this cache is bounded
+        key = (text, size, color, bold)
+        surface = self.texts.get(key)
+        if surface is None:
+            self.misses += 1
+            surface = self._load_font(size, bold).render(text, True, color)
+            if len(self.texts) >= self.max_text_entries:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self.texts[next(iter(self.texts))]
+            self.texts[key] = surface
+        else:
+            self.hits += 1
+        return surface
+
+    def clear(self):
+        self.fonts.clear()
+        self.surfaces.clear()
+        self.texts.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "fonts": len(self.fonts),
+            "surfaces": len(self.surfaces),
+            "texts": len(self.texts),
+        }
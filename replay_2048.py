@@ -0,0 +1,166 @@
+# Compact binary replays for 2048 and a headless verifier.
+#
+# A game is fully determined by its seed and its moves, because every tile
+# spawn comes from random.Random(seed) (see engine_2048.spawn_tile). A replay
+# stores a fixed header followed by the moves packed four per byte:
+#
+#   magic "R2048" | version u8 | seed u64 | moves u32 | score u32 | board crc32 u32
+#   move 0 in bits 0-1 of the first byte, move 1 in bits 2-3, ...
+#
+# The verifier re-simulates the moves, rejects any move that does not change
+# the board and checks the claimed score and the final board checksum.
+#
+# Usage: python replay_2048.py FILE [FILE ...] [--workers N]
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import engine_2048
+
+MAGIC = b"R2048"
+VERSION = 1
+HEADER = struct.Struct("<5sBQIII")
+
+Replay = namedtuple("Replay", ["seed", "moves", "score", "checksum"])
+VerifyResult = namedtuple("VerifyResult", ["valid", "reason", "score", "moves"])
+
+
+class ReplayError(Exception):
+    pass
+
+
+def board_checksum(board):
+    return zlib.crc32(board.to_bytes(8, "little"))
+
+
+def pack_moves(moves):
+    data = bytearray((len(moves) + 3) // 4)
+    for i, direction in enumerate(moves):
+        data[i >> 2] |= (direction & 3) << ((i & 3) * 2)
+    return bytes(data)
+
+
+def unpack_moves(data, count):
+    # Exactly the bytes pack_moves() writes, with the unused high bits of the
+    # last byte clear, so a replay has one encoding only
+    if len(data) < (count + 3) // 4:
+        raise ReplayError("truncated move data")
+    if len(data) > (count + 3) // 4:
+        raise ReplayError("trailing data after the moves")
+    if count & 3 and data[-1] >> ((count & 3) * 2):
+        raise ReplayError("padding bits set in the last move byte")
+    return [(data[i >> 2] >> ((i & 3) * 2)) & 3 for i in range(count)]
+
+
+def encode_replay(seed, moves, score, board):
+    if not isinstance(seed, int) or not 0 <= seed < 1 << 64:
+        raise ValueError(f"replay seeds are u64 integers, not {seed!r}")
+    header = HEADER.pack(MAGIC, VERSION, seed, len(moves), score, board_checksum(board))
+    return header + pack_moves(moves)
+
+
+def decode_replay(data):
+    if len(data) < HEADER.size:
+        raise ReplayError("truncated header")
+    magic, version, seed, count, score, checksum = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ReplayError("not a 2048 replay")
+    if version != VERSION:
+        raise ReplayError(f"unsupported replay version {version}")
+    return Replay(seed, unpack_moves(data[HEADER.size:], count), score, checksum)
+
+
+def new_game(seed):
+    # Initial position of Game2048 for a seed: two spawned tiles
+    rng = random.Random(seed)
+    board, _ = engine_2048.spawn_tile(0, rng)
+    board, _ = engine_2048.spawn_tile(board, rng)
+    return board, rng
+
+
+def simulate(seed, moves):
+    # Replay the moves; returns (board, score) or raises ReplayError
+    board, rng = new_game(seed)
+    score = 0
+    move_functions = engine_2048.MOVE_FUNCTIONS
+    spawn_tile = engine_2048.spawn_tile
+    for index, direction in enumerate(moves):
+        new_board, gained = move_functions[direction](board)
+        if new_board == board:
+            raise ReplayError(f"move {index} does not change the board")
+        board, _ = spawn_tile(new_board, rng)
+        score += gained
+    return board, score
+
+
+def verify_replay(data):
+    try:
+        replay = decode_replay(data)
+        board, score = simulate(replay.seed, replay.moves)
+    except ReplayError as e:
+        return VerifyResult(False, str(e), 0, 0)
+
+    if score != replay.score:
+        return VerifyResult(False, f"claimed score {replay.score}, replay scores {score}", score, len(replay.moves))
+    if board_checksum(board) != replay.checksum:
+        return VerifyResult(False, "final board checksum mismatch", score, len(replay.moves))
+    return VerifyResult(True, "", score, len(replay.moves))
+
+
+def _verify_chunk(blobs):
+    return [verify_replay(data) for data in blobs]
+
+
+def verify_replays(blobs, workers=None, chunk_size=64):
+    # Verify many replays, in parallel when workers > 1; results keep input order
+    blobs = list(blobs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(blobs) <= chunk_size:
+        return _verify_chunk(blobs)
+
+    chunks = [blobs[i:i + chunk_size] for i in range(0, len(blobs), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_results in executor.map(_verify_chunk, chunks):
+            results.extend(chunk_results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify 2048 replay files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    blobs = []
+    for path in args.files:
+        with open(path, "rb") as f:
+            blobs.append(f.read())
+
+    start = time.perf_counter()
+    results = verify_replays(blobs, args.workers)
+    elapsed = time.perf_counter() - start
+
+    failures = 0
+    for path, result in zip(args.files, results):
+        if result.valid:
+            print(f"OK    {path}: score {result.score} in {result.moves} moves")
+        else:
+            failures += 1
+            print(f"FAIL  {path}: {result.reason}")
+
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+    print(f"{len(results) - failures}/{len(results)} valid, {rate:.0f} replays/s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# Headless Monte-Carlo rollout farm for grading 2048 move policies.
+#
+# Every game gets its own seed drawn from a master seed, and games are handed
+# to a process pool in chunks. Results are folded into RolloutStats as chunks
+# come back; the aggregate only depends on the set of games, not on the order
+# they finish in, so the same master seed gives identical statistics for any
+# worker count.
+#
+# Usage: python rollout_2048.py --policy greedy --games 10000 --workers 8
+
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import engine_2048
+
+GameResult = namedtuple("GameResult", ["index", "seed", "score", "max_tile", "moves"])
+
+
+# Policies take (board, rng) and return a direction, or None to resign
+
+def random_policy(board, rng):
+    legal = [d for d in engine_2048.DIRECTIONS if engine_2048.move(board, d)[0] != board]
+    return rng.choice(legal) if legal else None
+
+
+def greedy_policy(board, rng):
+    # Highest immediate merge score, random tie-break
+    best_score = -1
+    best_moves = []
+    for direction in engine_2048.DIRECTIONS:
+        new_board, score = engine_2048.move(board, direction)
+        if new_board == board:
+            continue
+        if score > best_score:
+            best_score = score
+            best_moves = [direction]
+        elif score == best_score:
+            best_moves.append(direction)
+    return rng.choice(best_moves) if best_moves else None
+
+
+def corner_policy(board, rng):
+    # Classic "keep the big tile in a corner" priority order
+    for direction in (engine_2048.DOWN, engine_2048.LEFT, engine_2048.RIGHT, engine_2048.UP):
+        if engine_2048.move(board, direction)[0] != board:
+            return direction
+    return None
+
+
+_solver = None
+
+
+def expectimax_policy(board, rng):
+    # Fixed depth and no time budget, so results do not depend on machine speed
+    global _solver
+    if _solver is None:
+        import ai_2048
+        _solver = ai_2048.ExpectimaxSolver(time_budget=None, max_depth=2)
+    return _solver.best_move(board)
+
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+    "corner": corner_policy,
+    "expectimax": expectimax_policy,
+}
+
+
+def resolve_policy(policy):
+    # Policies travel to workers by name; module-level functions also pickle fine
+    if callable(policy):
+        return policy
+    return POLICIES[policy]
+
+
+def play_game(policy, seed, index=0, max_moves=None, on_move=None):
+    # on_move(board, direction, gained) sees every position before its move
+    policy = resolve_policy(policy)
+    rng = random.Random(seed)
+    board, _ = engine_2048.spawn_tile(0, rng)
+    board, _ = engine_2048.spawn_tile(board, rng)
+    score = 0
+    moves = 0
+
+    while max_moves is None or moves < max_moves:
+        direction = policy(board, rng)
+        if direction is None:
+            break
+        new_board, gained = engine_2048.move(board, direction)
+        if new_board == board:
+            break
+        if on_move is not None:
+            on_move(board, direction, gained)
+        board, _ = engine_2048.spawn_tile(new_board, rng)
+        score += gained
+        moves += 1
+
+    return GameResult(index, seed, score, 1 << engine_2048.max_exponent(board), moves)
+
+
+def _play_chunk(policy, jobs, max_moves):
+    return [play_game(policy, seed, index, max_moves) for index, seed in jobs]
+
+
+def game_seeds(master_seed, games):
+    rng = random.Random(master_seed)
+    return [rng.getrandbits(64) for _ in range(games)]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class RolloutStats:
+    def __init__(self):
+        self.games = 0
+        self.scores = []
+        self.moves = []
+        self.max_tiles = Counter()
+
+    def add(self, result):
+        self.games += 1
+        self.scores.append(result.score)
+        self.moves.append(result.moves)
+        self.max_tiles[result.max_tile] += 1
+
+    def distribution(self, values):
+        ordered = sorted(values)
+        return {
+            "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+            "min": ordered[0] if ordered else 0,
+            "p10": percentile(ordered, 0.10),
+            "p50": percentile(ordered, 0.50),
+            "p90": percentile(ordered, 0.90),
+            "max": ordered[-1] if ordered else 0,
+        }
+
+    def summary(self):
+        reached = {}
+        for tile in sorted(self.max_tiles):
+            reached[tile] = sum(count for value, count in self.max_tiles.items() if value >= tile) / self.games
+        return {
+            "games": self.games,
+            "score": self.distribution(self.scores),
+            "moves": self.distribution(self.moves),
+            "max_tile": {str(tile): self.max_tiles[tile] for tile in sorted(self.max_tiles)},
+            "reached": {str(tile): rate for tile, rate in reached.items()},
+        }
+
+
+def run_rollouts(policy, games, master_seed=0, workers=None, chunk_size=None,
+                 max_moves=None, on_result=None):
+    # on_result(result, stats) is called for each game as its chunk arrives
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        # Enough chunks per worker to keep everyone busy until the end
+        chunk_size = max(1, min(256, games // (workers * 8)))
+
+    jobs = list(enumerate(game_seeds(master_seed, games)))
+    chunks = [jobs[i:i + chunk_size] for i in range(0, games, chunk_size)]
+    stats = RolloutStats()
+
+    def collect(results):
+        for result in results:
+            stats.add(result)
+            if on_result is not None:
+                on_result(result, stats)
+
+    if workers <= 1:
+        for chunk in chunks:
+            collect(_play_chunk(policy, chunk, max_moves))
+        return stats
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_play_chunk, policy, chunk, max_moves) for chunk in chunks]
+        for future in as_completed(futures):
+            collect(future.result())
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run seeded 2048 games and report policy statistics")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--max-moves", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = run_rollouts(args.policy, args.games, args.seed, args.workers,
+                         args.chunk_size, args.max_moves)
+    elapsed = time.perf_counter() - start
+
+    summary = stats.summary()
+    summary["policy"] = args.policy
+    summary["seed"] = args.seed
+    summary["seconds"] = round(elapsed, 3)
+    summary["games_per_second"] = round(stats.games / elapsed, 1) if elapsed > 0 else 0.0
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
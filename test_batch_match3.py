@@ -0,0 +1,68 @@
+# Checks of the NumPy batch simulator against the single-board rules in
+# match3_core and engine_match3.
+#
+# Run with: python -m pytest
+
+import numpy as np
+import pytest
+
+import batch_match3
+import engine_match3
+import match3_core
+
+
+def core_state(board, num_colors):
+    state = match3_core.Match3State(seed=0, grid_size=len(board), num_colors=num_colors)
+    state.set_grid(board.tolist())
+    return state
+
+
+@pytest.mark.parametrize("size, num_colors", [(3, 3), (5, 3), (7, 6), (9, 4), (12, 6)])
+def test_match_mask_and_legal_swaps_equal_core(size, num_colors):
+    rng = np.random.default_rng(size)
+    boards = rng.integers(0, num_colors, (200, size, size), dtype=np.int8)
+    matched = batch_match3.match_mask(boards)
+    legal = batch_match3.legal_swaps(boards)
+    swaps = batch_match3.swap_table(size, size)
+    stride = engine_match3.stride_for(size)
+    for board, board_matched, board_legal in zip(boards, matched, legal):
+        state = core_state(board, num_colors)
+        cells = engine_match3.iter_cells(engine_match3.match_mask(state.masks, stride), stride)
+        assert set(cells) == set(map(tuple, np.argwhere(board_matched)))
+        assert set(state.valid_swaps()) == set(map(tuple, swaps[board_legal]))
+
+
+def test_collapse_keeps_column_order():
+    rng = np.random.default_rng(0)
+    boards = rng.integers(0, 6, (50, 7, 7), dtype=np.int8)
+    boards[rng.random(boards.shape) < 0.3] = batch_match3.EMPTY
+    collapsed = batch_match3.collapse(boards)
+    for board, after in zip(boards, collapsed):
+        for col in range(7):
+            gems = [color for color in board[:, col] if color != batch_match3.EMPTY]
+            assert after[:, col].tolist() == [batch_match3.EMPTY] * (7 - len(gems)) + gems
+
+
+def test_steps_keep_boards_playable():
+    game = batch_match3.BatchMatch3(500, seed=0)
+    for _ in range(20):
+        points, depths, valid, reshuffled = game.step(game.sample_actions())
+        assert valid.all() and (depths >= 1).all() and (points > 0).all()
+        assert (game.boards != batch_match3.EMPTY).all()
+        assert not batch_match3.match_mask(game.boards).any()
+        assert game.legal.any(axis=1).all()
+        assert (game.legal == batch_match3.legal_swaps(game.boards)).all()
+
+
+@pytest.mark.parametrize("size, num_colors", [(5, 3), (7, 6), (12, 4)])
+def test_new_boards_have_no_match_and_min_moves(size, num_colors):
+    rng = np.random.default_rng(size)
+    boards = batch_match3.new_boards(2000, size, num_colors, rng, min_moves=3)
+    assert ((boards >= 0) & (boards < num_colors)).all()
+    assert not batch_match3.match_mask(boards).any()
+    assert (batch_match3.legal_swaps(boards).sum(axis=1) >= 3).all()
+
+
+def test_generate_boards_needs_three_colours():
+    with pytest.raises(ValueError):
+        batch_match3.generate_boards(10, 7, 2, np.random.default_rng(0))
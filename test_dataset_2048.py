@@ -0,0 +1,111 @@
+# Checks of the position dataset format: writing, reading, chunking,
+# deduplication and recovery from a crashed writer.
+#
+# Run with: python -m pytest
+
+import numpy as np
+import pytest
+
+import dataset_2048
+
+
+def write_positions(path, positions, append=True):
+    with dataset_2048.PositionWriter(path, buffer_size=3, append=append) as writer:
+        for board, move, score in positions:
+            writer.write(board, move, score)
+    return writer
+
+
+def read_positions(path):
+    dataset = dataset_2048.PositionDataset(path)
+    return [(int(board), int(move), int(score))
+            for board, move, score in zip(dataset.boards, dataset.moves, dataset.scores)]
+
+
+def test_records_read_back(tmp_path):
+    path = tmp_path / "positions.pos"
+    positions = [(0x1234_5678_9ABC_DEF0, 3, 2048), (1, 0, 0), ((1 << 64) - 1, 2, (1 << 32) - 1)]
+    writer = write_positions(path, positions)
+    assert writer.written == 3
+    assert path.stat().st_size == dataset_2048.HEADER.size + 3 * dataset_2048.RECORD_DTYPE.itemsize
+    assert read_positions(path) == positions
+
+
+def test_append_and_overwrite(tmp_path):
+    path = tmp_path / "positions.pos"
+    write_positions(path, [(1, 0, 4)])
+    write_positions(path, [(2, 1, 8)])
+    assert read_positions(path) == [(1, 0, 4), (2, 1, 8)]
+    write_positions(path, [(3, 2, 16)], append=False)
+    assert read_positions(path) == [(3, 2, 16)]
+
+
+def test_append_after_torn_record(tmp_path):
+    # A crashed writer leaves part of a record behind; later records must
+    # still start on a record boundary
+    path = tmp_path / "positions.pos"
+    first = [(board, board % 4, board * 4) for board in range(1, 4)]
+    write_positions(path, first)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert len(dataset_2048.PositionDataset(path)) == 3
+
+    second = [(0x0123_4567_89AB_CDEF, 1, 12), (0x2000_0000_0000_0001, 2, 36)]
+    write_positions(path, second)
+    assert read_positions(path) == first + second
+
+
+def test_bad_header_is_refused(tmp_path):
+    path = tmp_path / "positions.pos"
+    path.write_bytes(b"NOT A DATASET")
+    with pytest.raises(dataset_2048.DatasetError):
+        dataset_2048.PositionDataset(path)
+    with pytest.raises(dataset_2048.DatasetError):
+        dataset_2048.PositionWriter(path)
+
+
+def test_chunks_cover_every_record(tmp_path):
+    path = tmp_path / "positions.pos"
+    write_positions(path, [(board, 0, 0) for board in range(10)])
+    chunks = list(dataset_2048.PositionDataset(path).iter_chunks(4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert np.concatenate(chunks)["board"].tolist() == list(range(10))
+
+
+def test_sample_batches_shuffle_every_record_once(tmp_path):
+    paths = [tmp_path / "a.pos", tmp_path / "b.pos"]
+    write_positions(paths[0], [(board, 0, 0) for board in range(100)])
+    write_positions(paths[1], [(board, 0, 0) for board in range(100, 150)])
+    batches = list(dataset_2048.sample_batches(paths, batch_size=16, block_size=8, buffer_blocks=3))
+    boards = np.concatenate(batches)["board"].tolist()
+    assert sorted(boards) == list(range(150))
+    assert boards != list(range(150))
+    assert all(len(batch) == 16 for batch in batches[:-1])
+
+
+def test_unpack_boards():
+    cells = dataset_2048.unpack_boards(np.array([0x0000_0000_0000_0021, 0xF << 60], dtype=np.uint64))
+    assert cells[0].tolist() == [1, 2] + [0] * 14
+    assert cells[1].tolist() == [0] * 15 + [15]
+
+
+def test_deduplicate_keeps_first_occurrence(tmp_path):
+    paths = [tmp_path / "a.pos", tmp_path / "b.pos"]
+    write_positions(paths[0], [(5, 0, 1), (7, 1, 2), (5, 2, 3)])
+    write_positions(paths[1], [(7, 3, 4), (9, 0, 5), (5, 0, 6)])
+    out = tmp_path / "out.pos"
+
+    # Several buckets, one of them possibly empty, must give the same result
+    for bucket_bits in (0, 3):
+        assert dataset_2048.deduplicate(paths, out, bucket_bits=bucket_bits) == (6, 3)
+        assert sorted(read_positions(out)) == [(5, 0, 1), (7, 1, 2), (9, 0, 5)]
+        assert dataset_2048.deduplicate(paths, out, by_move=True, bucket_bits=bucket_bits) == (6, 5)
+        assert sorted(read_positions(out)) == [(5, 0, 1), (5, 2, 3), (7, 1, 2), (7, 3, 4), (9, 0, 5)]
+
+
+def test_record_games_stores_every_move(tmp_path):
+    path = tmp_path / "games.pos"
+    stats = dataset_2048.record_games(path, "greedy", 3, master_seed=1, max_moves=20)
+    dataset = dataset_2048.PositionDataset(path)
+    assert len(dataset) == sum(stats.moves)
+    assert (dataset.moves < 4).all()
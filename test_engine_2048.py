@@ -0,0 +1,127 @@
+# Checks of the 2048 engines: the 4x4 bitboard tables and the generic
+# GridRules kernel against slide_line() applied line by line.
+#
+# Run with: python -m pytest
+
+import random
+
+import pytest
+
+import engine_2048
+
+
+def random_exponents(rng, cells, top=14, empty=0.4):
+    # Mostly small exponents so that merges are common; the default top stays
+    # below MAX_EXPONENT, where every engine merges alike
+    return [0 if rng.random() < empty else rng.randint(1, rng.choice((3, 6, top))) for _ in range(cells)]
+
+
+def reference_move(cells, size, direction):
+    # Slide every line towards its wall with slide_line()
+    rules = engine_2048.GridRules(size)
+    result = list(cells)
+    score = 0
+    for line in rules.lines[direction]:
+        slid, gained = engine_2048.slide_line([cells[index] for index in line])
+        for index, value in zip(line, slid):
+            result[index] = value
+        score += gained
+    return result, score
+
+
+def to_bitboard(cells):
+    board = 0
+    for index, value in enumerate(cells):
+        board |= value << (4 * index)
+    return board
+
+
+def to_cells(board):
+    return [(board >> (4 * index)) & 0xF for index in range(16)]
+
+
+def test_bitboard_moves_equal_reference_and_grid_rules():
+    rng = random.Random(0)
+    grid = engine_2048.GridRules(4)
+    for _ in range(2000):
+        cells = random_exponents(rng, 16)
+        board = to_bitboard(cells)
+        for direction in engine_2048.DIRECTIONS:
+            expected, score = reference_move(cells, 4, direction)
+            new_board, gained = engine_2048.move(board, direction)
+            assert (to_cells(new_board), gained) == (expected, score)
+            assert grid.move(tuple(cells), direction) == (tuple(expected), score)
+
+
+def test_largest_tiles_do_not_merge_on_the_bitboard():
+    board = engine_2048.from_values([[32768, 32768, 0, 0], [0] * 4, [0] * 4, [0] * 4])
+    assert engine_2048.move(board, engine_2048.LEFT) == (board, 0)
+    assert engine_2048.move(board, engine_2048.RIGHT)[1] == 0
+
+
+def test_merges_happen_once_per_tile():
+    board = engine_2048.from_values([[2, 2, 2, 2], [4, 4, 8, 0], [2, 0, 2, 4], [0] * 4])
+    new_board, score = engine_2048.move(board, engine_2048.LEFT)
+    assert engine_2048.to_values(new_board) == [[4, 4, 0, 0], [8, 8, 0, 0], [4, 4, 0, 0], [0] * 4]
+    assert score == 4 + 4 + 8 + 4
+
+
+@pytest.mark.parametrize("size", [2, 3, 5, 8])
+def test_grid_rules_equal_reference(size):
+    rng = random.Random(size)
+    rules = engine_2048.rules_for(size)
+    for _ in range(300):
+        cells = random_exponents(rng, size * size)
+        for direction in engine_2048.DIRECTIONS:
+            expected, score = reference_move(cells, size, direction)
+            assert rules.move(tuple(cells), direction) == (tuple(expected), score)
+
+
+def test_grid_rules_merge_past_the_bitboard_limit():
+    # Tuples have no nibble limit, and the view animates with the same limit
+    rules = engine_2048.rules_for(5)
+    line = [15, 15, 16, 16, 3]
+    board = tuple(line) + (0,) * 20
+    new_board, score = rules.move(board, engine_2048.LEFT)
+    assert new_board[:5] == (16, 17, 3, 0, 0) and score == (1 << 16) + (1 << 17)
+    assert engine_2048.slide_targets(line, rules.limit) == {0: 0, 1: 0, 2: 1, 3: 1, 4: 2}
+
+
+def test_game_over_matches_grid_rules_and_moves():
+    rng = random.Random(1)
+    grid = engine_2048.GridRules(4)
+    over = 0
+    for _ in range(3000):
+        # Full boards with few values, so many of them are stuck
+        cells = [rng.randint(1, 4) for _ in range(16)]
+        board = to_bitboard(cells)
+        stuck = all(engine_2048.move(board, direction)[0] == board for direction in engine_2048.DIRECTIONS)
+        assert engine_2048.is_game_over(board) == stuck == grid.is_game_over(tuple(cells))
+        over += stuck
+    assert over
+    assert not engine_2048.is_game_over(engine_2048.set_cell(to_bitboard([1, 2] * 8), 3, 3, 0))
+
+
+def test_board_helpers():
+    rng = random.Random(2)
+    for _ in range(500):
+        cells = random_exponents(rng, 16, top=15)
+        board = to_bitboard(cells)
+        assert engine_2048.transpose(engine_2048.transpose(board)) == board
+        assert to_cells(engine_2048.transpose(board)) == [cells[4 * col + row] for row in range(4) for col in range(4)]
+        assert engine_2048.from_values(engine_2048.to_values(board)) == board
+        assert engine_2048.empty_cells(board) == [index for index, value in enumerate(cells) if not value]
+        assert engine_2048.count_empty(board) == cells.count(0)
+        assert engine_2048.max_exponent(board) == max(cells)
+
+
+def test_spawns_equal_grid_rules():
+    # Same seed, same spawns, so replays and views agree whichever rules run
+    grid = engine_2048.GridRules(4)
+    board, cells = 0, grid.empty
+    rng_board, rng_cells = random.Random(3), random.Random(3)
+    for _ in range(16):
+        board, cell = engine_2048.spawn_tile(board, rng_board)
+        cells, grid_cell = grid.spawn_tile(cells, rng_cells)
+        assert cell == grid_cell and to_cells(board) == list(cells)
+    assert engine_2048.spawn_tile(board, rng_board) == (board, None)
@@ -0,0 +1,61 @@
+# Checks of the bitmask run detection against a cell-by-cell scan.
+#
+# Run with: python -m pytest
+
+import random
+
+import pytest
+
+import engine_match3
+
+
+def scanned_matches(grid):
+    # Cells in a horizontal or vertical run of three or more, found by
+    # walking every line
+    size = len(grid)
+    matched = set()
+    for row in range(size):
+        for col in range(size):
+            color = grid[row][col]
+            if color is None:
+                continue
+            if col + 2 < size and grid[row][col + 1] == color and grid[row][col + 2] == color:
+                matched.update(((row, col), (row, col + 1), (row, col + 2)))
+            if row + 2 < size and grid[row + 1][col] == color and grid[row + 2][col] == color:
+                matched.update(((row, col), (row + 1, col), (row + 2, col)))
+    return matched
+
+
+def bitmask_matches(grid, num_colors):
+    stride = engine_match3.stride_for(len(grid))
+    masks = engine_match3.masks_from_grid(grid, num_colors)
+    return set(engine_match3.iter_cells(engine_match3.match_mask(masks, stride), stride))
+
+
+@pytest.mark.parametrize("size", [1, 3, 5, 7, 12, 33])
+@pytest.mark.parametrize("num_colors", [2, 3, 6])
+def test_match_mask_equals_scan(size, num_colors):
+    rng = random.Random(size * 10 + num_colors)
+    for _ in range(200):
+        # Some empty cells, as while gems are falling
+        grid = [[rng.randrange(num_colors) if rng.random() > 0.1 else None for _ in range(size)]
+                for _ in range(size)]
+        assert bitmask_matches(grid, num_colors) == scanned_matches(grid)
+
+
+def test_runs_do_not_wrap_across_rows():
+    # Two gems at the end of a row and one at the start of the next
+    grid = [[1, 0, 0],
+            [0, 1, 1],
+            [1, 2, 2]]
+    assert bitmask_matches(grid, 3) == set()
+
+
+def test_board_and_column_masks_hold_every_cell():
+    size = 6
+    stride = engine_match3.stride_for(size)
+    cells = {(row, col) for row in range(size) for col in range(size)}
+    assert set(engine_match3.iter_cells(engine_match3.board_mask(size), stride)) == cells
+    for col in range(size):
+        column = set(engine_match3.iter_cells(engine_match3.column_mask(col, size), stride))
+        assert column == {(row, col) for row in range(size)}
@@ -0,0 +1,130 @@
+# Checks of the persistent evaluation cache: symmetry canonicalisation, the
+# on-disk store, solver fingerprints and recovery from torn appends.
+#
+# Run with: python -m pytest
+
+import random
+
+import pytest
+
+import ai_2048
+import engine_2048
+import eval_cache_2048
+
+
+def random_board(rng):
+    board = 0
+    for row in range(4):
+        for col in range(4):
+            board = engine_2048.set_cell(board, row, col, rng.randrange(12))
+    return board
+
+
+def grid_images(grid):
+    # The 8 rotations and reflections of a 4x4 list grid
+    images = []
+    for _ in range(4):
+        grid = [list(line) for line in zip(*grid[::-1])]
+        images.append(grid)
+        images.append([line[::-1] for line in grid])
+    return images
+
+
+def fill(cache, boards, depth=2):
+    for value, board in enumerate(boards):
+        cache.store(board, depth, float(value))
+
+
+def test_symmetries_equal_grid_images():
+    rng = random.Random(0)
+    for _ in range(200):
+        board = random_board(rng)
+        expected = sorted(engine_2048.from_values(image) for image in grid_images(engine_2048.to_values(board)))
+        assert sorted(eval_cache_2048.symmetries(board)) == expected
+
+
+def test_canonical_is_shared_by_all_images():
+    rng = random.Random(1)
+    for _ in range(200):
+        board = random_board(rng)
+        key = eval_cache_2048.canonical(board)
+        assert key in eval_cache_2048.symmetries(board)
+        assert all(eval_cache_2048.canonical(image) == key for image in eval_cache_2048.symmetries(board))
+
+
+def test_lookup_finds_images_at_enough_depth():
+    cache = eval_cache_2048.EvalCache()
+    board = engine_2048.from_values([[2, 4, 0, 0], [0, 8, 0, 0], [0, 0, 0, 16], [0, 0, 0, 0]])
+    cache.store(board, 2, 123.5)
+    for image in eval_cache_2048.symmetries(board):
+        assert cache.lookup(image, 2) == 123.5
+    assert cache.lookup(board, 3) is None
+    cache.store(board, 1, 0.0)  # shallower searches never replace deeper ones
+    assert cache.lookup(board) == 123.5
+
+
+def test_store_persists_across_sessions(tmp_path):
+    path = tmp_path / "cache.bin"
+    rng = random.Random(2)
+    boards = [random_board(rng) for _ in range(50)]
+    with eval_cache_2048.EvalCache(path, flush_every=7) as cache:
+        fill(cache, boards)
+    with eval_cache_2048.EvalCache(path) as cache:
+        assert len(cache.records) == 50
+        assert [cache.lookup(board, 2) for board in boards] == [float(value) for value in range(50)]
+        assert cache.disk_hits == 50
+
+
+def test_other_solver_settings_are_refused(tmp_path, monkeypatch):
+    path = tmp_path / "cache.bin"
+    with eval_cache_2048.EvalCache(path) as cache:
+        fill(cache, [1, 2, 3])
+    assert eval_cache_2048.read_header(path) == eval_cache_2048.solver_fingerprint()
+
+    with pytest.raises(eval_cache_2048.CacheError):
+        eval_cache_2048.EvalCache(path, probability_cutoff=0.001)
+    monkeypatch.setattr(ai_2048, "HEURISTIC_WEIGHTS", ai_2048.HEURISTIC_WEIGHTS[:-1] + (1.0,))
+    with pytest.raises(eval_cache_2048.CacheError):
+        eval_cache_2048.EvalCache(path)
+
+
+def test_solver_refuses_cache_for_other_cutoff():
+    cache = eval_cache_2048.EvalCache(probability_cutoff=0.001)
+    with pytest.raises(ValueError):
+        ai_2048.ExpectimaxSolver(cache=cache)
+    ai_2048.ExpectimaxSolver(probability_cutoff=0.001, cache=cache)
+
+
+def test_bad_header_is_refused(tmp_path):
+    path = tmp_path / "cache.bin"
+    path.write_bytes(b"P2048 not a cache at all")
+    with pytest.raises(eval_cache_2048.CacheError):
+        eval_cache_2048.EvalCache(path)
+
+
+def test_torn_record_is_cut_off(tmp_path):
+    # A writer killed mid-batch leaves part of a record; later records must
+    # still start on a record boundary, whether the tail is found on open or
+    # on refresh
+    path = tmp_path / "cache.bin"
+    rng = random.Random(3)
+    boards = [random_board(rng) for _ in range(12)]
+    with eval_cache_2048.EvalCache(path) as cache:
+        fill(cache, boards[:4])
+    with open(path, "ab") as f:
+        f.write(b"\x07" * 5)
+    with eval_cache_2048.EvalCache(path) as cache:
+        assert len(cache.records) == 4
+        fill(cache, boards[4:8])
+
+    reader = eval_cache_2048.EvalCache(path)
+    with open(path, "ab") as f:
+        f.write(b"\x07" * 9)
+    reader.refresh()
+    fill(reader, boards[8:])
+    reader.close()
+
+    size = path.stat().st_size - eval_cache_2048.HEADER.size
+    assert size == 12 * eval_cache_2048.RECORD_DTYPE.itemsize
+    with eval_cache_2048.EvalCache(path) as cache:
+        assert [cache.lookup(board, 2) for board in boards] == [float(value % 4) for value in range(12)]
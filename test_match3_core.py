@@ -0,0 +1,149 @@
+# Checks of the headless match-3 rules against straightforward full scans.
+#
+# Run with: python -m pytest
+
+import random
+
+import pytest
+
+import engine_match3
+import match3_core
+
+
+def full_match_mask(state):
+    return engine_match3.match_mask(engine_match3.masks_from_grid(state.grid, state.num_colors), state.stride)
+
+
+def swapped_swaps(state):
+    # Every adjacent swap that leaves a match, found by playing each one on
+    # a copy of the grid and scanning the whole board
+    size = state.grid_size
+    swaps = []
+    for row in range(size):
+        for col in range(size):
+            for row2, col2 in ((row, col + 1), (row + 1, col)):
+                if row2 < size and col2 < size:
+                    grid = [line[:] for line in state.grid]
+                    grid[row][col], grid[row2][col2] = grid[row2][col2], grid[row][col]
+                    masks = engine_match3.masks_from_grid(grid, state.num_colors)
+                    if engine_match3.match_mask(masks, state.stride):
+                        swaps.append((row, col, row2, col2))
+    return swaps
+
+
+def deadlocked_state():
+    # Diagonal stripes of six colours: no matches and no valid swap
+    state = match3_core.Match3State(seed=1, grid_size=7)
+    state.set_grid([[(row + 2 * col) % 6 for col in range(7)] for row in range(7)])
+    return state
+
+
+def play_checked_turns(state, turns, rng):
+    # Play random valid swaps, comparing every find_matches() of each
+    # cascade with a full scan of the grid
+    for _ in range(turns):
+        swaps = list(state.valid_swaps())
+        state.swap(*rng.choice(swaps))
+        while True:
+            found = state.find_matches()
+            assert state.match_mask == full_match_mask(state)
+            if not found:
+                break
+            state.remove_matches()
+            state.drop_gems()
+        state.ensure_playable()
+        assert not state.find_matches()
+
+
+@pytest.mark.parametrize("size", [5, 7, 12, 20])
+def test_incremental_matches_equal_full_scan(monkeypatch, size):
+    # Force the incremental path on small boards, where it is cheap to check
+    monkeypatch.setattr(match3_core, "INCREMENTAL_MIN_SIZE", 0)
+    for seed in range(5):
+        state = match3_core.Match3State(seed=seed, grid_size=size)
+        play_checked_turns(state, 40, random.Random(seed))
+
+
+def test_incremental_matches_at_threshold():
+    # The sizes the game actually rescans incrementally
+    size = match3_core.INCREMENTAL_MIN_SIZE
+    state = match3_core.Match3State(seed=1, grid_size=size)
+    play_checked_turns(state, 5, random.Random(1))
+
+
+@pytest.mark.parametrize("size", [3, 4, 5, 7, 9])
+@pytest.mark.parametrize("num_colors", [3, 4, 6])
+def test_valid_swaps_equal_brute_force(size, num_colors):
+    for seed in range(40):
+        state = match3_core.Match3State(seed=seed, grid_size=size, num_colors=num_colors)
+        swaps = swapped_swaps(state)
+        assert list(state.valid_swaps()) == swaps
+        assert state.find_hint() == (swaps[0] if swaps else None)
+        assert state.count_valid_swaps() == len(swaps)
+        for row, col, row2, col2 in swaps:
+            assert state.swap_makes_match(row, col, row2, col2)
+
+
+def test_swap_makes_match_leaves_the_grid_alone():
+    state = match3_core.Match3State(seed=3)
+    grid = [line[:] for line in state.grid]
+    for row in range(state.grid_size - 1):
+        for col in range(state.grid_size - 1):
+            state.swap_makes_match(row, col, row, col + 1)
+            state.swap_makes_match(row, col, row + 1, col)
+    assert state.grid == grid
+
+
+def test_reshuffle_keeps_colour_counts():
+    state = deadlocked_state()
+    assert not state.find_matches() and not state.has_valid_move()
+    reshuffles = []
+    state.on_reshuffle = lambda: reshuffles.append(True)
+    counts = sorted(color for line in state.grid for color in line)
+
+    assert state.ensure_playable()
+    assert reshuffles
+    assert sorted(color for line in state.grid for color in line) == counts
+    assert not state.find_matches() and state.has_valid_move()
+    assert state.masks == engine_match3.masks_from_grid(state.grid, state.num_colors)
+    assert not state.ensure_playable()
+
+
+def test_hints_never_run_out():
+    for seed in range(5):
+        state = match3_core.Match3State(seed=seed)
+        for _ in range(100):
+            hint = state.find_hint()
+            assert hint is not None
+            assert state.try_swap(*hint) > 0
+        assert state.masks == engine_match3.masks_from_grid(state.grid, state.num_colors)
+
+
+@pytest.mark.parametrize("size, num_colors", [(3, 3), (5, 3), (7, 6), (12, 4), (20, 3)])
+def test_generated_grids_have_no_match(size, num_colors):
+    rng = random.Random(size)
+    for _ in range(100):
+        grid = match3_core.generate_grid(rng, size, num_colors)
+        assert all(0 <= color < num_colors for line in grid for color in line)
+        masks = engine_match3.masks_from_grid(grid, num_colors)
+        assert not engine_match3.match_mask(masks, engine_match3.stride_for(size))
+
+
+def test_generated_colours_are_uniform():
+    # The top-left cell is never constrained, so every colour is as likely
+    counts = [0] * 6
+    for seed in range(6000):
+        counts[match3_core.generate_grid(random.Random(seed), 7, 6)[0][0]] += 1
+    assert min(counts) > 850 and max(counts) < 1150
+
+
+def test_new_states_offer_min_moves():
+    for seed in range(50):
+        state = match3_core.Match3State(seed=seed, num_colors=4, min_moves=3)
+        assert not state.find_matches()
+        assert state.count_valid_swaps() >= 3
+
+
+def test_generate_grid_needs_three_colours():
+    with pytest.raises(ValueError):
+        match3_core.generate_grid(random.Random(0), 7, 2)
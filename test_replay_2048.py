@@ -0,0 +1,109 @@
+# Checks of the binary replay format and its verifier.
+#
+# Run with: python -m pytest
+
+import random
+
+import pytest
+
+import core_2048
+import engine_2048
+import replay_2048
+
+
+def played_game(seed, moves=200):
+    # A headless game of random legal moves
+    state = core_2048.Game2048State(seed=seed)
+    rng = random.Random(seed)
+    for _ in range(moves):
+        if state.game_over:
+            break
+        directions = [0, 1, 2, 3]
+        rng.shuffle(directions)
+        any(state.step(direction) for direction in directions)
+    return state
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2**64 - 1])
+def test_replay_round_trip(seed):
+    state = played_game(seed)
+    data = state.replay_bytes()
+    replay = replay_2048.decode_replay(data)
+    assert replay.seed == seed
+    assert replay.moves == state.move_log
+    assert replay.score == state.score
+    assert replay_2048.verify_replay(data) == (True, "", state.score, len(state.move_log))
+
+
+@pytest.mark.parametrize("count", range(9))
+def test_moves_pack_into_exact_bytes(count):
+    moves = [(3 * i + 1) % 4 for i in range(count)]
+    data = replay_2048.pack_moves(moves)
+    assert len(data) == (count + 3) // 4
+    assert replay_2048.unpack_moves(data, count) == moves
+
+
+def test_wrong_score_and_board_are_rejected():
+    state = played_game(5)
+    seed, moves, score = state.seed, state.move_log, state.score
+    result = replay_2048.verify_replay(replay_2048.encode_replay(seed, moves, score + 4, state.board))
+    assert not result.valid and "score" in result.reason
+    result = replay_2048.verify_replay(replay_2048.encode_replay(seed, moves, score, state.board ^ 1))
+    assert not result.valid and "checksum" in result.reason
+
+
+def test_bad_checksum_field_is_rejected():
+    data = bytearray(played_game(6).replay_bytes())
+    data[replay_2048.HEADER.size - 1] ^= 0x40  # last byte of the board crc32
+    assert not replay_2048.verify_replay(bytes(data)).valid
+
+
+def test_moves_that_change_nothing_are_rejected():
+    # The first seed whose opening position cannot move in some direction
+    for seed in range(100):
+        board, _ = replay_2048.new_game(seed)
+        stuck = [direction for direction in range(4) if engine_2048.move(board, direction)[0] == board]
+        if stuck:
+            break
+    assert core_2048.Game2048State(seed=seed).board == board
+    result = replay_2048.verify_replay(replay_2048.encode_replay(seed, stuck[:1], 0, board))
+    assert not result.valid and "does not change" in result.reason
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 10])
+def test_trailing_bytes_and_padding_bits_are_rejected(count):
+    state = played_game(8, count)
+    data = state.replay_bytes()
+    assert replay_2048.verify_replay(data).valid
+    with pytest.raises(replay_2048.ReplayError, match="trailing"):
+        replay_2048.decode_replay(data + b"\x00")
+    with pytest.raises(replay_2048.ReplayError, match="truncated"):
+        replay_2048.decode_replay(data[:-1])
+    if count % 4:
+        with pytest.raises(replay_2048.ReplayError, match="padding"):
+            replay_2048.decode_replay(data[:-1] + bytes([data[-1] | 0x80]))
+
+
+def test_bad_headers_are_rejected():
+    data = played_game(9, 10).replay_bytes()
+    with pytest.raises(replay_2048.ReplayError, match="truncated header"):
+        replay_2048.decode_replay(data[:10])
+    with pytest.raises(replay_2048.ReplayError, match="not a 2048 replay"):
+        replay_2048.decode_replay(b"X" + data[1:])
+    with pytest.raises(replay_2048.ReplayError, match="version"):
+        replay_2048.decode_replay(data[:5] + b"\x09" + data[6:])
+
+
+@pytest.mark.parametrize("seed", [-1, 2**64, 1.5, "seed"])
+def test_seeds_that_do_not_fit_a_replay_are_refused(seed):
+    with pytest.raises(ValueError):
+        core_2048.Game2048State(seed=seed)
+    with pytest.raises(ValueError):
+        replay_2048.encode_replay(seed, [], 0, 0)
+
+
+def test_parallel_verification_keeps_order():
+    blobs = [played_game(seed, 30).replay_bytes() for seed in range(6)]
+    blobs[3] = blobs[3][:-1]
+    results = replay_2048.verify_replays(blobs, workers=2, chunk_size=2)
+    assert [result.valid for result in results] == [True, True, True, False, True, True]